@@ -1,27 +1,63 @@
 import asyncio
-import os
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import HTMLResponse
 from starlette.middleware.sessions import SessionMiddleware
 
 from app.config import settings
+from app.db import lsd_queries
 from app.db.lsd import lsd
+from app.db.partitions import maintenance_loop
+from app.log import setup_logging
+from app.middleware.compression import CompressionMiddleware
+from app.middleware.profiling import ProfilingMiddleware
+from app.middleware.query_stats import QueryStatsMiddleware
+from app.middleware.timing import TimingMiddleware
 from app.middleware.user_middleware import LoadUserMiddleware
-from app.routers import api, user
+from app.prerender import PROFILE_PATH, prerender_profile
+from app.routers import api
+from app.routers import lsd as lsd_router
+from app.routers import metrics, profiles, user
 from app.routers.auth import auth, google_oauth
+from app.services import related_sites
+from app.services.link_preview import link_previews
+from app.services.site_index import refresh_site_index
+from app.services.worker_events import worker_events
+from app.static import static_files
+
+setup_logging()
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Initialize psycopg2 pool in a separate thread
-    await asyncio.to_thread(lsd.connect)
+    # Index the built frontend once instead of hitting the filesystem per request
+    static_files.load()
+    # Open the async LSD pool
+    await lsd.connect()
+    # Hear about feed posts and cache invalidations from the other workers
+    await worker_events.start()
+    # Warm the Hacker News cache in the background so the first visitor doesn't wait on the crawl
+    lsd_queries.warm("hn-top-posts")
+    # Build the Discover search index before the first search needs it
+    refresh_site_index()
+    # Recompute related sites, picking up sites changed outside the app since last run.
+    # Workers starting together leave it to whichever takes the lock first
+    related_sites.schedule_refresh(wait=False)
+    # Start the link preview workers and pick up any urls still missing a preview
+    await link_previews.start()
+    asyncio.create_task(link_previews.enqueue_stale())
+    # Keep future posts partitions created and archive old soft-deleted posts
+    partition_maintenance = asyncio.create_task(maintenance_loop())
     yield
+    # Websockets need no closing here: uvicorn has already closed them with 1012
+    # (service restart) and waited out the graceful shutdown before this runs
     # Clean up the pool on shutdown
-    await asyncio.to_thread(lsd.disconnect)
+    partition_maintenance.cancel()
+    await link_previews.stop()
+    await worker_events.stop()
+    await lsd.disconnect()
 
 
 app = FastAPI(lifespan=lifespan)
@@ -62,26 +98,50 @@ elif settings.app_env == "production":
         max_age=3600 * 24 * 14,  # Session expires in 14 days
     )
 
+# Outermost, so the session lookup in LoadUserMiddleware is counted too
+app.add_middleware(QueryStatsMiddleware)
+
+# Wraps QueryStatsMiddleware, which reports the request's DB time into its spans
+app.add_middleware(TimingMiddleware)
+
+if settings.profiling_enabled:
+    app.add_middleware(ProfilingMiddleware)
+
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.compression_min_size,
+    gzip_level=settings.compression_gzip_level,
+    brotli_quality=settings.compression_brotli_quality,
+)
+
 
 # app.include_router(views.router)
 app.include_router(api.router, prefix="/api")
 app.include_router(user.router, prefix="/api/user")
+app.include_router(lsd_router.router, prefix="/api/lsd")
 app.include_router(auth.router, prefix="/api/auth")
 app.include_router(google_oauth.router, prefix="/api/auth/google")
+app.include_router(metrics.router)
+if settings.profiling_enabled:
+    app.include_router(profiles.router, prefix="/api/profiles")
 
 
-# Load static React files
-app.mount("/static", StaticFiles(directory="y-frontend/dist/assets"), name="static")
+# Serve static React files
+@app.get("/static/{path:path}")
+async def serve_asset(path: str, request: Request):
+    return static_files.serve(request, f"assets/{path}")
 
 
 @app.get("/{full_path:path}")
-async def serve_static(full_path: str):
+async def serve_static(full_path: str, request: Request):
     if full_path.startswith("api"):
         raise HTTPException(status_code=404, detail="API route not found")
 
-    file_path = os.path.join("y-frontend/dist", full_path)
-
-    if os.path.exists(file_path) and os.path.isfile(file_path):
-        return FileResponse(file_path)
+    # Profile pages come with their data and meta tags already in the HTML
+    match = PROFILE_PATH.match(full_path)
+    if match and static_files.index_html is not None:
+        page = await prerender_profile(match.group(1), static_files.index_html)
+        if page:
+            return HTMLResponse(page, headers={"Cache-Control": "no-cache"})
 
-    return FileResponse("y-frontend/dist/index.html")
+    return static_files.serve(request, full_path)
@@ -0,0 +1,98 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+log = logging.getLogger(__name__)
+
+Loader = Callable[[], Awaitable[Any]]
+
+
+@dataclass
+class CacheEntry:
+    value: Any
+    fetched_at: float
+    ttl: float
+
+    def is_fresh(self, now: float) -> bool:
+        return now - self.fetched_at < self.ttl
+
+
+class SWRCache:
+    """
+    Stale-while-revalidate cache for expensive async loaders.
+
+    Fresh entries are returned as-is. Stale entries are returned immediately while
+    a single background task reloads them. Concurrent misses for the same key
+    share one in-flight load instead of each running the loader. With max_entries,
+    the least recently used entries are dropped past that many. Without cache_none,
+    a loader returning None is not cached, so lookups of keys that don't exist can't
+    fill the cache.
+    """
+
+    def __init__(
+        self, ttl: float, max_entries: Optional[int] = None, cache_none: bool = True
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.cache_none = cache_none
+        self._entries: "OrderedDict[Hashable, CacheEntry]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+
+    async def get(self, key: Hashable, loader: Loader, ttl: Optional[float] = None):
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            if not entry.is_fresh(time.monotonic()):
+                self.refresh(key, loader, ttl)
+            return entry.value
+
+        # Shield the shared load so one caller disconnecting doesn't cancel it for the others
+        return await asyncio.shield(self.refresh(key, loader, ttl))
+
+    def refresh(
+        self, key: Hashable, loader: Loader, ttl: Optional[float] = None
+    ) -> asyncio.Task:
+        """Start a reload of key unless one is already running, and return its task."""
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._load(key, loader, ttl))
+            task.add_done_callback(self._report_failure)
+            self._inflight[key] = task
+        return task
+
+    def is_loading(self, key: Hashable) -> bool:
+        return key in self._inflight
+
+    def invalidate(self, key: Hashable):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    async def _load(self, key: Hashable, loader: Loader, ttl: Optional[float]):
+        try:
+            value = await loader()
+            if value is None and not self.cache_none:
+                self._entries.pop(key, None)
+                return value
+            self._entries[key] = CacheEntry(
+                value=value,
+                fetched_at=time.monotonic(),
+                ttl=self.ttl if ttl is None else ttl,
+            )
+            self._entries.move_to_end(key)
+            if self.max_entries is not None:
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    @staticmethod
+    def _report_failure(task: asyncio.Task):
+        # Background refreshes have no awaiting caller, so surface their errors here
+        if not task.cancelled() and task.exception() is not None:
+            log.error("cache refresh failed", exc_info=task.exception())
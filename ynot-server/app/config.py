@@ -1,4 +1,7 @@
+from typing import Optional
+
 from dotenv import load_dotenv
+from pydantic import Field
 from pydantic_settings import BaseSettings
 
 load_dotenv()
@@ -10,6 +13,33 @@ class Settings(BaseSettings):
     postgres_db: str
     postgres_host: str
     postgres_port: int
+    db_pool_size: int = 10  # persistent connections per worker
+    db_max_overflow: int = 10  # extra connections opened under load, closed when returned
+    db_pool_timeout: float = 30.0  # seconds a checkout waits before failing
+    db_pool_recycle: int = 1800  # seconds before a connection is replaced
+    db_pool_pre_ping: bool = True
+    db_statement_cache_size: int = 100  # prepared statements cached per connection
+    db_statement_timeout_ms: int = 10000
+    db_echo: Optional[bool] = None  # log SQL, defaults to on in development only
+    postgres_replica_host: Optional[str] = None  # read replica for read-only routes
+    replica_sticky_seconds: float = 5.0  # reads stay on the primary this long after a write
+    replica_max_lag_seconds: float = 2.0  # replica is skipped while lagging more than this
+    replica_lag_check_interval: float = 1.0
+    query_debug_headers: bool = False  # add X-DB-Query-Count and X-DB-Time-Ms to responses
+    query_budget_strict: bool = False  # raise instead of logging when a route exceeds its query budget
+    server_timing_header: bool = True  # add per-stage timings to responses as Server-Timing
+    metrics_token: Optional[str] = None  # bearer token for /metrics and /api/pool-stats, loopback only without it
+    profiling_enabled: bool = False  # install the request profiler, see app.middleware.profiling
+    profiling_secret: Optional[str] = None  # key for X-Profile signatures
+    profiling_sample_rate: float = 0.0  # fraction of requests profiled without a signature
+    profiling_dir: str = "/tmp/ynot-profiles"
+    profiling_max_files: int = Field(50, ge=1)  # newest profiles kept, the one just taken included
+    posts_partition_months_ahead: int = 3  # monthly posts partitions created ahead of time
+    posts_archive_after_days: int = 30  # soft-deleted posts move to posts_archive after this
+    partition_maintenance_interval_hours: float = 24
+    log_level: str = "info"
+    log_sample_rate: float = 0.01  # fraction of high-volume debug messages kept
+    log_stream: str = "stdout"  # or stderr, for tools that print their results on stdout
     app_port: int
     app_env: str
     app_url: str
@@ -28,6 +58,23 @@ class Settings(BaseSettings):
     lsd_user: str
     lsd_host: str
     lsd_password: str
+    lsd_pool_min_size: int = 1
+    lsd_pool_max_size: int = 10
+    lsd_acquire_timeout: float = 5.0  # seconds to wait for a free LSD connection
+    lsd_query_timeout: float = 30.0  # seconds before an LSD query is cancelled
+    link_preview_concurrency: int = 8  # simultaneous link preview fetches
+    link_preview_ttl_hours: int = 24 * 7  # how long a fetched preview is kept before refetching
+    compression_min_size: int = 1024  # API responses smaller than this are sent uncompressed
+    compression_gzip_level: int = 6
+    compression_brotli_quality: int = 4
+    prerender_ttl_seconds: float = 30  # how long a prerendered profile page is cached
+    prerender_max_entries: int = 1000  # prerendered pages kept per worker, least recently used go first
+    site_index_ttl_seconds: float = 60  # how often the Discover search index is rebuilt
+    related_sites_top_k: int = 10  # neighbours precomputed per site
+    web_workers: Optional[int] = None  # server processes, defaults to one per available CPU
+    web_keepalive_seconds: int = 5
+    web_backlog: int = 2048
+    web_graceful_shutdown_seconds: int = 10  # time given to open requests and websockets
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,70 @@
+"""
+Reconciles the denormalized counters on users and tags with the rows they count.
+
+The counters are maintained in the same transaction as the writes in create_post,
+delete_post and create_bookmark. This job fixes any drift, e.g. from rows changed by
+hand, and is meant to run periodically:
+
+    python -m app.db.counters
+"""
+
+import asyncio
+
+from sqlalchemy import text
+
+from app.db.db import engine
+
+# Each statement only touches rows whose stored count differs from the real one
+RECONCILE_STATEMENTS = {
+    "users.post_count": """
+        UPDATE users SET post_count = counts.n
+        FROM (
+            SELECT users.id, count(posts.id) AS n
+            FROM users
+            LEFT JOIN posts ON posts.owner_id = users.id AND posts.is_deleted IS NOT TRUE
+            GROUP BY users.id
+        ) AS counts
+        WHERE users.id = counts.id AND users.post_count <> counts.n
+    """,
+    "users.bookmark_count": """
+        UPDATE users SET bookmark_count = counts.n
+        FROM (
+            SELECT users.id, count(bookmarks.id) AS n
+            FROM users
+            LEFT JOIN bookmarks ON bookmarks.owner_id = users.id
+            GROUP BY users.id
+        ) AS counts
+        WHERE users.id = counts.id AND users.bookmark_count <> counts.n
+    """,
+    "tags.usage_count": """
+        UPDATE tags SET usage_count = counts.n
+        FROM (
+            SELECT tags.id, count(posts.id) AS n
+            FROM tags
+            LEFT JOIN post_tags ON post_tags.tag_id = tags.id
+            LEFT JOIN posts ON posts.id = post_tags.post_id AND posts.is_deleted IS NOT TRUE
+            GROUP BY tags.id
+        ) AS counts
+        WHERE tags.id = counts.id AND tags.usage_count <> counts.n
+    """,
+}
+
+
+async def reconcile_counters() -> dict:
+    """Recompute every counter and return how many rows each one corrected."""
+    fixed = {}
+    async with engine.begin() as conn:
+        for counter, statement in RECONCILE_STATEMENTS.items():
+            result = await conn.execute(text(statement))
+            fixed[counter] = result.rowcount
+    return fixed
+
+
+async def main():
+    for counter, rows in (await reconcile_counters()).items():
+        print(f"{counter}: corrected {rows} rows")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
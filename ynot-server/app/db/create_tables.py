@@ -1,12 +1,91 @@
+"""
+Brings the database schema up to date. Run before the app starts:
+
+    python -m app.db.create_tables
+
+Applied migrations are recorded in the schema_version table, so an up to date database
+costs a single query. Otherwise the runner takes an advisory lock, so replicas starting
+together apply each migration once, creates the tables with create_all on a fresh
+database, and applies the pending migrations in the same transaction.
+"""
+
 import asyncio
+import logging
+
+from sqlalchemy import text
+from sqlalchemy.exc import ProgrammingError
 
 from app.db.db import engine
+from app.db.migrations import MIGRATIONS
 from app.models.models import Base
 
+log = logging.getLogger(__name__)
+
+# Arbitrary key for pg_advisory_xact_lock, held while migrations are applied
+MIGRATION_LOCK_KEY = 7_316_002
+LATEST_VERSION = max(migration.version for migration in MIGRATIONS)
+
+CREATE_SCHEMA_VERSION = """
+CREATE TABLE IF NOT EXISTS schema_version (
+    version INTEGER PRIMARY KEY,
+    name VARCHAR NOT NULL,
+    applied_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+)
+"""
+
+
+async def current_version(conn) -> int:
+    result = await conn.execute(
+        text("SELECT coalesce(max(version), 0) FROM schema_version")
+    )
+    return result.scalar()
+
+
+async def init_db() -> int:
+    """Apply pending migrations and return the number applied."""
+    try:
+        async with engine.connect() as conn:
+            if await current_version(conn) >= LATEST_VERSION:
+                return 0
+    except ProgrammingError:
+        pass  # no schema_version table yet
 
-async def init_db():
     async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(
+            text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATION_LOCK_KEY}
+        )
+        await conn.execute(text(CREATE_SCHEMA_VERSION))
+        # Another replica may have finished while we waited for the lock
+        version = await current_version(conn)
+        if version == 0:
+            # Databases from before schema_version also start here. create_all only adds
+            # missing tables and the migrations are idempotent, so they catch up safely.
+            await conn.run_sync(Base.metadata.create_all)
+
+        pending = [migration for migration in MIGRATIONS if migration.version > version]
+        for migration in pending:
+            for statement in migration.statements:
+                await conn.execute(text(statement))
+            await conn.execute(
+                text(
+                    "INSERT INTO schema_version (version, name) VALUES (:version, :name)"
+                ),
+                {
+                    "version": migration.version,
+                    "name": migration.name,
+                },
+            )
+            log.info(
+                "applied migration",
+                extra={"version": migration.version, "migration_name": migration.name},
+            )
+    return len(pending)
+
+
+async def main():
+    await init_db()
+    await engine.dispose()
 
 
-asyncio.run(init_db())
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,336 @@
+"""
+Synthetic dataset generator and bulk loader, for capacity planning, plan checks and
+benchmarks.
+
+Generates users, sessions, tags, urls, sites, posts and bookmarks at any scale. Tag and
+url popularity and user activity follow zipf distributions, so a few tags, urls and
+users account for most of the rows like they do in production. Rows are streamed into
+Postgres with COPY in batches, and the same seed always generates the same data:
+
+    python -m app.db.datagen --posts 5000000 --seed 1
+
+Generated names start with --prefix (usernames like "gen_user_1", sessions like
+"gen-session-<user id>"), so use a new prefix or a fresh database for every load.
+"""
+
+import argparse
+import asyncio
+import logging
+import random
+import time
+from bisect import bisect_left
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from itertools import accumulate, islice
+from typing import Dict, Iterable, Iterator, List, Set, Tuple
+
+from sqlalchemy import text
+
+from app.db.counters import reconcile_counters
+from app.db.db import engine
+
+log = logging.getLogger(__name__)
+
+WORDS = (
+    "indie web garden notes blog essays photos zine links tools design code music "
+    "travel recipes books film art open source personal homepage writing research "
+    "startup climbing cooking painting poetry hardware robots maps games typography"
+).split()
+
+
+@dataclass
+class Scale:
+    users: int
+    posts: int
+    tags: int
+    urls: int
+    bookmarks: int
+    sites: int
+    zipf_s: float = 1.1  # exponent for tag, url and user popularity
+    days: int = 365  # posts and bookmarks are spread over this many days
+    deleted_fraction: float = 0.05
+
+    @classmethod
+    def for_posts(cls, posts: int, **overrides) -> "Scale":
+        """Proportions roughly matching production, scaled to a number of posts."""
+        scale = {
+            "users": max(posts // 50, 1),
+            "posts": posts,
+            "tags": min(max(posts // 100, 50), 20000),
+            "urls": max(posts // 2, 1),
+            "bookmarks": posts // 2,
+            "sites": min(max(posts // 1000, 20), 5000),
+        }
+        scale.update({k: v for k, v in overrides.items() if v is not None})
+        return cls(**scale)
+
+
+class Zipf:
+    """Samples ranks 0..n-1 where rank k is drawn with weight 1 / (k + 1) ** s."""
+
+    def __init__(self, n: int, s: float, rng: random.Random):
+        self.rng = rng
+        self.cumulative = list(accumulate(1 / (k + 1) ** s for k in range(n)))
+
+    def sample(self) -> int:
+        return bisect_left(self.cumulative, self.rng.random() * self.cumulative[-1])
+
+    def sample_distinct(self, k: int) -> Set[int]:
+        k = min(k, len(self.cumulative))
+        picked: Set[int] = set()
+        while len(picked) < k:
+            picked.add(self.sample())
+        return picked
+
+
+class DataGenerator:
+    """
+    Yields the rows of each table as tuples, given the first id reserved for it. Every
+    table draws from its own random stream, so changing the size of one table doesn't
+    change the rows generated for the others.
+    """
+
+    def __init__(self, scale: Scale, seed: int, prefix: str):
+        self.scale = scale
+        self.seed = seed
+        self.prefix = prefix
+        self.now = datetime.now(timezone.utc)
+
+    def rng(self, table: str) -> random.Random:
+        return random.Random(f"{self.seed}:{table}")
+
+    def sentence(self, rng: random.Random, n: int) -> str:
+        return " ".join(rng.choice(WORDS) for _ in range(n)).capitalize() + "."
+
+    def timestamp(self, position: float) -> datetime:
+        """A time in the generated range, position 0 is the oldest and 1 is now."""
+        return self.now - timedelta(days=self.scale.days * (1 - position))
+
+    def users(self, first_id: int) -> Iterator[Tuple]:
+        rng = self.rng("users")
+        for i in range(self.scale.users):
+            n = i + 1
+            yield (
+                first_id + i,
+                f"{self.prefix}-{n}",
+                f"{self.prefix}-{n}@example.com",
+                f"{self.prefix}_user_{n}",
+                f"{rng.choice(WORDS).capitalize()} {self.prefix.capitalize()} {n}",
+                self.sentence(rng, rng.randint(3, 15)),
+                True,
+            )
+
+    def sessions(self, first_user_id: int) -> Iterator[Tuple]:
+        expires_at = self.now + timedelta(days=7)
+        for i in range(self.scale.users):
+            user_id = first_user_id + i
+            yield (f"{self.prefix}-session-{user_id}", user_id, expires_at, True)
+
+    def tags(self, first_id: int) -> Iterator[Tuple]:
+        for i in range(self.scale.tags):
+            yield (first_id + i, f"{self.prefix}-tag-{i + 1}")
+
+    def urls(self, first_id: int) -> Iterator[Tuple]:
+        for i in range(self.scale.urls):
+            yield (first_id + i, f"https://example.com/{self.prefix}/{i + 1}")
+
+    def sites(self, first_id: int) -> Iterator[Tuple]:
+        rng = self.rng("sites")
+        for i in range(self.scale.sites):
+            n = i + 1
+            yield (
+                first_id + i,
+                f"{self.prefix} site {n}",
+                f"{rng.choice(WORDS).capitalize()} Owner {n}",
+                f"{self.prefix}-site-{n}@example.com",
+                f"https://{self.prefix}-site-{n}.example.com",
+                self.sentence(rng, rng.randint(5, 20)),
+            )
+
+    def site_tags(self, first_site_id: int, first_tag_id: int) -> Iterator[Tuple]:
+        rng = self.rng("site_tags")
+        tags = Zipf(self.scale.tags, self.scale.zipf_s, rng)
+        for i in range(self.scale.sites):
+            for tag in sorted(tags.sample_distinct(rng.randint(1, 5))):
+                yield (first_site_id + i, first_tag_id + tag)
+
+    def posts(self, first_id: int, first_user_id: int) -> Iterator[Tuple]:
+        rng = self.rng("posts")
+        owners = Zipf(self.scale.users, self.scale.zipf_s, rng)
+        for i in range(self.scale.posts):
+            created_at = self.timestamp(i / self.scale.posts)
+            deleted = rng.random() < self.scale.deleted_fraction
+            yield (
+                first_id + i,
+                first_user_id + owners.sample(),
+                self.sentence(rng, rng.randint(2, 8)),
+                self.sentence(rng, rng.randint(5, 80)),
+                deleted,
+                created_at,
+                created_at + timedelta(hours=1) if deleted else None,
+                False,
+            )
+
+    def post_tags(self, first_post_id: int, first_tag_id: int) -> Iterator[Tuple]:
+        rng = self.rng("post_tags")
+        tags = Zipf(self.scale.tags, self.scale.zipf_s, rng)
+        for i in range(self.scale.posts):
+            for tag in sorted(tags.sample_distinct(rng.randint(0, 4))):
+                yield (first_post_id + i, first_tag_id + tag)
+
+    def post_urls(self, first_post_id: int, first_url_id: int) -> Iterator[Tuple]:
+        rng = self.rng("post_urls")
+        urls = Zipf(self.scale.urls, self.scale.zipf_s, rng)
+        for i in range(self.scale.posts):
+            for url in sorted(urls.sample_distinct(rng.choice((0, 0, 1, 1, 1, 2)))):
+                yield (first_post_id + i, first_url_id + url)
+
+    def bookmarks(
+        self, first_id: int, first_user_id: int, first_url_id: int
+    ) -> Iterator[Tuple]:
+        rng = self.rng("bookmarks")
+        owners = Zipf(self.scale.users, self.scale.zipf_s, rng)
+        urls = Zipf(self.scale.urls, self.scale.zipf_s, rng)
+        for i in range(self.scale.bookmarks):
+            yield (
+                first_id + i,
+                first_user_id + owners.sample(),
+                first_url_id + urls.sample(),
+                self.sentence(rng, rng.randint(3, 30)) if rng.random() < 0.6 else None,
+                self.sentence(rng, rng.randint(5, 20)) if rng.random() < 0.2 else None,
+                self.timestamp(i / self.scale.bookmarks),
+            )
+
+
+# Column order of the tuples yielded by DataGenerator
+COLUMNS = {
+    "users": [
+        "id",
+        "login_id",
+        "email",
+        "username",
+        "name",
+        "bio",
+        "is_profile_complete",
+    ],
+    "sessions": ["session_token", "user_id", "expires_at", "is_active"],
+    "tags": ["id", "name"],
+    "urls": ["id", "url"],
+    "sites": ["id", "name", "owner", "email", "url", "site_metadata"],
+    "site_tag_association": ["site_id", "tag_id"],
+    "posts": [
+        "id",
+        "owner_id",
+        "title",
+        "note",
+        "is_deleted",
+        "created_at",
+        "deleted_at",
+        "archived",
+    ],
+    "post_tags": ["post_id", "tag_id"],
+    "post_urls": ["post_id", "url_id"],
+    "bookmarks": ["id", "owner_id", "url_id", "note", "highlight", "created_at"],
+}
+
+
+def batches(rows: Iterable[Tuple], size: int) -> Iterator[List[Tuple]]:
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+async def reserve_ids(conn, table: str, count: int) -> int:
+    """Take count ids from the table's sequence in one step and return the first."""
+    result = await conn.execute(
+        text(
+            "SELECT setval(pg_get_serial_sequence(:table, 'id'), "
+            "nextval(pg_get_serial_sequence(:table, 'id')) + :count - 1)"
+        ),
+        {"table": table, "count": max(count, 1)},
+    )
+    return result.scalar() - max(count, 1) + 1
+
+
+async def load(
+    scale: Scale, seed: int = 1, prefix: str = "gen", batch_size: int = 10000
+) -> Dict[str, int]:
+    """Generate the dataset and COPY it in, returning the rows loaded per table."""
+    generator = DataGenerator(scale, seed, prefix)
+    loaded = {}
+    async with engine.begin() as conn:
+        ids = {
+            table: await reserve_ids(conn, table, getattr(scale, table))
+            for table in ("users", "tags", "urls", "sites", "posts", "bookmarks")
+        }
+        tables = {
+            "users": generator.users(ids["users"]),
+            "sessions": generator.sessions(ids["users"]),
+            "tags": generator.tags(ids["tags"]),
+            "urls": generator.urls(ids["urls"]),
+            "sites": generator.sites(ids["sites"]),
+            "site_tag_association": generator.site_tags(ids["sites"], ids["tags"]),
+            "posts": generator.posts(ids["posts"], ids["users"]),
+            "post_tags": generator.post_tags(ids["posts"], ids["tags"]),
+            "post_urls": generator.post_urls(ids["posts"], ids["urls"]),
+            "bookmarks": generator.bookmarks(
+                ids["bookmarks"], ids["users"], ids["urls"]
+            ),
+        }
+
+        raw = await conn.get_raw_connection()
+        copy_conn = raw.driver_connection
+        for table, rows in tables.items():
+            start = time.perf_counter()
+            loaded[table] = 0
+            for batch in batches(rows, batch_size):
+                await copy_conn.copy_records_to_table(
+                    table, records=batch, columns=COLUMNS[table]
+                )
+                loaded[table] += len(batch)
+            log.info(
+                "table loaded",
+                extra={
+                    "table": table,
+                    "rows": loaded[table],
+                    "seconds": round(time.perf_counter() - start, 1),
+                },
+            )
+
+    # COPY skips the denormalized counters, fill them in from the loaded rows
+    await reconcile_counters()
+    async with engine.begin() as conn:
+        await conn.execute(text("ANALYZE"))
+    return loaded
+
+
+async def main(args):
+    scale = Scale.for_posts(
+        args.posts,
+        users=args.users,
+        tags=args.tags,
+        urls=args.urls,
+        bookmarks=args.bookmarks,
+        sites=args.sites,
+        zipf_s=args.zipf_s,
+        days=args.days,
+    )
+    print(f"Generating {scale} with seed {args.seed}")
+    await load(scale, args.seed, args.prefix, args.batch_size)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--posts", type=int, default=100000)
+    parser.add_argument("--users", type=int, help="defaults to posts / 50")
+    parser.add_argument("--tags", type=int, help="defaults to posts / 100")
+    parser.add_argument("--urls", type=int, help="defaults to posts / 2")
+    parser.add_argument("--bookmarks", type=int, help="defaults to posts / 2")
+    parser.add_argument("--sites", type=int, help="defaults to posts / 1000")
+    parser.add_argument("--zipf-s", type=float, help="popularity skew, default 1.1")
+    parser.add_argument("--days", type=int, help="time span of the data, default 365")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--prefix", default="gen")
+    parser.add_argument("--batch-size", type=int, default=10000)
+    asyncio.run(main(parser.parse_args()))
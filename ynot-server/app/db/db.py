@@ -1,14 +1,95 @@
+from fastapi import Request
+from sqlalchemy import event
+from sqlalchemy.engine import URL
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
 
 from app.config import settings
+from app.db.pool import InstrumentedPool
+from app.db.replica import ReplicaLagMonitor, mark_write, wrote_recently
+from app.middleware.query_stats import instrument_engine
 
-db_url = f"postgresql+asyncpg://{settings.postgres_user}:{settings.postgres_password}@db:{settings.postgres_port}/{settings.postgres_db}"
 
-engine = create_async_engine(db_url, echo=True)
+def make_engine(host: str):
+    """Build an asyncpg engine for host using the pool and statement settings."""
+    db_url = URL.create(
+        "postgresql+asyncpg",
+        username=settings.postgres_user,
+        password=settings.postgres_password,
+        host=host,
+        port=settings.postgres_port,
+        database=settings.postgres_db,
+        query={"prepared_statement_cache_size": str(settings.db_statement_cache_size)},
+    )
+    echo = settings.db_echo
+    if echo is None:
+        echo = settings.app_env == "development"
+
+    engine = create_async_engine(
+        db_url,
+        echo=echo,
+        poolclass=InstrumentedPool,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_recycle=settings.db_pool_recycle,
+        pool_pre_ping=settings.db_pool_pre_ping,
+        connect_args={
+            "server_settings": {
+                "application_name": "ynot-server",
+                "statement_timeout": str(settings.db_statement_timeout_ms),
+            }
+        },
+    )
+    instrument_engine(engine)
+    return engine
+
+
+engine = make_engine(settings.postgres_host)
 async_session = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
 
+# Optional read replica, read-only routes fall back to the primary when it is missing or lagging
+read_engine = None
+async_read_session = None
+replica_monitor = None
+if settings.postgres_replica_host:
+    read_engine = make_engine(settings.postgres_replica_host)
+    async_read_session = sessionmaker(
+        bind=read_engine, class_=AsyncSession, expire_on_commit=False
+    )
+    replica_monitor = ReplicaLagMonitor(
+        read_engine,
+        max_lag=settings.replica_max_lag_seconds,
+        interval=settings.replica_lag_check_interval,
+    )
 
-async def get_async_session():
+
+async def get_async_session(request: Request):
     async with async_session() as session:
+        # Pin the client's reads to the primary for a while after anything it commits
+        event.listen(
+            session.sync_session, "after_commit", lambda _: mark_write(request)
+        )
         yield session
+
+
+async def get_read_session(request: Request):
+    """
+    Session for read-only routes. Uses the replica unless this client wrote within
+    replica_sticky_seconds or the replica is lagging, in which case it uses the primary.
+    """
+    use_replica = (
+        async_read_session is not None
+        and not wrote_recently(request, settings.replica_sticky_seconds)
+        and await replica_monitor.is_healthy()
+    )
+    session_factory = async_read_session if use_replica else async_session
+    async with session_factory() as session:
+        yield session
+
+
+def pool_stats() -> dict:
+    stats = {"primary": engine.pool.stats()}
+    if read_engine is not None:
+        stats["replica"] = read_engine.pool.stats()
+    return stats
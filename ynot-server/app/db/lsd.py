@@ -1,49 +1,119 @@
 import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, List, Optional
 
-from psycopg2 import pool
+from fastapi import HTTPException
+from psycopg import AsyncClientCursor
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool, PoolTimeout
 
 from app.config import settings
 
 
 class LSD:
     def __init__(self):
-        self.pool = None
-
-    def connect(self):
-        """Create a threaded connection pool using psycopg2."""
-        self.pool = pool.ThreadedConnectionPool(
-            minconn=1,
-            maxconn=10,
-            dsn=(
+        self.pool: Optional[AsyncConnectionPool] = None
+
+    async def connect(self):
+        """Open the async connection pool. Connections are established in the background."""
+        self.pool = AsyncConnectionPool(
+            conninfo=(
                 f"dbname='{settings.lsd_db}' "
                 f"host='{settings.lsd_host}' "
                 f"user='{settings.lsd_user}' "
                 f"password='{settings.lsd_password}'"
             ),
+            min_size=settings.lsd_pool_min_size,
+            max_size=settings.lsd_pool_max_size,
+            # How long a checkout waits for a free connection before raising PoolTimeout
+            timeout=settings.lsd_acquire_timeout,
+            # Health check run on every checkout, broken connections are replaced transparently
+            check=AsyncConnectionPool.check_connection,
+            # Client-side parameter binding keeps the simple query protocol psycopg2 used,
+            # which is what LSD understands
+            kwargs={"cursor_factory": AsyncClientCursor},
+            open=False,
         )
+        await self.pool.open(wait=False)
 
-    def disconnect(self):
+    async def disconnect(self):
         """Close all connections in the pool."""
         if self.pool:
-            self.pool.closeall()
+            await self.pool.close()
 
-    def get_connection(self):
-        """Retrieve a connection from the pool."""
-        assert self.pool is not None, "Connection pool is not initialized!"
-        return self.pool.getconn()
+    async def fetch(
+        self, conn, query: str, params: Any = None, timeout: Optional[float] = None
+    ) -> List[dict]:
+        """
+        Run a query and return all rows. If it overruns the timeout, or the awaiting task is
+        cancelled, psycopg cancels the query on the server before the connection is released.
+        """
+        timeout = settings.lsd_query_timeout if timeout is None else timeout
 
-    def put_connection(self, conn):
-        """Return a connection to the pool."""
-        if self.pool:
-            self.pool.putconn(conn)
+        async def run():
+            async with conn.cursor(row_factory=dict_row) as curs:
+                await curs.execute(query, params)
+                return await curs.fetchall()
+
+        return await asyncio.wait_for(run(), timeout)
+
+    async def stream(
+        self,
+        conn,
+        query: str,
+        params: Any = None,
+        batch_size: int = 100,
+        timeout: Optional[float] = None,
+    ) -> AsyncIterator[List[dict]]:
+        """
+        Run a query and yield its rows in batches, so they are converted and sent on as they
+        are read rather than all at once. LSD only speaks the simple query protocol, so the
+        result arrives in one go and the timeout applies to the query itself.
+        """
+        timeout = settings.lsd_query_timeout if timeout is None else timeout
+
+        async with conn.cursor(row_factory=dict_row) as curs:
+            await asyncio.wait_for(curs.execute(query, params), timeout)
+            while True:
+                rows = await curs.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+
+    def stats(self) -> dict:
+        """Pool size and wait metrics, see psycopg_pool's get_stats() for the keys."""
+        if not self.pool:
+            return {}
+        return self.pool.get_stats()
 
 
 lsd = LSD()
 
 
-async def get_lsd_conn():
-    conn = await asyncio.to_thread(lsd.get_connection)
+async def checkout_lsd_connection():
+    """
+    Check out a pooled LSD connection, the caller must hand it back with lsd.pool.putconn.
+    Raises a 503 when the pool stays exhausted for lsd_acquire_timeout.
+    """
+    assert lsd.pool is not None, "Connection pool is not initialized!"
+    try:
+        return await lsd.pool.getconn()
+    except PoolTimeout as e:
+        raise HTTPException(
+            status_code=503, detail="LSD connection pool exhausted"
+        ) from e
+
+
+@asynccontextmanager
+async def lsd_connection():
+    """Check out a pooled LSD connection for the duration of the block."""
+    conn = await checkout_lsd_connection()
     try:
         yield conn
     finally:
-        await asyncio.to_thread(lsd.put_connection, conn)
+        await lsd.pool.putconn(conn)
+
+
+async def get_lsd_conn():
+    async with lsd_connection() as conn:
+        yield conn
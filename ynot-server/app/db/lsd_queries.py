@@ -0,0 +1,115 @@
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, List, Mapping, Tuple
+
+from app.cache import SWRCache
+from app.db.lsd import checkout_lsd_connection, lsd, lsd_connection
+
+
+@dataclass(frozen=True)
+class LSDQuery:
+    """
+    A named LSD query exposed under /api/lsd/{name}. Parameters are bound client-side
+    with psycopg's %(name)s placeholders.
+    """
+
+    name: str
+    sql: str
+    params: Dict[str, type] = field(default_factory=dict)
+    ttl: float = 0  # seconds a result is cached for, 0 streams straight from LSD
+    batch_size: int = 100
+
+
+LSD_QUERIES: Dict[str, LSDQuery] = {}
+
+
+def register(query: LSDQuery) -> LSDQuery:
+    if query.name in LSD_QUERIES:
+        raise ValueError(f"LSD query {query.name} is already registered")
+    LSD_QUERIES[query.name] = query
+    return query
+
+
+register(
+    LSDQuery(
+        name="hn-top-posts",
+        sql="""
+        FROM https://news.ycombinator.com
+        |> GROUP BY span.titleline
+        |> SELECT a AS post
+        """,
+        ttl=120,
+    )
+)
+
+
+# Shared by every cached query, each entry carries its own query's TTL
+lsd_query_cache = SWRCache(ttl=0)
+
+
+def parse_params(query: LSDQuery, raw: Mapping[str, str]) -> Dict[str, object]:
+    """Coerce raw query string values to the declared parameter types."""
+    unknown = set(raw) - set(query.params)
+    if unknown:
+        raise ValueError(f"Unknown parameters: {', '.join(sorted(unknown))}")
+    missing = set(query.params) - set(raw)
+    if missing:
+        raise ValueError(f"Missing parameters: {', '.join(sorted(missing))}")
+    try:
+        return {key: cast(raw[key]) for key, cast in query.params.items()}
+    except ValueError as e:
+        raise ValueError(f"Invalid parameter value: {e}") from e
+
+
+async def stream_rows(
+    query: LSDQuery, params: Dict[str, object]
+) -> AsyncIterator[List[dict]]:
+    """
+    Return an iterator over result batches for query, from the cache when the query has a
+    TTL. Uncached queries check out their LSD connection here, before the caller starts a
+    response, and the iterator hands it back once it is exhausted or closed.
+    """
+    if query.ttl > 0:
+        return _batches(await fetch_rows(query, params), query.batch_size)
+
+    conn = await checkout_lsd_connection()
+
+    async def stream() -> AsyncIterator[List[dict]]:
+        try:
+            async for batch in lsd.stream(
+                conn, query.sql, params or None, batch_size=query.batch_size
+            ):
+                yield batch
+        finally:
+            await lsd.pool.putconn(conn)
+
+    return stream()
+
+
+async def fetch_rows(query: LSDQuery, params: Dict[str, object]) -> List[dict]:
+    """Return the full result for query through the cache, coalescing concurrent misses."""
+    return await lsd_query_cache.get(
+        _cache_key(query, params), _loader(query, params), ttl=query.ttl
+    )
+
+
+def warm(name: str):
+    """Start loading a cached query in the background."""
+    query = LSD_QUERIES[name]
+    lsd_query_cache.refresh(_cache_key(query, {}), _loader(query, {}), ttl=query.ttl)
+
+
+def _loader(query: LSDQuery, params: Dict[str, object]):
+    async def load() -> List[dict]:
+        async with lsd_connection() as conn:
+            return await lsd.fetch(conn, query.sql, params or None)
+
+    return load
+
+
+async def _batches(rows: List[dict], size: int) -> AsyncIterator[List[dict]]:
+    for start in range(0, len(rows), size):
+        yield rows[start : start + size]
+
+
+def _cache_key(query: LSDQuery, params: Dict[str, object]) -> Tuple:
+    return (query.name, tuple(sorted(params.items())))
@@ -0,0 +1,14 @@
+from typing import List
+
+from app.db.migrations import (v0001_url_previews, v0002_hot_path_indexes,
+                               v0003_counters, v0004_partition_posts,
+                               v0005_site_neighbors)
+from app.db.migrations.base import Migration
+
+MIGRATIONS: List[Migration] = [
+    v0001_url_previews.migration,
+    v0002_hot_path_indexes.migration,
+    v0003_counters.migration,
+    v0004_partition_posts.migration,
+    v0005_site_neighbors.migration,
+]
@@ -0,0 +1,15 @@
+from dataclasses import dataclass
+from typing import List
+
+
+@dataclass(frozen=True)
+class Migration:
+    """
+    A schema change, applied once by create_tables and recorded in schema_version.
+    Statements must still be idempotent, since databases created before schema_version
+    replay every migration once.
+    """
+
+    version: int
+    name: str
+    statements: List[str]
@@ -0,0 +1,13 @@
+from app.db.migrations.base import Migration
+
+migration = Migration(
+    version=1,
+    name="url_previews",
+    statements=[
+        "ALTER TABLE urls ADD COLUMN IF NOT EXISTS title VARCHAR",
+        "ALTER TABLE urls ADD COLUMN IF NOT EXISTS description TEXT",
+        "ALTER TABLE urls ADD COLUMN IF NOT EXISTS image_url VARCHAR",
+        "ALTER TABLE urls ADD COLUMN IF NOT EXISTS site_name VARCHAR",
+        "ALTER TABLE urls ADD COLUMN IF NOT EXISTS preview_fetched_at TIMESTAMP WITH TIME ZONE",
+    ],
+)
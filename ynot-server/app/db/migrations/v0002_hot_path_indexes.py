@@ -0,0 +1,22 @@
+from app.db.migrations.base import Migration
+
+# Index names match the ones SQLAlchemy generates from the models, so create_all on a
+# fresh database and this migration on an existing one end up with the same schema.
+migration = Migration(
+    version=2,
+    name="hot_path_indexes",
+    statements=[
+        # Profile feed: WHERE owner_id = ? ORDER BY created_at DESC
+        "CREATE INDEX IF NOT EXISTS ix_posts_owner_id_created_at ON posts (owner_id, created_at)",
+        # Recent posts feed: ORDER BY created_at DESC LIMIT ?
+        "CREATE INDEX IF NOT EXISTS ix_posts_created_at ON posts (created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_bookmarks_owner_id_created_at ON bookmarks (owner_id, created_at)",
+        # Url upserts in create_post and create_bookmark look urls up by value
+        "CREATE INDEX IF NOT EXISTS ix_urls_url ON urls (url)",
+        "CREATE INDEX IF NOT EXISTS ix_sessions_user_id ON sessions (user_id)",
+        # The association tables' primary keys lead with the other column
+        "CREATE INDEX IF NOT EXISTS ix_post_tags_tag_id ON post_tags (tag_id)",
+        "CREATE INDEX IF NOT EXISTS ix_post_urls_url_id ON post_urls (url_id)",
+        "CREATE INDEX IF NOT EXISTS ix_site_tag_association_tag_id ON site_tag_association (tag_id)",
+    ],
+)
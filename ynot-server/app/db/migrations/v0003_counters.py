@@ -0,0 +1,14 @@
+from app.db.counters import RECONCILE_STATEMENTS
+from app.db.migrations.base import Migration
+
+migration = Migration(
+    version=3,
+    name="counters",
+    statements=[
+        "ALTER TABLE users ADD COLUMN IF NOT EXISTS post_count INTEGER NOT NULL DEFAULT 0",
+        "ALTER TABLE users ADD COLUMN IF NOT EXISTS bookmark_count INTEGER NOT NULL DEFAULT 0",
+        "ALTER TABLE tags ADD COLUMN IF NOT EXISTS usage_count INTEGER NOT NULL DEFAULT 0",
+        # Backfill from the existing rows
+        *RECONCILE_STATEMENTS.values(),
+    ],
+)
@@ -0,0 +1,81 @@
+from app.db.migrations.base import Migration
+
+# Rebuilds posts as a partitioned table:
+#
+#   posts                 PARTITION BY LIST (archived)
+#   ├── posts_live        FOR VALUES IN (false), PARTITION BY RANGE (created_at)
+#   │   ├── posts_YYYY_MM one per month, created ahead of time by app.db.partitions
+#   │   └── posts_live_default
+#   └── posts_archive     FOR VALUES IN (true)
+#
+# Postgres requires the partition keys in the primary key, and only allows foreign keys
+# to a partitioned table through a unique key that includes them, so the post_id foreign
+# keys on post_tags and post_urls are dropped. delete_post and app.db.partitions remove
+# link rows instead. The block is skipped once posts is partitioned. Partitions past the
+# first three months ahead are left to app.db.partitions.ensure_partitions.
+CONVERT_POSTS = """
+DO $$
+DECLARE
+    month timestamptz;
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = 'posts'::regclass) = 'p' THEN
+        RETURN;
+    END IF;
+
+    ALTER TABLE post_tags DROP CONSTRAINT IF EXISTS post_tags_post_id_fkey;
+    ALTER TABLE post_urls DROP CONSTRAINT IF EXISTS post_urls_post_id_fkey;
+
+    -- Free up the names the new table takes over, and keep the id sequence alive
+    ALTER TABLE posts RENAME TO posts_unpartitioned;
+    ALTER TABLE posts_unpartitioned RENAME CONSTRAINT posts_pkey TO posts_unpartitioned_pkey;
+    DROP INDEX IF EXISTS ix_posts_id;
+    DROP INDEX IF EXISTS ix_posts_created_at;
+    DROP INDEX IF EXISTS ix_posts_owner_id_created_at;
+    ALTER SEQUENCE posts_id_seq OWNED BY NONE;
+
+    CREATE TABLE posts (LIKE posts_unpartitioned INCLUDING DEFAULTS INCLUDING CONSTRAINTS)
+        PARTITION BY LIST (archived);
+    ALTER TABLE posts ADD PRIMARY KEY (id, archived, created_at);
+    ALTER TABLE posts ADD FOREIGN KEY (owner_id) REFERENCES users (id);
+
+    CREATE TABLE posts_archive PARTITION OF posts FOR VALUES IN (true);
+    CREATE TABLE posts_live PARTITION OF posts FOR VALUES IN (false)
+        PARTITION BY RANGE (created_at);
+    CREATE TABLE posts_live_default PARTITION OF posts_live DEFAULT;
+
+    FOR month IN
+        SELECT generate_series(
+            date_trunc('month', coalesce(min(created_at), now())),
+            date_trunc('month', now()) + interval '3 months',
+            interval '1 month'
+        )
+        FROM posts_unpartitioned
+    LOOP
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF posts_live FOR VALUES FROM (%L) TO (%L)',
+            'posts_' || to_char(month, 'YYYY_MM'),
+            month,
+            month + interval '1 month'
+        );
+    END LOOP;
+
+    INSERT INTO posts SELECT * FROM posts_unpartitioned;
+    DROP TABLE posts_unpartitioned;
+    ALTER SEQUENCE posts_id_seq OWNED BY posts.id;
+
+    -- Indexes on the parent cascade to every partition, including ones created later
+    CREATE INDEX ix_posts_id ON posts (id);
+    CREATE INDEX ix_posts_created_at ON posts (created_at);
+    CREATE INDEX ix_posts_owner_id_created_at ON posts (owner_id, created_at);
+END $$
+"""
+
+migration = Migration(
+    version=4,
+    name="partition_posts",
+    statements=[
+        "ALTER TABLE posts ADD COLUMN IF NOT EXISTS archived BOOLEAN NOT NULL DEFAULT false",
+        "ALTER TABLE posts ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMP WITH TIME ZONE",
+        CONVERT_POSTS,
+    ],
+)
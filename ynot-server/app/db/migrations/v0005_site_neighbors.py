@@ -0,0 +1,19 @@
+from app.db.migrations.base import Migration
+
+# Filled by app.services.related_sites. The primary key doubles as the index for
+# WHERE site_id = ? ORDER BY rank, so /api/sites/{id}/related is a single index scan.
+migration = Migration(
+    version=5,
+    name="site_neighbors",
+    statements=[
+        """
+        CREATE TABLE IF NOT EXISTS site_neighbors (
+            site_id INTEGER NOT NULL REFERENCES sites (id) ON DELETE CASCADE,
+            rank INTEGER NOT NULL,
+            neighbor_id INTEGER NOT NULL REFERENCES sites (id) ON DELETE CASCADE,
+            score FLOAT NOT NULL,
+            PRIMARY KEY (site_id, rank)
+        )
+        """,
+    ],
+)
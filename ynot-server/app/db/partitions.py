@@ -0,0 +1,157 @@
+"""
+Maintenance for the partitioned posts table (see migration v0004).
+
+Creates the monthly posts_live partitions ahead of time, moves soft-deleted posts into
+posts_archive once they are old enough and deletes tag and url links left without a
+post. Runs periodically from the app's lifespan, or by hand:
+
+    python -m app.db.partitions
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timezone
+
+from sqlalchemy import text
+
+from app.config import settings
+from app.db.db import engine
+
+log = logging.getLogger(__name__)
+
+# Arbitrary key for pg_try_advisory_xact_lock, so only one worker runs maintenance at a time
+MAINTENANCE_LOCK_KEY = 7_316_001
+
+
+def month_start(when: datetime, months_ahead: int = 0) -> datetime:
+    month_index = when.year * 12 + when.month - 1 + months_ahead
+    return datetime(month_index // 12, month_index % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+async def ensure_partitions(conn, months_ahead: int) -> list:
+    """
+    Create monthly partitions from the current month to months_ahead. Rows that landed in
+    posts_live_default for a missing month are moved into the new partition before it is
+    attached, since Postgres refuses to attach a range the default partition already holds.
+    """
+    created = []
+    now = datetime.now(timezone.utc)
+    for offset in range(months_ahead + 1):
+        start = month_start(now, offset)
+        end = month_start(now, offset + 1)
+        name = f"posts_{start:%Y_%m}"
+
+        exists = await conn.scalar(text("SELECT to_regclass(:name)"), {"name": name})
+        if exists:
+            continue
+
+        await conn.execute(text(f"CREATE TABLE {name} (LIKE posts INCLUDING DEFAULTS)"))
+        await conn.execute(
+            text(
+                f"""
+                WITH moved AS (
+                    DELETE FROM posts_live_default
+                    WHERE created_at >= :start AND created_at < :end
+                    RETURNING *
+                )
+                INSERT INTO {name} SELECT * FROM moved
+                """
+            ),
+            {"start": start, "end": end},
+        )
+        await conn.execute(
+            text(
+                f"ALTER TABLE posts_live ATTACH PARTITION {name} "
+                f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+            )
+        )
+        created.append(name)
+    return created
+
+
+async def archive_deleted_posts(conn, older_than_days: int) -> int:
+    """
+    Move posts soft-deleted more than older_than_days ago into posts_archive, dropping
+    their tag and url links on the way.
+    """
+    # Updating the partition key makes Postgres move the rows between partitions
+    result = await conn.execute(
+        text(
+            """
+            WITH archived AS (
+                UPDATE posts SET archived = true
+                WHERE archived = false
+                  AND is_deleted
+                  AND coalesce(deleted_at, created_at) < now() - make_interval(days => :days)
+                RETURNING id
+            ), tags AS (
+                DELETE FROM post_tags WHERE post_id IN (SELECT id FROM archived)
+            ), urls AS (
+                DELETE FROM post_urls WHERE post_id IN (SELECT id FROM archived)
+            )
+            SELECT count(*) FROM archived
+            """
+        ),
+        {"days": older_than_days},
+    )
+    return result.scalar()
+
+
+async def delete_orphaned_links(conn) -> int:
+    """
+    Delete post_tags and post_urls rows whose post no longer exists. posts can't be
+    referenced by a foreign key since it was partitioned, so nothing else removes them
+    when a post is deleted outside the app.
+    """
+    removed = 0
+    for table in ("post_tags", "post_urls"):
+        result = await conn.execute(
+            text(
+                f"""
+                DELETE FROM {table}
+                WHERE NOT EXISTS (SELECT 1 FROM posts WHERE posts.id = {table}.post_id)
+                """
+            )
+        )
+        removed += result.rowcount
+    return removed
+
+
+async def run_maintenance() -> dict:
+    """Run one maintenance pass unless another worker holds the lock."""
+    async with engine.begin() as conn:
+        locked = await conn.scalar(
+            text("SELECT pg_try_advisory_xact_lock(:key)"),
+            {"key": MAINTENANCE_LOCK_KEY},
+        )
+        if not locked:
+            return {}
+        created = await ensure_partitions(conn, settings.posts_partition_months_ahead)
+        archived = await archive_deleted_posts(conn, settings.posts_archive_after_days)
+        orphans = await delete_orphaned_links(conn)
+    return {
+        "created_partitions": created,
+        "archived_posts": archived,
+        "orphaned_links": orphans,
+    }
+
+
+async def maintenance_loop():
+    """Run maintenance now and then every partition_maintenance_interval_hours."""
+    while True:
+        try:
+            result = await run_maintenance()
+            if any(result.values()):
+                log.info("posts partition maintenance", extra=result)
+        except Exception:
+            log.exception("posts partition maintenance failed")
+        await asyncio.sleep(settings.partition_maintenance_interval_hours * 3600)
+
+
+async def main():
+    print(await run_maintenance())
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
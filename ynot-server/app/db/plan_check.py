@@ -0,0 +1,208 @@
+"""
+Query plan regression check for the router queries.
+
+Runs the statements behind the hot API routes, built with the same app.db.queries
+functions the routes use, records every query they issue (including the follow-ups
+selectinload runs for relationships) and EXPLAINs each one. Fails when any of them plans
+a sequential scan over a table that grows with usage. Point it at a scratch database;
+with --seed it first fills that database with synthetic rows from app.db.datagen so the
+planner sees realistic table sizes and skew:
+
+    python -m app.db.plan_check --seed 200000
+
+tests/test_query_plans.py runs the same checks with sequential scans disabled, so on
+a small test database they fail only where no index can serve the query.
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, List, Tuple
+
+from sqlalchemy import Select, event, select
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from app.db import queries
+from app.db.datagen import Scale, load
+from app.db.db import engine
+from app.models.models import Tag, Url, User, UserSession, post_tags, post_urls
+
+# Tables whose size grows with usage. A Seq Scan on any of these in a hot path fails the check.
+HOT_TABLES = {
+    "posts",
+    "bookmarks",
+    "urls",
+    "users",
+    "sessions",
+    "post_tags",
+    "post_urls",
+}
+
+
+@dataclass
+class Sample:
+    """Existing values to run the checked queries with."""
+
+    user_id: int
+    username: str
+    session_token: str
+    tag_id: int
+    tag_names: List[str]
+    url_id: int
+    urls: List[str]
+
+
+# Statements behind the router handlers and the lookups by foreign key they rely on
+PLAN_CHECKS: Dict[str, Callable[[Sample], Select]] = {
+    "user by username (user routes)": lambda s: queries.user_by_username(s.username),
+    "session by token (LoadUserMiddleware)": lambda s: queries.session_by_token(
+        s.session_token
+    ),
+    "profile posts (get_posts)": lambda s: queries.user_posts(s.user_id),
+    "bookmarks (get_bookmarks)": lambda s: queries.user_bookmarks(s.user_id),
+    "recent posts (get_recent_posts)": lambda s: queries.recent_posts(10),
+    "tags by name (create_post)": lambda s: queries.tags_by_name(s.tag_names),
+    "urls by value (create_post, create_bookmark)": lambda s: queries.urls_by_value(
+        s.urls
+    ),
+    "sessions by user": lambda s: select(UserSession).where(
+        UserSession.user_id == s.user_id
+    ),
+    "posts by tag": lambda s: select(post_tags.c.post_id).where(
+        post_tags.c.tag_id == s.tag_id
+    ),
+    "posts by url": lambda s: select(post_urls.c.post_id).where(
+        post_urls.c.url_id == s.url_id
+    ),
+}
+
+
+def iter_nodes(plan: Dict) -> Iterator[Dict]:
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from iter_nodes(child)
+
+
+def table_name(relation: str) -> str:
+    """Map a partition of posts (posts_live, posts_2024_05, ...) back to its table."""
+    if relation.startswith("posts_") and relation not in HOT_TABLES:
+        return "posts"
+    return relation
+
+
+def seq_scans(plan: Dict) -> List[str]:
+    """Hot tables read with a sequential scan anywhere in the plan."""
+    return sorted(
+        {
+            node["Relation Name"]
+            for node in iter_nodes(plan)
+            if node["Node Type"] == "Seq Scan"
+            and table_name(node.get("Relation Name", "")) in HOT_TABLES
+        }
+    )
+
+
+async def seed(posts: int) -> bool:
+    """Fill the database with plan check rows, False if they were already there."""
+    async with engine.connect() as conn:
+        existing = await conn.scalar(
+            select(User.id).where(User.username == "plan_user_1")
+        )
+    if existing:
+        return False
+    await load(Scale.for_posts(posts, tags=500), seed=1, prefix="plan")
+    return True
+
+
+async def sample(conn: AsyncConnection) -> Sample:
+    """The user with the most posts, so their queries see the worst skew."""
+    user = (
+        await conn.execute(
+            select(User.id, User.username).order_by(User.post_count.desc()).limit(1)
+        )
+    ).one()
+    session_token = await conn.scalar(
+        select(UserSession.session_token).where(UserSession.user_id == user.id).limit(1)
+    )
+    tags = (
+        await conn.execute(
+            select(Tag.id, Tag.name).order_by(Tag.usage_count.desc()).limit(5)
+        )
+    ).all()
+    urls = (await conn.execute(select(Url.id, Url.url).limit(5))).all()
+    return Sample(
+        user_id=user.id,
+        username=user.username,
+        session_token=session_token or "",
+        tag_id=tags[0].id,
+        tag_names=[tag.name for tag in tags],
+        url_id=urls[0].id,
+        urls=[url.url for url in urls],
+    )
+
+
+async def executed_statements(
+    conn: AsyncConnection, statement: Select
+) -> List[Tuple[str, tuple]]:
+    """Run statement through the ORM and return every SQL statement it issued."""
+    issued = []
+
+    def record(conn, cursor, sql, parameters, context, executemany):
+        issued.append((sql, parameters))
+
+    event.listen(conn.sync_connection, "before_cursor_execute", record)
+    try:
+        async with AsyncSession(bind=conn) as session:
+            result = await session.execute(statement)
+            result.unique().all()
+    finally:
+        event.remove(conn.sync_connection, "before_cursor_execute", record)
+    return issued
+
+
+async def plan_failures(conn: AsyncConnection, name: str, sample: Sample) -> List[str]:
+    """Hot tables any query of the named check reads with a sequential scan."""
+    scans = set()
+    for sql, parameters in await executed_statements(conn, PLAN_CHECKS[name](sample)):
+        result = await conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {sql}", parameters)
+        plan = result.scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        scans.update(seq_scans(plan[0]["Plan"]))
+    return sorted(scans)
+
+
+async def check() -> bool:
+    ok = True
+    async with engine.connect() as conn:
+        values = await sample(conn)
+        for name in PLAN_CHECKS:
+            scans = await plan_failures(conn, name, values)
+            if scans:
+                ok = False
+                print(f"FAIL  {name}: sequential scan on {', '.join(scans)}")
+            else:
+                print(f"ok    {name}")
+    return ok
+
+
+async def main(args):
+    if args.seed:
+        await seed(args.seed)
+    ok = await check()
+    await engine.dispose()
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=0,
+        metavar="POSTS",
+        help="insert this many synthetic posts (plus users, urls, tags and bookmarks) first",
+    )
+    sys.exit(0 if asyncio.run(main(parser.parse_args())) else 1)
@@ -0,0 +1,86 @@
+"""
+Select statements behind the hot API routes.
+
+The routes and app.db.plan_check build their queries with these functions, so the plan
+check explains exactly what the routes run.
+"""
+
+from datetime import datetime
+from typing import Optional, Sequence
+
+from sqlalchemy import Select, select
+from sqlalchemy.orm import joinedload, selectinload
+
+from app.models.models import Bookmark, Post, Tag, Url, User, UserSession
+
+
+def user_by_username(username: str) -> Select:
+    return select(User).where(User.username == username)
+
+
+def session_by_token(session_token: str) -> Select:
+    """A session with its user, as LoadUserMiddleware loads it on every request."""
+    return (
+        select(UserSession)
+        .options(joinedload(UserSession.user))
+        .where(UserSession.session_token == session_token)
+    )
+
+
+def user_posts(user_id: int) -> Select:
+    """Live posts of a user with their tags and urls, newest first."""
+    return (
+        select(Post)
+        .options(joinedload(Post.tags), joinedload(Post.urls))
+        .where(
+            Post.owner_id == user_id,
+            Post.archived == False,
+            Post.is_deleted.isnot(True),
+        )
+        .order_by(Post.created_at.desc())
+    )
+
+
+def feed_post(post_id: int) -> Select:
+    """A post with what FrontendPost serializes, as sent to the feed."""
+    return (
+        select(Post)
+        .options(joinedload(Post.tags), joinedload(Post.owner), joinedload(Post.urls))
+        .where(Post.id == post_id)
+    )
+
+
+def user_bookmarks(user_id: int) -> Select:
+    return (
+        select(Bookmark)
+        .options(selectinload(Bookmark.url))
+        .where(Bookmark.owner_id == user_id)
+        .order_by(Bookmark.created_at.desc())
+    )
+
+
+def recent_posts(limit: int, before: Optional[datetime] = None) -> Select:
+    """
+    The newest live posts, optionally older than before. Filtering on archived and
+    created_at lets Postgres prune to the newest posts_live partitions.
+    """
+    query = (
+        select(Post)
+        .options(
+            selectinload(Post.owner), selectinload(Post.tags), selectinload(Post.urls)
+        )
+        .where(Post.archived == False, Post.is_deleted.isnot(True))
+        .order_by(Post.created_at.desc())
+        .limit(limit)
+    )
+    if before:
+        query = query.where(Post.created_at < before)
+    return query
+
+
+def tags_by_name(names: Sequence[str]) -> Select:
+    return select(Tag).where(Tag.name.in_(names))
+
+
+def urls_by_value(urls: Sequence[str]) -> Select:
+    return select(Url).where(Url.url.in_(urls))
@@ -0,0 +1,74 @@
+import asyncio
+import logging
+import time
+from typing import Optional
+
+from fastapi import Request
+from sqlalchemy import text
+
+log = logging.getLogger(__name__)
+
+# Key in the signed session cookie holding the wall-clock time of the client's last commit
+LAST_WRITE_KEY = "last_write_at"
+
+REPLICA_LAG_QUERY = text(
+    """
+    SELECT CASE
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+    """
+)
+
+
+def mark_write(request: Request):
+    """Record that this client just wrote, so its next reads stay on the primary."""
+    # SessionMiddleware is only installed for the development and production environments
+    if "session" in request.scope:
+        request.session[LAST_WRITE_KEY] = time.time()
+
+
+def wrote_recently(request: Request, window: float) -> bool:
+    if "session" not in request.scope:
+        return False
+    last_write = request.session.get(LAST_WRITE_KEY)
+    return last_write is not None and time.time() - last_write < window
+
+
+class ReplicaLagMonitor:
+    """
+    Tracks replication lag on a replica engine. The lag is measured at most once per
+    interval, by whichever request first finds the last measurement expired; the replica
+    counts as unhealthy when it lags too far or can't be reached.
+    """
+
+    def __init__(self, engine, max_lag: float, interval: float, timeout: float = 1.0):
+        self.engine = engine
+        self.max_lag = max_lag
+        self.interval = interval
+        self.timeout = timeout
+        self.lag: Optional[float] = None
+        self.checked_at = float("-inf")
+        self._lock = asyncio.Lock()
+
+    async def is_healthy(self) -> bool:
+        if time.monotonic() - self.checked_at > self.interval:
+            async with self._lock:
+                # Another request may have refreshed the measurement while we waited
+                if time.monotonic() - self.checked_at > self.interval:
+                    await self._measure()
+        return self.lag is not None and self.lag <= self.max_lag
+
+    async def _measure(self):
+        try:
+            self.lag = await asyncio.wait_for(self._query_lag(), self.timeout)
+        except Exception as e:
+            log.warning("replica lag check failed", extra={"error": str(e)})
+            self.lag = None
+        finally:
+            self.checked_at = time.monotonic()
+
+    async def _query_lag(self) -> float:
+        async with self.engine.connect() as conn:
+            result = await conn.execute(REPLICA_LAG_QUERY)
+            return float(result.scalar() or 0)
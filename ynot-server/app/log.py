@@ -0,0 +1,114 @@
+"""
+Structured logging for the app.
+
+Records are put on a queue by the handler on the root logger and written to stdout as
+JSON lines by a QueueListener thread, so logging never blocks the event loop on I/O.
+Values under secret-looking keys, JWTs and Authorization/DPoP header values are
+redacted before records are queued. Call sites log through the standard library:
+
+    log = logging.getLogger(__name__)
+    log.info("post created", extra={"post_id": post.id})
+
+High-volume messages pass a sample rate and only that fraction is kept:
+
+    log.debug("ws message", extra={"sample_rate": settings.log_sample_rate})
+"""
+
+import atexit
+import json
+import logging
+import queue
+import random
+import re
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Optional
+
+from app.config import settings
+
+REDACTED = "[redacted]"
+SECRET_KEY = re.compile(
+    r"token|secret|password|authorization|cookie|dpop|jwt|jwk|private|session",
+    re.I,
+)
+SECRET_VALUE = re.compile(
+    # JWTs, and credentials following an auth scheme
+    r"eyJ[\w-]+\.[\w-]+\.[\w-]*|(?<=Bearer )[\w.~+/=-]+|(?<=DPoP )[\w.~+/=-]+",
+)
+
+# Attributes every LogRecord has, anything else came from extra=
+RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+_listener: Optional[QueueListener] = None
+
+
+def redact(value: Any, key: str = "") -> Any:
+    if key and SECRET_KEY.search(key):
+        return REDACTED
+    if isinstance(value, dict):
+        return {k: redact(v, str(k)) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [redact(v) for v in value]
+    if isinstance(value, str):
+        return SECRET_VALUE.sub(REDACTED, value)
+    return value
+
+
+class RedactingQueueHandler(QueueHandler):
+    """Renders and redacts records in the calling thread before queueing them."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = super().prepare(record)
+        record.msg = record.message = redact(record.msg)
+        for key in set(vars(record)) - RECORD_ATTRS:
+            setattr(record, key, redact(getattr(record, key), key))
+        return record
+
+
+class SamplingFilter(logging.Filter):
+    """Drops records logged with extra={"sample_rate": r} with probability 1 - r."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        rate = getattr(record, "sample_rate", None)
+        return rate is None or random.random() < rate
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key in set(vars(record)) - RECORD_ATTRS - {"sample_rate"}:
+            entry[key] = getattr(record, key)
+        return json.dumps(entry, default=str)
+
+
+def setup_logging():
+    """Route the root logger through the queue. Safe to call more than once."""
+    global _listener
+    if _listener is not None:
+        return
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    handler = RedactingQueueHandler(log_queue)
+    handler.addFilter(SamplingFilter())
+
+    stream = logging.StreamHandler(
+        sys.stderr if settings.log_stream == "stderr" else sys.stdout
+    )
+    stream.setFormatter(JsonFormatter())
+    _listener = QueueListener(log_queue, stream, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(settings.log_level.upper())
+    # uvicorn's loggers keep their own handlers by default, send them through ours
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        logging.getLogger(name).handlers = []
+        logging.getLogger(name).propagate = True
@@ -0,0 +1,176 @@
+import zlib
+from typing import List, Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # optional, gzip is used when it isn't installed
+    brotli = None
+
+# Media that is already compressed, or not worth the CPU
+SKIP_TYPES = (
+    "image/",
+    "video/",
+    "audio/",
+    "font/woff",
+    "application/zip",
+    "application/gzip",
+    "application/octet-stream",
+    "application/pdf",
+)
+# Streamed line by line, every chunk is flushed so clients see rows as they are produced
+STREAMING_TYPES = ("application/x-ndjson", "text/event-stream")
+
+
+def negotiate(headers: Headers) -> Optional[str]:
+    """Pick br or gzip from Accept-Encoding, or None to send the response as is."""
+    accepted = set()
+    for part in headers.get("accept-encoding", "").split(","):
+        name, _, params = part.partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0"):
+            continue
+        accepted.add(name.strip().lower())
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+class Compressor:
+    """Incremental br or gzip stream with the same interface for both."""
+
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        if encoding == "br":
+            self._br = brotli.Compressor(quality=brotli_quality)
+        else:
+            self._br = None
+            # wbits 16 + MAX_WBITS writes the gzip header and trailer
+            self._zlib = zlib.compressobj(
+                gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS
+            )
+
+    def compress(self, data: bytes, flush: bool = False) -> bytes:
+        if self._br:
+            out = self._br.process(data)
+            return out + self._br.flush() if flush else out
+        out = self._zlib.compress(data)
+        return out + self._zlib.flush(zlib.Z_SYNC_FLUSH) if flush else out
+
+    def finish(self) -> bytes:
+        if self._br:
+            return self._br.finish()
+        return self._zlib.flush(zlib.Z_FINISH)
+
+
+class CompressionMiddleware:
+    """
+    Compresses HTTP responses under the given path prefixes with br or gzip, whichever
+    the client accepts. Bodies under minimum_size, responses that already have a
+    Content-Encoding and already compressed media are sent untouched. Websockets pass
+    straight through.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        gzip_level: int = 6,
+        brotli_quality: int = 4,
+        paths: Tuple[str, ...] = ("/api",),
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.paths = paths
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.paths):
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate(Headers(scope=scope))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        responder = _CompressingResponder(self, encoding, send)
+        await self.app(scope, receive, responder.send)
+
+
+class _CompressingResponder:
+    def __init__(self, middleware: CompressionMiddleware, encoding: str, send: Send):
+        self.middleware = middleware
+        self.encoding = encoding
+        self.downstream = send
+        self.start: Optional[Message] = None
+        self.compressor: Optional[Compressor] = None
+        self.streaming = False
+        self.passthrough = False
+
+    async def send(self, message: Message):
+        if message["type"] == "http.response.start":
+            # Held back until the first body chunk shows whether compression is worth it
+            self.start = message
+            headers = Headers(raw=message["headers"])
+            content_type = headers.get("content-type", "")
+            self.passthrough = "content-encoding" in headers or content_type.startswith(
+                SKIP_TYPES
+            )
+            self.streaming = content_type.startswith(STREAMING_TYPES)
+            return
+
+        if message["type"] != "http.response.body":
+            await self.downstream(message)
+            return
+
+        if self.passthrough:
+            await self._send_start()
+            await self.downstream(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.compressor is None:
+            if not more_body and len(body) < self.middleware.minimum_size:
+                self.passthrough = True
+                await self._send_start()
+                await self.downstream(message)
+                return
+            self._start_compression()
+            await self._send_start()
+
+        chunks: List[bytes] = [self.compressor.compress(body, flush=self.streaming)]
+        if not more_body:
+            chunks.append(self.compressor.finish())
+        await self.downstream(
+            {
+                "type": "http.response.body",
+                "body": b"".join(chunks),
+                "more_body": more_body,
+            }
+        )
+
+    def _start_compression(self):
+        self.compressor = Compressor(
+            self.encoding,
+            self.middleware.gzip_level,
+            self.middleware.brotli_quality,
+        )
+        headers = MutableHeaders(raw=self.start["headers"])
+        headers["Content-Encoding"] = self.encoding
+        headers.add_vary_header("Accept-Encoding")
+        del headers["Content-Length"]
+        # The compressed body differs from the one the ETag was computed for
+        etag = headers.get("etag")
+        if etag and not etag.startswith("W/"):
+            headers["ETag"] = f"W/{etag}"
+
+    async def _send_start(self):
+        if self.start is not None:
+            await self.downstream(self.start)
+            self.start = None
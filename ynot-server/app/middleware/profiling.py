@@ -0,0 +1,122 @@
+"""
+Opt-in cProfile capture of individual requests.
+
+Only installed when profiling_enabled is set, so it costs nothing otherwise. A request
+is profiled when it carries a valid X-Profile signature or is picked by
+profiling_sample_rate. Profiles are written to profiling_dir, keeping the newest
+profiling_max_files, and can be downloaded from /api/profiles with a signature for that
+path. Signatures are made with profiling_secret:
+
+    python -m app.middleware.profiling /api/post
+
+cProfile sees the whole event loop, so a profile also includes whatever other requests
+ran at the same time, and only one request is profiled at a time.
+"""
+
+import cProfile
+import hashlib
+import hmac
+import os
+import random
+import re
+import sys
+import time
+from typing import List, Optional
+
+from fastapi import HTTPException, Request
+from starlette.middleware.base import (BaseHTTPMiddleware,
+                                       RequestResponseEndpoint)
+from starlette.responses import Response
+
+from app.config import settings
+
+SIGNATURE_HEADER = "X-Profile"
+SIGNATURE_TTL = 15 * 60
+
+
+def sign(path: str, expires: Optional[int] = None) -> str:
+    """Signature allowing path to be profiled, or downloaded, until expires."""
+    if expires is None:
+        expires = int(time.time()) + SIGNATURE_TTL
+    digest = hmac.new(
+        settings.profiling_secret.encode(),
+        f"{expires}:{path}".encode(),
+        hashlib.sha256,
+    ).hexdigest()
+    return f"{expires}.{digest}"
+
+
+def verify(signature: Optional[str], path: str) -> bool:
+    if not signature or not settings.profiling_secret:
+        return False
+    expires, _, _ = signature.partition(".")
+    if not expires.isdigit() or int(expires) < time.time():
+        return False
+    return hmac.compare_digest(signature, sign(path, int(expires)))
+
+
+def require_signature(request: Request):
+    """Route dependency guarding the profile downloads."""
+    if not verify(request.headers.get(SIGNATURE_HEADER), request.url.path):
+        raise HTTPException(status_code=403, detail="Invalid profiling signature")
+
+
+def list_profiles() -> List[str]:
+    """Stored profile file names, oldest first."""
+    if not os.path.isdir(settings.profiling_dir):
+        return []
+    return sorted(
+        name for name in os.listdir(settings.profiling_dir) if name.endswith(".prof")
+    )
+
+
+def store_profile(profiler: cProfile.Profile, request: Request, seconds: float) -> str:
+    os.makedirs(settings.profiling_dir, exist_ok=True)
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", request.url.path).strip("_") or "root"
+    # Names sort by capture time, so the ring drops the oldest first
+    name = f"{time.time_ns()}-{request.method}-{slug}-{seconds * 1000:.0f}ms.prof"
+    profiler.dump_stats(os.path.join(settings.profiling_dir, name))
+
+    for old in list_profiles()[: -settings.profiling_max_files]:
+        os.remove(os.path.join(settings.profiling_dir, old))
+    return name
+
+
+class ProfilingMiddleware(BaseHTTPMiddleware):
+    def __init__(self, app):
+        super().__init__(app)
+        self._busy = False
+
+    def should_profile(self, request: Request) -> bool:
+        if verify(request.headers.get(SIGNATURE_HEADER), request.url.path):
+            return True
+        return random.random() < settings.profiling_sample_rate
+
+    async def dispatch(
+        self,
+        request: Request,
+        call_next: RequestResponseEndpoint,
+    ) -> Response:
+        if self._busy or not self.should_profile(request):
+            return await call_next(request)
+
+        self._busy = True
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        profiler.enable()
+        try:
+            response = await call_next(request)
+        finally:
+            profiler.disable()
+            self._busy = False
+        name = store_profile(profiler, request, time.perf_counter() - start)
+        response.headers["X-Profile-Name"] = name
+        return response
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2 or not settings.profiling_secret:
+        sys.exit(
+            "usage: PROFILING_SECRET=... python -m app.middleware.profiling <path>"
+        )
+    print(f"{SIGNATURE_HEADER}: {sign(sys.argv[1])}")
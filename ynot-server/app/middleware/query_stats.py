@@ -0,0 +1,113 @@
+import logging
+import time
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+from fastapi import Request
+from sqlalchemy import event
+from starlette.middleware.base import (BaseHTTPMiddleware,
+                                       RequestResponseEndpoint)
+from starlette.responses import Response
+
+from app.config import settings
+from app.middleware.timing import record_span
+
+log = logging.getLogger(__name__)
+
+# A statement run this many times in one request is reported as a likely N+1
+N_PLUS_ONE_THRESHOLD = 5
+
+
+@dataclass
+class QueryStats:
+    """SQL statements issued and time spent in the database while handling one request."""
+
+    count: int = 0
+    seconds: float = 0.0
+    statements: Counter = field(default_factory=Counter)
+    budget: Optional[int] = None
+
+    def repeated(self, threshold: int = N_PLUS_ONE_THRESHOLD) -> List[Tuple[str, int]]:
+        return [(sql, n) for sql, n in self.statements.most_common() if n >= threshold]
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+# Set per request by QueryStatsMiddleware. Holds a mutable object so statements run in
+# the endpoint's task are visible to the middleware after call_next returns.
+current_query_stats: ContextVar[Optional[QueryStats]] = ContextVar(
+    "current_query_stats", default=None
+)
+
+
+def instrument_engine(engine):
+    """Count statements and their duration on an async engine into the current request's stats."""
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start_time"].pop()
+        stats = current_query_stats.get()
+        if stats is not None:
+            stats.count += 1
+            stats.seconds += elapsed
+            stats.statements[statement] += 1
+
+
+def query_budget(max_queries: int):
+    """
+    Route dependency declaring the most statements a request may issue, counting the
+    session lookup done by LoadUserMiddleware:
+
+        @router.get("/path", dependencies=[Depends(query_budget(3))])
+    """
+
+    async def declare_budget():
+        stats = current_query_stats.get()
+        if stats is not None:
+            stats.budget = max_queries
+
+    return declare_budget
+
+
+class QueryStatsMiddleware(BaseHTTPMiddleware):
+    async def dispatch(
+        self,
+        request: Request,
+        call_next: RequestResponseEndpoint,
+    ) -> Response:
+        stats = QueryStats()
+        token = current_query_stats.set(stats)
+        try:
+            response = await call_next(request)
+        finally:
+            current_query_stats.reset(token)
+        record_span("db", stats.seconds)
+
+        if settings.query_debug_headers:
+            response.headers["X-DB-Query-Count"] = str(stats.count)
+            response.headers["X-DB-Time-Ms"] = f"{stats.seconds * 1000:.1f}"
+
+        for sql, n in stats.repeated():
+            log.warning(
+                "possible N+1 query",
+                extra={"path": request.url.path, "times": n, "sql": sql},
+            )
+
+        if stats.budget is not None and stats.count > stats.budget:
+            message = (
+                f"{request.method} {request.url.path} issued {stats.count} queries, "
+                f"over its budget of {stats.budget}"
+            )
+            if settings.query_budget_strict:
+                raise QueryBudgetExceeded(message)
+            log.warning(message)
+
+        return response
@@ -0,0 +1,120 @@
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import Request
+from starlette.middleware.base import (BaseHTTPMiddleware,
+                                       RequestResponseEndpoint)
+from starlette.responses import Response
+
+from app.config import settings
+
+# Upper bounds in seconds, Prometheus' default buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+@dataclass
+class RequestTiming:
+    """Seconds spent in each named stage while handling one request."""
+
+    spans: Dict[str, float] = field(default_factory=dict)
+
+    def add(self, name: str, seconds: float):
+        self.spans[name] = self.spans.get(name, 0.0) + seconds
+
+
+# Set per request by TimingMiddleware, like current_query_stats
+current_timing: ContextVar[Optional[RequestTiming]] = ContextVar(
+    "current_timing", default=None
+)
+
+
+def record_span(name: str, seconds: float):
+    timing = current_timing.get()
+    if timing is not None:
+        timing.add(name, seconds)
+
+
+@contextmanager
+def span(name: str):
+    """
+    Time the block as a stage of the current request, e.g.
+
+        with span("broadcast"):
+            await manager.broadcast_text(text)
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(name, time.perf_counter() - start)
+
+
+@dataclass
+class Histogram:
+    counts: List[int] = field(default_factory=lambda: [0] * len(LATENCY_BUCKETS))
+    count: int = 0
+    total: float = 0.0
+
+    def observe(self, seconds: float):
+        index = bisect_left(LATENCY_BUCKETS, seconds)
+        if index < len(LATENCY_BUCKETS):
+            self.counts[index] += 1
+        self.count += 1
+        self.total += seconds
+
+
+class RouteMetrics:
+    """Per-route latency histograms and per-stage totals for this worker."""
+
+    def __init__(self):
+        self.latency: Dict[Tuple[str, str], Histogram] = defaultdict(Histogram)
+        self.span_seconds: Dict[Tuple[str, str, str], float] = defaultdict(float)
+        self.span_count: Dict[Tuple[str, str, str], int] = defaultdict(int)
+
+    def observe(self, method: str, route: str, seconds: float, spans: Dict[str, float]):
+        self.latency[(method, route)].observe(seconds)
+        for name, span_seconds in spans.items():
+            self.span_seconds[(method, route, name)] += span_seconds
+            self.span_count[(method, route, name)] += 1
+
+
+route_metrics = RouteMetrics()
+
+
+def route_label(request: Request) -> str:
+    # The matched route's template, so /api/user/{username}/posts is one series
+    route = request.scope.get("route")
+    return getattr(route, "path", "unmatched")
+
+
+class TimingMiddleware(BaseHTTPMiddleware):
+    async def dispatch(
+        self,
+        request: Request,
+        call_next: RequestResponseEndpoint,
+    ) -> Response:
+        timing = RequestTiming()
+        token = current_timing.set(timing)
+        start = time.perf_counter()
+        try:
+            response = await call_next(request)
+        finally:
+            current_timing.reset(token)
+        total = time.perf_counter() - start
+
+        route_metrics.observe(request.method, route_label(request), total, timing.spans)
+
+        if settings.server_timing_header:
+            entries = [
+                f"{name};dur={seconds * 1000:.1f}"
+                for name, seconds in timing.spans.items()
+            ]
+            entries.append(f"total;dur={total * 1000:.1f}")
+            response.headers["Server-Timing"] = ", ".join(entries)
+
+        return response
@@ -1,16 +1,22 @@
+import hmac
+import ipaddress
+import logging
 from datetime import datetime, timezone
 
 from fastapi import HTTPException, Request
-from sqlalchemy import select
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.orm import joinedload
 from starlette.middleware.base import (BaseHTTPMiddleware,
                                        RequestResponseEndpoint)
 from starlette.responses import Response
 
+from app.config import settings
+from app.db import queries
 from app.db.db import async_session
+from app.middleware.timing import span
 from app.models.models import UserSession
 
+log = logging.getLogger(__name__)
+
 
 class LoadUserMiddleware(BaseHTTPMiddleware):
     async def dispatch(
@@ -24,33 +30,37 @@ class LoadUserMiddleware(BaseHTTPMiddleware):
         session_token = request.session.get("session_token")
 
         if session_token:
-            try:
-                async with async_session() as db:
-                    query = (
-                        select(UserSession)
-                        .options(joinedload(UserSession.user))
-                        .where(UserSession.session_token == session_token)
-                    )
-                    result = await db.execute(query)
-                    session = result.scalar()
+            with span("auth"):
+                try:
+                    async with async_session() as db:
+                        result = await db.execute(
+                            queries.session_by_token(session_token)
+                        )
+                        session = result.scalar()
 
-                    # Store the user in request.state for later use
-                    if (
-                        session
-                        and session.is_active
-                        and session.expires_at > datetime.now(timezone.utc)
-                    ):
-                        request.state.session = session
-                        request.state.user = session.user
-                    else:
-                        # If session_id is invalid, clear the session to avoid errors
-                        request.session.clear()
-            except SQLAlchemyError as e:
-                print(f"Database error: {e}")
-                raise HTTPException(status_code=500, detail="Database error occured")
-            except Exception as e:
-                print(f"Unexpected error: {e}")
-                raise HTTPException(status_code=500, detail="Unexpected server error")
+                        # Store the user in request.state for later use
+                        if (
+                            session
+                            and session.is_active
+                            and session.expires_at > datetime.now(timezone.utc)
+                        ):
+                            request.state.session = session
+                            request.state.user = session.user
+                        else:
+                            # If session_id is invalid, clear the session to avoid errors
+                            request.session.clear()
+                except SQLAlchemyError as e:
+                    log.error(
+                        "database error loading session", extra={"error": str(e)}
+                    )
+                    raise HTTPException(
+                        status_code=500, detail="Database error occured"
+                    )
+                except Exception:
+                    log.exception("unexpected error loading session")
+                    raise HTTPException(
+                        status_code=500, detail="Unexpected server error"
+                    )
 
         else:
             # If no session_id in session, mark the user as not logged in
@@ -64,3 +74,24 @@ async def login_required(request: Request) -> UserSession:
     if not request.state.session:
         raise HTTPException(status_code=401, detail="Not authenticated")
     return request.state.session
+
+
+def internal_only(request: Request):
+    """
+    Route dependency for operational endpoints. Allowed with the metrics_token as a
+    bearer token, or without one from a loopback client that didn't come through a
+    proxy, so a scraper on the same host needs no setup.
+    """
+    if settings.metrics_token:
+        scheme, _, token = request.headers.get("authorization", "").partition(" ")
+        if scheme.lower() == "bearer" and hmac.compare_digest(
+            token.encode(), settings.metrics_token.encode()
+        ):
+            return
+    elif request.client and "x-forwarded-for" not in request.headers:
+        try:
+            if ipaddress.ip_address(request.client.host).is_loopback:
+                return
+        except ValueError:
+            pass
+    raise HTTPException(status_code=403, detail="Not allowed")
@@ -1,6 +1,7 @@
 import bcrypt
-from sqlalchemy import (JSON, Boolean, Column, DateTime, ForeignKey, Integer,
-                        MetaData, String, Table, Text, func)
+from sqlalchemy import (JSON, Boolean, Column, DateTime, Float, ForeignKey,
+                        Index, Integer, MetaData, PrimaryKeyConstraint, String,
+                        Table, Text, func)
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 
@@ -10,21 +11,23 @@ site_tag_association = Table(
     "site_tag_association",
     Base.metadata,
     Column("site_id", Integer, ForeignKey("sites.id"), primary_key=True),
-    Column("tag_id", Integer, ForeignKey("tags.id"), primary_key=True),
+    Column("tag_id", Integer, ForeignKey("tags.id"), primary_key=True, index=True),
 )
 
+# posts is partitioned and can't be the target of a foreign key on id alone (migration
+# v0004), so post_id is joined explicitly in the relationships below
 post_tags = Table(
     "post_tags",
     Base.metadata,
-    Column("post_id", Integer, ForeignKey("posts.id"), primary_key=True),
-    Column("tag_id", Integer, ForeignKey("tags.id"), primary_key=True),
+    Column("post_id", Integer, primary_key=True),
+    Column("tag_id", Integer, ForeignKey("tags.id"), primary_key=True, index=True),
 )
 
 post_urls = Table(
     "post_urls",
     Base.metadata,
-    Column("post_id", Integer, ForeignKey("posts.id"), primary_key=True),
-    Column("url_id", Integer, ForeignKey("urls.id"), primary_key=True),
+    Column("post_id", Integer, primary_key=True),
+    Column("url_id", Integer, ForeignKey("urls.id"), primary_key=True, index=True),
 )
 
 
@@ -41,44 +44,90 @@ class Bookmark(Base):
 
     url = relationship("Url", back_populates="bookmarks")
 
+    __table_args__ = (
+        Index("ix_bookmarks_owner_id_created_at", "owner_id", "created_at"),
+    )
+
 
 class Url(Base):
     __tablename__ = "urls"
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
-    url = Column(String, nullable=False)
+    url = Column(String, nullable=False, index=True)
     created_at = Column(
         DateTime(timezone=True), server_default=func.now(), nullable=False
     )
-
-    posts = relationship("Post", secondary=post_urls, back_populates="urls")
+    # OpenGraph/Twitter card metadata, filled in by the link preview fetcher
+    title = Column(String, nullable=True)
+    description = Column(Text, nullable=True)
+    image_url = Column(String, nullable=True)
+    site_name = Column(String, nullable=True)
+    preview_fetched_at = Column(DateTime(timezone=True), nullable=True)
+
+    posts = relationship(
+        "Post",
+        secondary=post_urls,
+        primaryjoin="Url.id == foreign(post_urls.c.url_id)",
+        secondaryjoin="Post.id == foreign(post_urls.c.post_id)",
+        back_populates="urls",
+    )
     bookmarks = relationship("Bookmark", back_populates="url")
 
 
 class Post(Base):
     __tablename__ = "posts"
 
-    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    id = Column(Integer, index=True, autoincrement=True)
     owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     title = Column(String, nullable=True)
     note = Column(Text, nullable=False)
     file_keys = Column(JSON, nullable=True)  # S3 urls for uploaded files
     is_deleted = Column(Boolean, default=False)
     created_at = Column(
-        DateTime(timezone=True), server_default=func.now(), nullable=False
+        DateTime(timezone=True), server_default=func.now(), nullable=False, index=True
+    )
+    deleted_at = Column(DateTime(timezone=True), nullable=True)
+    # Soft-deleted posts are moved into the posts_archive partition by app.db.partitions.
+    # The table is partitioned by (archived, created_at month), see migration v0004.
+    archived = Column(Boolean, nullable=False, default=False, server_default="false")
+
+    urls = relationship(
+        "Url",
+        secondary=post_urls,
+        primaryjoin="Post.id == foreign(post_urls.c.post_id)",
+        secondaryjoin="Url.id == foreign(post_urls.c.url_id)",
+        back_populates="posts",
+    )
+    tags = relationship(
+        "Tag",
+        secondary=post_tags,
+        primaryjoin="Post.id == foreign(post_tags.c.post_id)",
+        secondaryjoin="Tag.id == foreign(post_tags.c.tag_id)",
+        back_populates="posts",
     )
-
-    urls = relationship("Url", secondary=post_urls, back_populates="posts")
-    tags = relationship("Tag", secondary=post_tags, back_populates="posts")
     owner = relationship("User", back_populates="posts")
 
+    __table_args__ = (
+        # Postgres requires the partition keys in the primary key of a partitioned table
+        PrimaryKeyConstraint("id", "archived", "created_at"),
+        Index("ix_posts_owner_id_created_at", "owner_id", "created_at"),
+    )
+
 
 class Tag(Base):
     __tablename__ = "tags"
 
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     name = Column(String, unique=True, index=True)
-
-    posts = relationship("Post", secondary=post_tags, back_populates="tags")
+    # Number of live posts with this tag, see app.db.counters
+    usage_count = Column(Integer, nullable=False, default=0, server_default="0")
+
+    posts = relationship(
+        "Post",
+        secondary=post_tags,
+        primaryjoin="Tag.id == foreign(post_tags.c.tag_id)",
+        secondaryjoin="Post.id == foreign(post_tags.c.post_id)",
+        back_populates="tags",
+    )
     sites = relationship("Site", secondary=site_tag_association, back_populates="tags")
 
 
@@ -95,6 +144,23 @@ class Site(Base):
     tags = relationship("Tag", secondary=site_tag_association, back_populates="sites")
 
 
+class SiteNeighbor(Base):
+    """A precomputed similar site, filled in by app.services.related_sites."""
+
+    __tablename__ = "site_neighbors"
+
+    site_id = Column(
+        Integer, ForeignKey("sites.id", ondelete="CASCADE"), primary_key=True
+    )
+    rank = Column(Integer, primary_key=True)  # 1 is the most similar
+    neighbor_id = Column(
+        Integer, ForeignKey("sites.id", ondelete="CASCADE"), nullable=False
+    )
+    score = Column(Float, nullable=False)
+
+    neighbor = relationship("Site", foreign_keys=[neighbor_id])
+
+
 class User(Base):
     __tablename__ = "users"
 
@@ -109,6 +175,9 @@ class User(Base):
     avatar = Column(String, nullable=True)
     banner = Column(String, nullable=True)
     is_profile_complete = Column(Boolean, default=False)
+    # Denormalized counts maintained by the post and bookmark routes, see app.db.counters
+    post_count = Column(Integer, nullable=False, default=0, server_default="0")
+    bookmark_count = Column(Integer, nullable=False, default=0, server_default="0")
     created_at = Column(
         DateTime(timezone=True), server_default=func.now(), nullable=False
     )
@@ -137,7 +206,7 @@ class UserSession(Base):
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     session_token = Column(String(64), unique=True, nullable=False, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
     created_at = Column(
         DateTime(timezone=True), server_default=func.now(), nullable=False
     )
@@ -0,0 +1,141 @@
+"""
+Prerendered profile pages.
+
+/user/{username} is served as index.html with the profile, the first page of posts and
+bookmarks embedded as window.__INITIAL_DATA__, so UserProfile renders without waiting on
+the API, and with title and OpenGraph tags for link-preview crawlers. Rendered pages are
+cached per username for prerender_ttl_seconds, up to prerender_max_entries pages, and
+dropped when the user's profile, posts or bookmarks change. The cache is per worker, the
+other workers drop their copy through app.services.worker_events.
+"""
+
+import html
+import re
+from typing import Optional
+
+import orjson
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+
+from app.cache import SWRCache
+from app.config import settings
+from app.db.db import async_session
+from app.models.models import Bookmark, Post, User
+from app.schemas.schemas import BookmarkResponse, FrontendPost
+from app.services.worker_events import worker_events
+
+PROFILE_PATH = re.compile(r"^user/([^/]+)/?$")
+PAGE_SIZE = 50
+
+# Unknown usernames aren't cached, so requests for made up ones can't grow the cache
+profile_pages = SWRCache(
+    ttl=settings.prerender_ttl_seconds,
+    max_entries=settings.prerender_max_entries,
+    cache_none=False,
+)
+
+
+async def load_profile_data(username: str) -> Optional[dict]:
+    """The data UserProfile would fetch from the profile, posts and bookmarks routes."""
+    async with async_session() as db:
+        result = await db.execute(select(User).where(User.username == username))
+        user = result.scalar_one_or_none()
+        if not user:
+            return None
+
+        result = await db.execute(
+            select(Post)
+            .options(
+                selectinload(Post.owner),
+                selectinload(Post.tags),
+                selectinload(Post.urls),
+            )
+            .where(
+                Post.owner_id == user.id,
+                Post.archived == False,
+                Post.is_deleted.isnot(True),
+            )
+            .order_by(Post.created_at.desc())
+            .limit(PAGE_SIZE)
+        )
+        posts = result.scalars().all()
+
+        result = await db.execute(
+            select(Bookmark)
+            .options(selectinload(Bookmark.url))
+            .where(Bookmark.owner_id == user.id)
+            .order_by(Bookmark.created_at.desc())
+            .limit(PAGE_SIZE)
+        )
+        bookmarks = result.scalars().all()
+
+        return {
+            "username": user.username,
+            # Same fields as GetUserResponse, less the email, since this page is public HTML
+            "profile": {
+                "display_name": user.name,
+                "username": user.username,
+                "bio": user.bio,
+                "avatar": user.avatar,
+                "banner": user.banner,
+                "post_count": user.post_count,
+                "bookmark_count": user.bookmark_count,
+            },
+            "posts": [FrontendPost.serialize(post) for post in posts],
+            "bookmarks": [BookmarkResponse.serialize(b) for b in bookmarks],
+            # Lets the page skip refetching when nothing was cut off
+            "complete": len(posts) < PAGE_SIZE and len(bookmarks) < PAGE_SIZE,
+        }
+
+
+def render_profile(index_html: bytes, data: dict) -> bytes:
+    """Insert meta tags and the initial data into index.html."""
+    profile = data["profile"]
+    title = f"{profile['display_name'] or profile['username']} (@{profile['username']})"
+    description = (profile["bio"] or "")[:300]
+    meta = [
+        ("og:title", title),
+        ("og:description", description),
+        ("og:type", "profile"),
+        ("og:url", f"{settings.app_url.rstrip('/')}/user/{profile['username']}"),
+        ("twitter:card", "summary"),
+    ]
+    if profile["avatar"]:
+        meta.append(("og:image", profile["avatar"]))
+
+    head = [f"<title>{html.escape(title)}</title>"]
+    head.append(f'<meta name="description" content="{html.escape(description)}" />')
+    head += [
+        f'<meta property="{key}" content="{html.escape(value)}" />'
+        for key, value in meta
+    ]
+    # Escaping < keeps a "</script>" inside user text from closing the tag
+    initial_data = orjson.dumps(data).replace(b"<", b"\\u003c").decode()
+    head.append(f"<script>window.__INITIAL_DATA__ = {initial_data};</script>")
+
+    page = re.sub(rb"<title>.*?</title>", b"", index_html, count=1, flags=re.S)
+    return page.replace(b"</head>", "\n".join(head).encode() + b"\n</head>", 1)
+
+
+async def prerender_profile(username: str, index_html: bytes) -> Optional[bytes]:
+    """Cached prerendered page for username, or None if there is no such user."""
+
+    async def loader():
+        data = await load_profile_data(username)
+        return render_profile(index_html, data) if data else None
+
+    return await profile_pages.get(username, loader)
+
+
+def invalidate_profile(*usernames: str):
+    """Drop the cached pages of usernames, in this worker and the others."""
+    drop_profile_pages(usernames)
+    worker_events.notify("profile", orjson.dumps(usernames).decode())
+
+
+def drop_profile_pages(usernames):
+    for username in usernames:
+        profile_pages.invalidate(username)
+
+
+worker_events.subscribe("profile", lambda data: drop_profile_pages(orjson.loads(data)))
@@ -1,37 +1,63 @@
-import asyncio
-import json
+import logging
 import uuid
-from typing import List
+from datetime import datetime
+from functools import lru_cache
+from typing import List, Literal, Optional
 
-import boto3
-from fastapi import (APIRouter, Depends, File, HTTPException, Request,
+import orjson
+from fastapi import (APIRouter, Depends, File, HTTPException, Query, Request,
                      UploadFile, WebSocket, WebSocketDisconnect)
-from sqlalchemy import select, update
-from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from fastapi.responses import ORJSONResponse, Response
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import joinedload, selectinload
 
 from app.config import settings
-from app.db.db import get_async_session
-from app.db.lsd import get_lsd_conn
-from app.middleware.user_middleware import login_required
-from app.models.models import Bookmark, Post, Site, Tag, Url, UserSession
+from app.db import queries
+from app.db.db import (async_session, get_async_session, get_read_session,
+                       pool_stats)
+from app.db.lsd import lsd
+from app.db.lsd_queries import LSD_QUERIES, fetch_rows
+from app.middleware.query_stats import query_budget
+from app.middleware.timing import span
+from app.middleware.user_middleware import internal_only, login_required
+from app.models.models import (Bookmark, Post, Site, SiteNeighbor, Tag, Url,
+                               User, UserSession, post_tags, post_urls,
+                               site_tag_association)
+from app.prerender import invalidate_profile
 from app.schemas.schemas import (CreateBookmarkRequest, CreatePostRequest,
                                  DeletePostRequest, FrontendPost,
-                                 PreSignedUrlRequest, SiteBase, TagBase)
+                                 PreSignedUrlRequest, RelatedSite, SiteBase,
+                                 SiteSearchResponse, TagBase)
+from app.services import related_sites
+from app.services.link_preview import link_previews
+from app.services.site_index import get_site_index, sites_changed
+from app.services.worker_events import worker_events
 
 router = APIRouter()
+log = logging.getLogger(__name__)
 
 AWS_BUCKET_NAME = settings.aws_bucket_name
 AWS_BUCKET_NAME = "ynot-media"
 AWS_REGION = "us-west-1"
 
-s3_client = boto3.client(
-    "s3",
-    aws_access_key_id=settings.aws_access_key,
-    aws_secret_access_key=settings.aws_secret_key,
-    region_name=AWS_REGION,
-)
+
+@lru_cache(maxsize=None)
+def get_s3_client():
+    """
+    S3 client, created on first upload. boto3 is imported here too, it takes longer to
+    import than the rest of the app and only the upload routes need it.
+    """
+    import boto3
+
+    return boto3.client(
+        "s3",
+        aws_access_key_id=settings.aws_access_key,
+        aws_secret_access_key=settings.aws_secret_key,
+        region_name=AWS_REGION,
+    )
 
 
 # Store active WebSocket connections
@@ -44,24 +70,52 @@ class ConnectionManager:
         self.active_connections.append(websocket)
 
     def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
+        if websocket in self.active_connections:
+            self.active_connections.remove(websocket)
 
     async def broadcast(self, message: dict):
-        message = json.loads(json.dumps(message, default=str))
+        await self.broadcast_text(orjson.dumps(message, default=str).decode())
+
+    async def broadcast_text(self, text: str):
+        """
+        Send an already encoded message, so it is serialized once for every client. Clients
+        of the other workers get it through worker_events.
+        """
+        worker_events.notify("feed", text)
+        await self.send_local(text)
+
+    async def send_local(self, text: str):
+        """Send to the clients connected to this worker only."""
         for connection in self.active_connections:
-            await connection.send_json(message)
+            await connection.send_text(text)
 
 
 manager = ConnectionManager()
 
 
+async def send_feed_post(post_id: str):
+    """Load and send a post another worker created, for posts too large to notify."""
+    async with async_session() as db:
+        result = await db.execute(queries.feed_post(int(post_id)))
+        post = result.unique().scalar_one()
+        post_json = orjson.dumps(FrontendPost.serialize(post))
+    await manager.send_local(post_json.decode())
+
+
+worker_events.subscribe("feed", manager.send_local)
+worker_events.subscribe("feed_post", send_feed_post)
+
+
 @router.websocket("/ws/feed")
 async def websocket_feed(websocket: WebSocket):
     await manager.connect(websocket)
     try:
         while True:
             data = await websocket.receive_json()
-            print(f"Received from client: {data}")
+            log.debug(
+                "received from client",
+                extra={"data": data, "sample_rate": settings.log_sample_rate},
+            )
             await manager.broadcast(data)
     except WebSocketDisconnect:
         manager.disconnect(websocket)
@@ -184,45 +238,51 @@ sites = [
 
 
 async def insert_sample_data(session: AsyncSession):
-    """Insert sample data into the database"""
+    """
+    Insert sample data into the database, skipping tags and sites that already exist.
+    Runs a fixed four statements however many sites there are.
+    """
     async with session.begin():
-        # Insert tags if they do not exist
-        for tag in tags:
-            existing_tag = await session.execute(
-                select(Tag).where(Tag.name == tag["name"])
-            )
-            existing_tag = existing_tag.scalars().first()
-            if not existing_tag:
-                tag_obj = Tag(**tag)
-                session.add(tag_obj)
-
-        # Insert sites if they do not exist
-        for site in sites:
-            existing_site = await session.execute(
-                select(Site).where(Site.url == site["url"])
+        await session.execute(
+            pg_insert(Tag)
+            .values([{"name": tag["name"]} for tag in tags])
+            .on_conflict_do_nothing()
+        )
+        # The sample sites refer to tags by their position in `tags`, look up real ids
+        result = await session.execute(
+            select(Tag.name, Tag.id).where(Tag.name.in_([tag["name"] for tag in tags]))
+        )
+        tag_ids = dict(result.all())
+        sample_tag_ids = {tag["id"]: tag_ids[tag["name"]] for tag in tags}
+
+        result = await session.execute(
+            pg_insert(Site)
+            .values([{k: v for k, v in site.items() if k != "tags"} for site in sites])
+            .on_conflict_do_nothing()
+            .returning(Site.id, Site.url)
+        )
+        new_sites = {url: site_id for site_id, url in result.all()}
+
+        associations = [
+            {"site_id": new_sites[site["url"]], "tag_id": sample_tag_ids[tag_id]}
+            for site in sites
+            if site["url"] in new_sites
+            for tag_id in site["tags"]
+        ]
+        if associations:
+            await session.execute(
+                pg_insert(site_tag_association)
+                .values(associations)
+                .on_conflict_do_nothing()
             )
-            existing_site = existing_site.scalars().first()
-            if not existing_site:
-                tag_objs = await session.execute(
-                    select(Tag).where(Tag.id.in_(site["tags"]))
-                )
-                tag_objs = tag_objs.scalars().all()
-                site_obj = Site(
-                    name=site["name"],
-                    owner=site["owner"],
-                    email=site["email"],
-                    url=site["url"],
-                    site_metadata=site["site_metadata"],
-                    tags=tag_objs,
-                )
-                session.add(site_obj)
-        await session.commit()
 
 
 @router.get("/insert-sample-data")
 async def insert_data(session: AsyncSession = Depends(get_async_session)):
     """Insert sample data into the database"""
     await insert_sample_data(session)
+    sites_changed()
+    related_sites.schedule_refresh()
     return {"message": "Sample data inserted successfully"}
 
 
@@ -232,16 +292,82 @@ async def ping():
     return {"message": "pong"}
 
 
-@router.get("/sites", response_model=List[SiteBase])
-async def get_sites(session: AsyncSession = Depends(get_async_session)):
+@router.get("/pool-stats", dependencies=[Depends(internal_only)])
+async def get_pool_stats():
+    """Live connection pool gauges for the database and LSD pools of this worker."""
+    return {"db": pool_stats(), "lsd": lsd.stats()}
+
+
+@router.get(
+    "/sites",
+    response_model=List[SiteBase],
+    dependencies=[Depends(query_budget(3))],
+)
+async def get_sites(session: AsyncSession = Depends(get_read_session)):
     """Get all sites"""
     result = await session.execute(select(Site).options(joinedload(Site.tags)))
     sites = result.unique().scalars().all()
     return sites
 
 
+@router.get(
+    "/sites/search",
+    response_model=SiteSearchResponse,
+    response_class=ORJSONResponse,
+)
+async def search_sites(
+    tag: List[str] = Query(default=[]),
+    mode: Literal["and", "or"] = "and",
+    q: str = "",
+    offset: int = Query(default=0, ge=0),
+    limit: int = Query(default=24, ge=1, le=100),
+):
+    """
+    Filter the site directory by tags, matching all of them with mode=and or any with
+    mode=or, and by name or owner prefix, e.g.
+
+        /api/sites/search?tag=art&tag=music&mode=or&q=ja
+
+    Answered from the in-memory site index, with tag facet counts for the matches.
+    """
+    index = await get_site_index()
+    return ORJSONResponse(
+        index.search(
+            tags=tag, match_all=mode == "and", query=q, offset=offset, limit=limit
+        )
+    )
+
+
+@router.get(
+    "/sites/{site_id}/related",
+    response_model=List[RelatedSite],
+    dependencies=[Depends(query_budget(3))],
+)
+async def get_related_sites(
+    site_id: int,
+    limit: int = Query(default=10, ge=1, le=50),
+    session: AsyncSession = Depends(get_read_session),
+):
+    """
+    The sites most similar to site_id by their tags, best first. Reads the neighbours
+    precomputed by app.services.related_sites, so a site added since the last refresh
+    has none yet, and an unknown site_id returns an empty list.
+    """
+    result = await session.execute(
+        select(SiteNeighbor)
+        .options(selectinload(SiteNeighbor.neighbor).selectinload(Site.tags))
+        .where(SiteNeighbor.site_id == site_id)
+        .order_by(SiteNeighbor.rank)
+        .limit(limit)
+    )
+    return [
+        {"site": neighbor.neighbor, "score": neighbor.score}
+        for neighbor in result.scalars()
+    ]
+
+
 @router.get("/tags", response_model=List[TagBase])
-async def get_tags(session: AsyncSession = Depends(get_async_session)):
+async def get_tags(session: AsyncSession = Depends(get_read_session)):
     result = await session.execute(select(Tag))
     tags = result.scalars().all()
     return tags
@@ -254,7 +380,7 @@ async def generate_presigned_url(request: PreSignedUrlRequest):
     """
     try:
         unique_filename = f"{uuid.uuid4()}-{request.file_name}".replace(" ", "_")
-        presigned_url = s3_client.generate_presigned_url(
+        presigned_url = get_s3_client().generate_presigned_url(
             "put_object",
             Params={
                 "Bucket": AWS_BUCKET_NAME,
@@ -303,7 +429,7 @@ async def batch_upload(
             public_url = f"https://{AWS_BUCKET_NAME}.s3.{AWS_REGION}.amazonaws.com/{unique_filename}"
 
             # Upload file to S3
-            s3_client.put_object(
+            get_s3_client().put_object(
                 Bucket=AWS_BUCKET_NAME,
                 Key=unique_filename,
                 ContentType=file.content_type,
@@ -328,8 +454,7 @@ async def create_bookmark(
     Endpoint to create a bookmark from the Y Chrome extension. A bookmark has attributes URL, highlight, and note. Highlight and note are optional.
     """
 
-    stmt = select(Url).where(Url.url == request.url)
-    result = await db.execute(stmt)
+    result = await db.execute(queries.urls_by_value([request.url]))
     url_instance = result.scalar_one_or_none()
 
     if not url_instance:
@@ -341,7 +466,7 @@ async def create_bookmark(
             await db.refresh(url_instance)
         except SQLAlchemyError as e:
             await db.rollback()
-            print(f"Error creating URL record: {e}")
+            log.error("failed to create url", extra={"error": str(e)})
             raise HTTPException(status_code=500, detail="Failed to create URL") from e
 
     bookmark = Bookmark(
@@ -352,83 +477,63 @@ async def create_bookmark(
     )
     db.add(bookmark)
     try:
+        await db.execute(
+            update(User)
+            .where(User.id == session.user_id)
+            .values(bookmark_count=User.bookmark_count + 1)
+        )
         await db.commit()
         await db.refresh(bookmark)
     except SQLAlchemyError as e:
         await db.rollback()
-        print(f"Error creating bookmark: {e}")
+        log.error("failed to create bookmark", extra={"error": str(e)})
         raise HTTPException(status_code=500, detail="Failed to create bookmark") from e
 
+    link_previews.enqueue([url_instance.id])
+    invalidate_profile(session.user.username)
+
     return {"message": "Bookmark created successfully"}
 
 
 @router.get("/hn-top-posts")
-async def get_top_posts(conn=Depends(get_lsd_conn)):
-    """Fetch Hacker News top posts."""
-
-    query = """
-    FROM https://news.ycombinator.com
-    |> GROUP BY span.titleline
-    |> SELECT a AS post
+async def get_top_posts():
     """
-
-    def blocking_query():
-        with conn.cursor() as curs:
-            curs.execute(query)
-            return curs.fetchall()
-
-    rows = await asyncio.to_thread(blocking_query)
-    return [{"post": row[0]} for row in rows]
+    Fetch Hacker News top posts. Served from the hn-top-posts LSD query's cache; once its
+    TTL lapses the stale copy is returned while a single background crawl refreshes it.
+    """
+    rows = await fetch_rows(LSD_QUERIES["hn-top-posts"], {})
+    return [{"post": row["post"]} for row in rows]
 
 
-@router.post("/post")
+@router.post("/post", dependencies=[Depends(query_budget(14))])
 async def create_post(
     request: CreatePostRequest,
     session: UserSession = Depends(login_required),
     db: AsyncSession = Depends(get_async_session),
 ):
-    # Fetch or create tags
+    # Fetch or create tags with one upsert and one select, rather than a query per tag
+    tag_names = list(dict.fromkeys(request.tags))
     tag_objs = []
-    for tag_name in request.tags:
-        try:
-            # Check if the tag exists
-            result = await db.execute(select(Tag).where(Tag.name == tag_name))
-            tag_obj = result.scalars().first()
-
-            if not tag_obj:
-                # Create a new tag if it doesn't exist
-                tag_obj = Tag(name=tag_name)
-                db.add(tag_obj)
-                await db.flush()
-            tag_objs.append(tag_obj)
-        except IntegrityError:
-            # Handle race condition where tag was created by another request
-            await db.rollback()
-            result = await db.execute(select(Tag).where(Tag.name == tag_name))
-            existing_tag = result.scalars().first()
-            if existing_tag:
-                tag_objs.append(existing_tag)
+    if tag_names:
+        # ON CONFLICT covers tags created concurrently by another request
+        await db.execute(
+            pg_insert(Tag)
+            .values([{"name": tag_name} for tag_name in tag_names])
+            .on_conflict_do_nothing()
+        )
+        result = await db.execute(queries.tags_by_name(tag_names))
+        tags_by_name = {tag.name: tag for tag in result.scalars()}
+        tag_objs = [tags_by_name[name] for name in tag_names if name in tags_by_name]
 
-    # Fetch or create URLs
+    # Fetch existing URLs in one select, new ones are inserted together with the post
+    url_strs = list(dict.fromkeys(request.urls))
     url_objs = []
-    for url_str in request.urls:
-        try:
-            # Check if URL exists
-            result = await db.execute(select(Url).where(Url.url == url_str))
-            url_obj = result.scalars().first()
-
-            if not url_obj:
-                url_obj = Url(url=url_str)
-                db.add(url_obj)
-                await db.flush()
-            url_objs.append(url_obj)
-        except IntegrityError:
-            # Handle race condition where url was created by another request
-            await db.rollback()
-            result = await db.execute(select(Url).where(Url.url == url_str))
-            existing_url = result.scalars().first()
-            if existing_url:
-                url_objs.append(existing_url)
+    if url_strs:
+        result = await db.execute(queries.urls_by_value(url_strs))
+        urls_by_value = {url.url: url for url in result.scalars()}
+        url_objs = [
+            urls_by_value.get(url_str) or Url(url=url_str) for url_str in url_strs
+        ]
 
     post = Post(
         owner_id=session.user.id,
@@ -440,37 +545,50 @@ async def create_post(
     )
     try:
         db.add(post)
+        # Counters are bumped in the same transaction as the post itself
+        await db.execute(
+            update(User)
+            .where(User.id == session.user.id)
+            .values(post_count=User.post_count + 1)
+        )
+        if tag_objs:
+            await db.execute(
+                update(Tag)
+                .where(Tag.id.in_([tag.id for tag in tag_objs]))
+                .values(usage_count=Tag.usage_count + 1)
+            )
         await db.commit()
-        await db.refresh(post)
     except SQLAlchemyError as e:
         await db.rollback()
-        print(f"Error creating post: {e}")
+        log.error("failed to create post", extra={"error": str(e)})
         raise HTTPException(status_code=500, detail="Failed to create post") from e
 
     # Fetch post with relationships loaded
     result = await db.execute(
-        select(Post)
-        .options(joinedload(Post.tags), joinedload(Post.owner), joinedload(Post.urls))
-        .where(Post.id == post.id)
+        queries.feed_post(post.id).execution_options(populate_existing=True)
     )
     returned_post = result.unique().scalar_one()
 
-    frontend_post = FrontendPost(
-        id=returned_post.id,
-        owner_id=returned_post.owner_id,
-        owner=returned_post.owner.username,
-        title=returned_post.title,
-        note=returned_post.note,
-        urls=[url.url for url in returned_post.urls],
-        tags=[tag.name for tag in returned_post.tags],
-        file_keys=returned_post.file_keys or [],
-        created_at=returned_post.created_at,
-    )
+    # Encoded once, the same bytes go to the websocket clients and the response
+    with span("serialize"):
+        post_json = orjson.dumps(FrontendPost.serialize(returned_post))
+
+    # Fetch link previews in the background, the broadcast goes out without them
+    link_previews.enqueue(url.id for url in returned_post.urls)
+
+    invalidate_profile(session.user.username)
 
     # Broadcast new post to all WebSocket clients
-    await manager.broadcast(frontend_post.model_dump())
+    with span("broadcast"):
+        post_text = post_json.decode()
+        if worker_events.fits("feed", post_text):
+            await manager.broadcast_text(post_text)
+        else:
+            # Over the NOTIFY payload limit, the other workers load the post themselves
+            worker_events.notify("feed_post", str(returned_post.id))
+            await manager.send_local(post_text)
 
-    return frontend_post
+    return Response(post_json, media_type="application/json")
 
 
 @router.delete("/post")
@@ -481,13 +599,35 @@ async def delete_post(
 ) -> dict:
     stmt = (
         update(Post)
-        .where(Post.id == request.id, Post.owner_id == session.user.id)
-        .values(is_deleted=True)
+        .where(
+            Post.id == request.id,
+            Post.owner_id == session.user.id,
+            Post.is_deleted.isnot(True),
+        )
+        .values(is_deleted=True, deleted_at=func.now())
     )
     result = await db.execute(stmt)
-    if not result:
+    if result.rowcount == 0:
         raise HTTPException(status_code=404, detail="Post not found")
+
+    # Only a post that was live a moment ago reaches this point, so each counter drops exactly once
+    await db.execute(
+        update(User)
+        .where(User.id == session.user.id)
+        .values(post_count=User.post_count - 1)
+    )
+    post_tag_ids = select(post_tags.c.tag_id).where(post_tags.c.post_id == request.id)
+    await db.execute(
+        update(Tag)
+        .where(Tag.id.in_(post_tag_ids))
+        .values(usage_count=Tag.usage_count - 1)
+    )
+    # The partitioned posts table can't be the target of foreign keys (migration v0004),
+    # so nothing cascades to the link rows
+    await db.execute(delete(post_tags).where(post_tags.c.post_id == request.id))
+    await db.execute(delete(post_urls).where(post_urls.c.post_id == request.id))
     await db.commit()
+    invalidate_profile(session.user.username)
 
     return {"message": "Post deleted successfully"}
 
@@ -710,31 +850,22 @@ async def delete_post(
 #
 
 
-@router.get("/recent-posts", response_model=List[FrontendPost])
+@router.get(
+    "/recent-posts",
+    response_model=List[FrontendPost],
+    response_class=ORJSONResponse,
+    dependencies=[Depends(query_budget(6))],
+)
 async def get_recent_posts(
-    limit: int = 10, db: AsyncSession = Depends(get_async_session)
+    limit: int = 10,
+    before: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_read_session),
 ) -> List[FrontendPost]:
-    result = await db.execute(
-        select(Post)
-        .options(selectinload(Post.owner), selectinload(Post.tags))
-        .order_by(Post.created_at.desc())
-        .limit(limit)
-    )
+    """
+    Return the newest live posts, optionally older than `before` for paging.
+    """
+    result = await db.execute(queries.recent_posts(limit, before))
     posts = result.scalars().all()
 
-    frontend_posts = [
-        FrontendPost(
-            id=post.id,
-            owner_id=post.owner_id,
-            owner=post.owner.username,
-            title=post.title,
-            note=post.note,
-            urls=post.urls or [],
-            tags=[tag.name for tag in post.tags],
-            file_keys=post.file_keys or [],
-            created_at=post.created_at,
-        )
-        for post in posts
-    ]
-
-    return frontend_posts
+    with span("serialize"):
+        return ORJSONResponse([FrontendPost.serialize(post) for post in posts])
@@ -1,6 +1,7 @@
 import base64
 import hashlib
 import hmac
+import logging
 import secrets
 from datetime import datetime, timedelta, timezone
 
@@ -19,6 +20,7 @@ from app.schemas.schemas import (AltLoginRequest, AltRegistrationRequest,
                                  SetOwnIdDataRequest)
 
 router = APIRouter()
+log = logging.getLogger(__name__)
 
 
 async def create_session(
@@ -44,7 +46,7 @@ async def create_session(
         db.add(new_session)
         await db.commit()
     except Exception as e:
-        print(e)
+        log.error("failed to save session", extra={"error": str(e)})
 
     return session_token
 
@@ -110,7 +112,7 @@ async def register(
         await db.commit()
         return {"message": "User registered successfully", "user_id": new_user.id}
     except Exception as e:
-        print(f"Error registering user: {e}")
+        log.error("failed to register user", extra={"error": str(e)})
         raise HTTPException(status_code=500, detail="Failed to register user")
 
 
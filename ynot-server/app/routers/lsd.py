@@ -0,0 +1,46 @@
+import json
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+
+from app.db.lsd_queries import LSD_QUERIES, parse_params, stream_rows
+
+router = APIRouter()
+
+
+@router.get("")
+async def list_queries():
+    """List the registered LSD queries and the parameters each one takes."""
+    return [
+        {
+            "name": query.name,
+            "params": {key: cast.__name__ for key, cast in query.params.items()},
+            "ttl": query.ttl,
+        }
+        for query in LSD_QUERIES.values()
+    ]
+
+
+@router.get("/{name}")
+async def run_query(name: str, request: Request):
+    """
+    Run a registered LSD query with the request's query string as its parameters. Rows are
+    streamed as newline-delimited JSON, one chunk per batch of batch_size rows.
+    """
+    query = LSD_QUERIES.get(name)
+    if not query:
+        raise HTTPException(status_code=404, detail="LSD query not found")
+
+    try:
+        params = parse_params(query, request.query_params)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # Awaited here so a 503 from an exhausted pool goes out before the response starts
+    batches = await stream_rows(query, params)
+
+    async def ndjson():
+        async for batch in batches:
+            yield "".join(json.dumps(row, default=str) + "\n" for row in batch)
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
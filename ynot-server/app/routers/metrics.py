@@ -0,0 +1,95 @@
+from typing import Dict, List
+
+from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
+
+from app.db.db import pool_stats
+from app.db.lsd import lsd
+from app.middleware.timing import LATENCY_BUCKETS, route_metrics
+from app.middleware.user_middleware import internal_only
+from app.routers.api import manager
+
+router = APIRouter()
+
+
+def labels(**values) -> str:
+    pairs = []
+    for key, value in values.items():
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"')
+        pairs.append(f'{key}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def gauge(lines: List[str], name: str, help_text: str, samples: Dict[str, float]):
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} gauge")
+    for label_str, value in samples.items():
+        lines.append(f"{name}{label_str} {value}")
+
+
+@router.get(
+    "/metrics",
+    response_class=PlainTextResponse,
+    dependencies=[Depends(internal_only)],
+)
+async def metrics():
+    """
+    Prometheus text exposition of this worker's request latency, per-stage time and
+    pool and websocket gauges. Each worker keeps its own numbers. Scrapers not on
+    this host send metrics_token as a bearer token.
+    """
+    lines = [
+        "# HELP http_request_duration_seconds Request latency by route",
+        "# TYPE http_request_duration_seconds histogram",
+    ]
+    for (method, route), histogram in sorted(route_metrics.latency.items()):
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS, histogram.counts):
+            cumulative += count
+            lines.append(
+                "http_request_duration_seconds_bucket"
+                f"{labels(method=method, route=route, le=bound)} {cumulative}"
+            )
+        route_labels = labels(method=method, route=route)
+        lines.append(
+            "http_request_duration_seconds_bucket"
+            f"{labels(method=method, route=route, le='+Inf')} {histogram.count}"
+        )
+        lines.append(
+            f"http_request_duration_seconds_sum{route_labels} {histogram.total}"
+        )
+        lines.append(
+            f"http_request_duration_seconds_count{route_labels} {histogram.count}"
+        )
+
+    lines += [
+        "# HELP http_request_span_seconds Time spent per request stage by route",
+        "# TYPE http_request_span_seconds summary",
+    ]
+    for key, seconds in sorted(route_metrics.span_seconds.items()):
+        method, route, span = key
+        span_labels = labels(method=method, route=route, span=span)
+        lines.append(f"http_request_span_seconds_sum{span_labels} {seconds}")
+        count = route_metrics.span_count[key]
+        lines.append(f"http_request_span_seconds_count{span_labels} {count}")
+
+    db_pools = pool_stats()
+    for stat in db_pools["primary"]:
+        gauge(
+            lines,
+            f"db_pool_{stat}",
+            f"SQLAlchemy pool {stat.replace('_', ' ')}",
+            {labels(pool=name): stats[stat] for name, stats in db_pools.items()},
+        )
+
+    for stat, value in lsd.stats().items():
+        gauge(lines, f"lsd_{stat}", f"LSD pool {stat}", {"": value})
+
+    gauge(
+        lines,
+        "websocket_connections",
+        "Open feed websocket connections",
+        {"": len(manager.active_connections)},
+    )
+
+    return "\n".join(lines) + "\n"
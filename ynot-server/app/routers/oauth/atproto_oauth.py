@@ -2,6 +2,7 @@ from urllib.parse import urlparse
 from typing import Any, Tuple
 import time
 import json
+import logging
 from authlib.jose import JsonWebKey, jwt
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import update
@@ -12,6 +13,8 @@ from app.routers.oauth.atproto_security import is_safe_url, hardened_http
 from app.models import OAuthAuthRequest, OAuthSession
 from app.config import settings
 
+log = logging.getLogger(__name__)
+
 
 # Checks an Authorization Server metadata response against atproto OAuth requirements
 async def is_valid_authserver_meta(obj: dict, url: str) -> bool:
@@ -169,7 +172,7 @@ async def send_par_auth_request(
     # Handle DPoP missing/invalid nonce error by retrying with server-provided nonce
     if resp.status_code == 400 and resp.json()["error"] == "use_dpop_nonce":
         dpop_authserver_nonce = resp.headers["DPoP-Nonce"]
-        print(f"retrying with new auth server DPoP nonce: {dpop_authserver_nonce}")
+        log.info("retrying with new auth server DPoP nonce")
         dpop_proof = await authserver_dpop_jwt(
             "POST", par_url, dpop_authserver_nonce, dpop_private_jwk
         )
@@ -236,11 +239,10 @@ async def initial_token_request(
     # Handle DPoP missing/invalid nonce error by retrying with server-provided nonce
     if resp.status_code == 400 and resp.json()["error"] == "use_dpop_nonce":
         dpop_authserver_nonce = resp.headers["DPoP-Nonce"]
-        print(f"retrying with new auth server DPoP nonce: {dpop_authserver_nonce}")
+        log.info("retrying with new auth server DPoP nonce")
         dpop_proof = await authserver_dpop_jwt(
             "POST", token_url, dpop_authserver_nonce, dpop_private_jwk
         )
-        print(f"dpop proof: {dpop_proof}")
         with hardened_http.get_session() as sess:
             resp = sess.post(token_url, data=params, headers={"DPoP": dpop_proof})
 
@@ -305,7 +307,7 @@ async def refresh_token_request(
     # Handle DPoP missing/invalid nonce error by retrying with server-provided nonce
     if resp.status_code == 400 and resp.json()["error"] == "use_dpop_nonce":
         dpop_authserver_nonce = resp.headers["DPoP-Nonce"]
-        print(f"retrying with new auth server DPoP nonce: {dpop_authserver_nonce}")
+        log.info("retrying with new auth server DPoP nonce")
         # print(server_nonce)
         dpop_proof = await authserver_dpop_jwt(
             "POST", token_url, dpop_authserver_nonce, dpop_private_jwk
@@ -314,7 +316,10 @@ async def refresh_token_request(
             resp = sess.post(token_url, data=params, headers={"DPoP": dpop_proof})
 
     if resp.status_code not in [200, 201]:
-        print(f"Token Refresh Error: {resp.json()}")
+        log.warning(
+            "token refresh failed",
+            extra={"status": resp.status_code, "body": resp.text[:500]},
+        )
 
     resp.raise_for_status()
     token_body = resp.json()
@@ -381,8 +386,6 @@ async def pds_authed_req(method: str, url: str, user, db: AsyncSession, body=Non
             dpop_private_jwk,
         )
 
-        print(f"Generated DPoP JWT: {dpop_jwt}")
-
         with hardened_http.get_session() as sess:
             if method.upper() == "GET":
                 resp = sess.get(
@@ -405,17 +408,23 @@ async def pds_authed_req(method: str, url: str, user, db: AsyncSession, body=Non
             else:
                 raise ValueError(f"Unsupported HTTP method: {method}")
 
-        # Log response details for debugging
-        print(f"Response Status Code: {resp.status_code}")
-        print(f"Response Headers: {resp.headers}")
-        print(f"Response Body: {resp.text}")
+        log.debug(
+            "PDS response",
+            extra={
+                "method": method,
+                "url": url,
+                "status": resp.status_code,
+                "body": resp.text[:500],
+                "sample_rate": settings.log_sample_rate,
+            },
+        )
 
         if resp.status_code in [200, 201]:
             return resp
 
         # Handle 401 (expired token)
         if resp.status_code == 401 and "invalid_token" in resp.text:
-            print("Token expired, attempting to refresh...")
+            log.info("PDS access token expired, refreshing", extra={"did": user.did})
             app_url = settings.app_url
             client_secret_jwk = JsonWebKey.import_key(json.loads(settings.private_jwk))
 
@@ -442,9 +451,8 @@ async def pds_authed_req(method: str, url: str, user, db: AsyncSession, body=Non
 
         # If we got a new server-provided DPoP nonce, store it in database and retry.
         if "dpop-nonce" in resp.headers:
-            print(resp.headers)
             dpop_pds_nonce = resp.headers["DPoP-Nonce"]
-            print(f"retrying with new PDS DPoP nonce: {dpop_pds_nonce}")
+            log.info("retrying with new PDS DPoP nonce")
 
             # Update session database with new nonce
             async with db.begin():
@@ -1,4 +1,6 @@
 import json
+import logging
+from functools import lru_cache
 from urllib.parse import urlencode
 
 import requests
@@ -22,8 +24,15 @@ from app.routers.oauth.atproto_oauth import (fetch_authserver_meta,
 from app.routers.oauth.atproto_security import is_safe_url
 
 router = APIRouter()
+log = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=None)
+def get_private_jwk() -> JsonWebKey:
+    """The client's signing key, parsed on first use instead of at import."""
+    return JsonWebKey.import_key(json.loads(settings.private_jwk))
+
 
-private_jwk = JsonWebKey.import_key(json.loads(settings.private_jwk))
 public_jwk = {
     "crv": "P-256",
     "x": "PeSen6GnJy0iBAob7DxOqcETvTnAJ8NsweCSbmZetnE",
@@ -52,7 +61,9 @@ async def fetch_bsky_profile(handle):
                 "pds_url": data.get("pds_url", ""),
             }
         else:
-            print(f"Failed to fetch Bluesky profile: {resp.status_code}")
+            log.warning(
+                "failed to fetch Bluesky profile", extra={"status": resp.status_code}
+            )
             return {
                 "display_name": "",
                 "avatar": "",
@@ -61,8 +72,8 @@ async def fetch_bsky_profile(handle):
                 "did": "",
                 "pds_url": "",
             }
-    except Exception as e:
-        print(f"Error fetching Bluesky profile: {e}")
+    except Exception:
+        log.exception("error fetching Bluesky profile")
         return {
             "display_name": "",
             "avatar": "",
@@ -84,7 +95,7 @@ async def oauth_login(
         login_hint = identifier
         did, identifier, did_doc = await resolve_identity(identifier)
         pds_url = await pds_endpoint(did_doc)
-        print(f"Account {identifier} is at {pds_url}")
+        log.info("resolved account", extra={"handle": identifier, "pds_url": pds_url})
         authserver_url = await resolve_pds_authserver(pds_url)
     elif identifier.startswith("https://") and await is_safe_url(identifier):
         # When starting with an auth server URL, we don't have info about the account yet
@@ -103,17 +114,16 @@ async def oauth_login(
 
     # Fetch auth server metadata
     # NOTE auth server URL is untrusted input, SSRF mitigations are needed
-    print(f"Resolving auth server metadata at {authserver_url}")
+    log.info("resolving auth server metadata", extra={"authserver_url": authserver_url})
     assert await is_safe_url(authserver_url)
     try:
         authserver_meta = await fetch_authserver_meta(authserver_url)
     except Exception as e:
-        print(f"Failed to fetch auth server metadata: {e}")
+        log.warning("failed to fetch auth server metadata", extra={"error": str(e)})
         return JSONResponse(content={"error": "Failed to fetch auth server metadata"})
 
     # Generate DPoP private signing key for this account session
     dpop_private_jwk = JsonWebKey.generate_key("EC", "P-256", is_private=True)
-    print(f"JWK {dpop_private_jwk.as_json(is_private=True)}")
 
     scope = "atproto transition:generic"
 
@@ -130,11 +140,11 @@ async def oauth_login(
         client_id,
         redirect_uri,
         scope,
-        private_jwk,
+        get_private_jwk(),
         dpop_private_jwk,
     )
     if resp.status_code == 400:
-        print(f"PAR HTTP 400: {resp.json()}")
+        log.warning("PAR request rejected", extra={"body": resp.text[:500]})
     resp.raise_for_status()
     par_request_uri = resp.json()["request_uri"]
 
@@ -162,12 +172,11 @@ async def oauth_login(
             await db.commit()
         except IntegrityError as e:
             await db.rollback()
-            print(f"Failed to create user in the database: {e}")
+            log.error("failed to create user", extra={"error": str(e)})
             raise HTTPException(
                 status_code=500, detail="Failed to create user in the database"
             )
 
-    print(f"saving oauth_auth_request to DB for state {state}")
     try:
         oauth_request = OAuthAuthRequest(
             state=state,
@@ -184,7 +193,7 @@ async def oauth_login(
         await db.commit()
     except SQLAlchemyError as e:
         await db.rollback()
-        print(f"Failed to save oauth_auth_request to DB: {e}")
+        log.error("failed to save OAuth request", extra={"error": str(e)})
         raise HTTPException(
             status_code=500, detail="Failed to save oauth_auth_request to DB"
         )
@@ -194,7 +203,6 @@ async def oauth_login(
     auth_url = authserver_meta["authorization_endpoint"]
     assert await is_safe_url(auth_url)
     qparam = urlencode({"client_id": client_id, "request_uri": par_request_uri})
-    print(f"redirecting to {auth_url}?{qparam}")
     return JSONResponse(content={"redirect_url": f"{auth_url}?{qparam}"})
 
 
@@ -236,7 +244,7 @@ async def oauth_callback(
     app_url = str(request.base_url).replace("http://", "https://")
     try:
         tokens, dpop_authserver_nonce = await initial_token_request(
-            row, code, app_url, private_jwk
+            row, code, app_url, get_private_jwk()
         )
     except HTTPException as e:
         raise HTTPException(status_code=500, detail=f"Token request failed: {str(e)}")
@@ -280,7 +288,7 @@ async def oauth_callback(
             await db.commit()
         except IntegrityError as e:
             await db.rollback()
-            print(f"Failed to create user in the database: {e}")
+            log.error("failed to create user", extra={"error": str(e)})
             raise HTTPException(
                 status_code=500, detail="Failed to create user in the database"
             )
@@ -303,20 +311,19 @@ async def oauth_callback(
     except IntegrityError as e:
         await db.rollback()
         if "unique constraint" in str(e.orig):
-            print(f"Failed to save oauth_auth_request to DB: {e}")
+            log.error("failed to save OAuth session", extra={"error": str(e)})
             raise HTTPException(
                 status_code=500, detail="A session for this user already exists"
             )
     except SQLAlchemyError as e:
         await db.rollback()
-        print(f"Failed to save oauth_auth_request to DB: {e}")
+        log.error("failed to save OAuth session", extra={"error": str(e)})
         raise HTTPException(status_code=500, detail="Failed to save OAuth session")
 
     request.session["user_did"] = did
     request.session["user_handle"] = handle
 
-    print(request.session.get("user_did"))
-    print(request.session.get("user_handle"))
+    log.info("OAuth login completed", extra={"did": did, "handle": handle})
 
     return RedirectResponse(url="/")
 
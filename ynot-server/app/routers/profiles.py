@@ -0,0 +1,28 @@
+import os
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import FileResponse
+
+from app.config import settings
+from app.middleware.profiling import list_profiles, require_signature
+
+# Only included when profiling_enabled is set, every route needs an X-Profile signature
+router = APIRouter(dependencies=[Depends(require_signature)])
+
+
+@router.get("")
+async def get_profiles():
+    """Stored request profiles, newest first."""
+    return list(reversed(list_profiles()))
+
+
+@router.get("/{name}")
+async def download_profile(name: str):
+    """A stored profile in pstats format, e.g. for snakeviz or python -m pstats."""
+    if name not in list_profiles():
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(
+        os.path.join(settings.profiling_dir, name),
+        media_type="application/octet-stream",
+        filename=name,
+    )
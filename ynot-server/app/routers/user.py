@@ -1,19 +1,25 @@
+import logging
 from typing import List
 
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import ORJSONResponse
 from sqlalchemy import select, update
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import joinedload, selectinload
 
-from app.db.db import get_async_session
+from app.db import queries
+from app.db.db import get_async_session, get_read_session
+from app.middleware.query_stats import query_budget
+from app.middleware.timing import span
 from app.middleware.user_middleware import login_required
-from app.models.models import Bookmark, Post, User, UserSession
+from app.models.models import User, UserSession
+from app.prerender import invalidate_profile
 from app.schemas.schemas import (BookmarkResponse, FrontendPost,
                                  GetUserResponse, ProfileCompletionRequest,
                                  UpdateProfileRequest)
 
 router = APIRouter()
+log = logging.getLogger(__name__)
 
 BUCKET_NAME = "ynot-media"
 
@@ -53,7 +59,10 @@ async def complete_profile(
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    print(request)
+    log.info(
+        "completing profile",
+        extra={"user_id": user.id, "username": request.username},
+    )
 
     user.username = request.username
     user.name = request.displayName
@@ -64,70 +73,68 @@ async def complete_profile(
     user.is_profile_complete = True
 
     await db.commit()
+    invalidate_profile(session.user.username, request.username)
     return {"message": "Profile completed"}
 
 
-@router.get("/{username}/posts")
+@router.get(
+    "/{username}/posts",
+    response_class=ORJSONResponse,
+    dependencies=[Depends(query_budget(4))],
+)
 async def get_posts(
     username: str,
-    db: AsyncSession = Depends(get_async_session),
+    db: AsyncSession = Depends(get_read_session),
 ) -> List[FrontendPost]:
     """
     Return a list of all posts by username.
     """
-    user_query = select(User).where(User.username == username)
-    result = await db.execute(user_query)
+    result = await db.execute(queries.user_by_username(username))
     user = result.scalar_one_or_none()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    posts_query = (
-        select(Post)
-        .options(joinedload(Post.tags), joinedload(Post.urls))
-        .where(Post.owner_id == user.id, Post.is_deleted == False)
-        .order_by(Post.created_at.desc())
-    )
-    posts_result = await db.execute(posts_query)
+    posts_result = await db.execute(queries.user_posts(user.id))
     posts = posts_result.unique().scalars().all()
 
-    frontend_posts = [FrontendPost.from_orm(post) for post in posts]
+    with span("serialize"):
+        return ORJSONResponse([FrontendPost.serialize(post) for post in posts])
 
-    return frontend_posts
 
-
-@router.get("/{username}/bookmarks")
-async def get_bookmarks(username: str, db: AsyncSession = Depends(get_async_session)):
+@router.get(
+    "/{username}/bookmarks",
+    response_class=ORJSONResponse,
+    dependencies=[Depends(query_budget(5))],
+)
+async def get_bookmarks(
+    username: str, db: AsyncSession = Depends(get_read_session)
+):
     """
     Returns a list of all bookmarks by username.
     """
-    user_query = select(User).where(User.username == username)
-    result = await db.execute(user_query)
+    result = await db.execute(queries.user_by_username(username))
     user = result.scalar_one_or_none()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    bookmarks_query = (
-        select(Bookmark)
-        .options(selectinload(Bookmark.url))
-        .where(Bookmark.owner_id == user.id)
-        .order_by(Bookmark.created_at.desc())
-    )
-    bookmarks_result = await db.execute(bookmarks_query)
+    bookmarks_result = await db.execute(queries.user_bookmarks(user.id))
     bookmarks = bookmarks_result.unique().scalars().all()
 
-    return [BookmarkResponse.from_orm(bookmark) for bookmark in bookmarks]
+    with span("serialize"):
+        return ORJSONResponse(
+            [BookmarkResponse.serialize(bookmark) for bookmark in bookmarks]
+        )
 
 
-@router.get("/{username}/profile")
+@router.get("/{username}/profile", dependencies=[Depends(query_budget(3))])
 async def get_user_profile(
     username: str,
-    db: AsyncSession = Depends(get_async_session),
+    db: AsyncSession = Depends(get_read_session),
 ) -> GetUserResponse:
     """
     Returns data for displaying a user's profile page.
     """
-    query = select(User).where(User.username == username)
-    result = await db.execute(query)
+    result = await db.execute(queries.user_by_username(username))
     user = result.scalar_one_or_none()
 
     if not user:
@@ -140,6 +147,8 @@ async def get_user_profile(
         bio=user.bio,
         avatar=user.avatar,
         banner=user.banner,
+        post_count=user.post_count,
+        bookmark_count=user.bookmark_count,
     )
 
 
@@ -163,9 +172,10 @@ async def update_profile(
     try:
         await db.execute(query)
         await db.commit()
+        invalidate_profile(session.user.username)
         return {"message": "Successfully updated profile"}
     except Exception as e:
-        print(f"Error while updating user profile: {e}")
+        log.error("failed to update profile", extra={"error": str(e)})
         raise HTTPException(
             status_code=500, detail="Internal server error while updating profile"
         )
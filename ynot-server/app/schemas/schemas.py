@@ -69,6 +69,27 @@ class CreateBookmarkRequest(BaseModel):
     note: Optional[str]
 
 
+class UrlPreview(BaseModel):
+    url: str
+    title: Optional[str] = None
+    description: Optional[str] = None
+    image_url: Optional[str] = None
+    site_name: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+    @staticmethod
+    def serialize(obj) -> dict:
+        return {
+            "url": obj.url,
+            "title": obj.title,
+            "description": obj.description,
+            "image_url": obj.image_url,
+            "site_name": obj.site_name,
+        }
+
+
 class BookmarkResponse(BaseModel):
     id: int
     owner_id: int
@@ -76,6 +97,7 @@ class BookmarkResponse(BaseModel):
     highlight: Optional[str]
     note: Optional[str]
     created_at: str
+    preview: Optional[UrlPreview] = None
 
     class Config:
         from_attributes = True
@@ -89,12 +111,27 @@ class BookmarkResponse(BaseModel):
             highlight=obj.highlight or "",
             note=obj.note or "",
             created_at=obj.created_at.isoformat(),  # Convert datetime to ISO 8601 string
+            preview=UrlPreview.model_validate(obj.url),
         )
 
+    @staticmethod
+    def serialize(obj) -> dict:
+        """from_orm without the model: a plain dict orjson can encode directly."""
+        return {
+            "id": obj.id,
+            "owner_id": obj.owner_id,
+            "url": obj.url.url,
+            "highlight": obj.highlight or "",
+            "note": obj.note or "",
+            "created_at": obj.created_at.isoformat(),
+            "preview": UrlPreview.serialize(obj.url),
+        }
+
 
 class TagBase(BaseModel):
     id: int
     name: str
+    usage_count: int = 0
 
     class Config:
         from_attributes = True
@@ -113,6 +150,24 @@ class SiteBase(BaseModel):
         from_attributes = True
 
 
+class RelatedSite(BaseModel):
+    site: SiteBase
+    score: float
+
+
+class TagFacet(BaseModel):
+    name: str
+    count: int
+
+
+class SiteSearchResponse(BaseModel):
+    total: int
+    offset: int
+    limit: int
+    sites: List[SiteBase]
+    facets: List[TagFacet]
+
+
 class CreatePostRequest(BaseModel):
     title: str = ""
     note: str
@@ -160,6 +215,7 @@ class FrontendPost(BaseModel):
     tags: List[str]
     file_keys: Optional[List[str]]
     created_at: datetime
+    previews: List[UrlPreview] = []
 
     class Config:
         from_attributes = True
@@ -176,8 +232,28 @@ class FrontendPost(BaseModel):
             tags=[tag.name for tag in obj.tags] if obj.tags else [],
             file_keys=obj.file_keys or [],
             created_at=obj.created_at.isoformat(),
+            previews=(
+                [UrlPreview.model_validate(url) for url in obj.urls] if obj.urls else []
+            ),
         )
 
+    @staticmethod
+    def serialize(obj) -> dict:
+        """Plain dict equivalent of from_orm, for routes that encode with orjson."""
+        urls = obj.urls or []
+        return {
+            "id": obj.id,
+            "owner_id": obj.owner_id,
+            "owner": obj.owner.username,
+            "title": obj.title,
+            "note": obj.note,
+            "urls": [url.url for url in urls],
+            "tags": [tag.name for tag in obj.tags or []],
+            "file_keys": obj.file_keys or [],
+            "created_at": obj.created_at,
+            "previews": [UrlPreview.serialize(url) for url in urls],
+        }
+
 
 class GetUserResponse(BaseModel):
     email: str
@@ -186,3 +262,5 @@ class GetUserResponse(BaseModel):
     bio: Optional[str] = ""
     avatar: str
     banner: Optional[str]
+    post_count: int = 0
+    bookmark_count: int = 0
@@ -0,0 +1,58 @@
+"""
+Starts the app under uvicorn:
+
+    python -m app.serve
+
+In development this is a single process with auto-reload. Otherwise it runs one worker
+per available CPU (or web_workers) on uvloop and httptools, and on shutdown gives open
+requests web_graceful_shutdown_seconds to finish. Websockets are closed by uvicorn with
+code 1012 (service restart) at the start of shutdown, so feed clients reconnect to
+another worker; the app's lifespan shutdown only runs after that.
+
+Each worker has its own feed clients and caches. Feed broadcasts and cache invalidations
+reach the other workers through app.services.worker_events (Postgres LISTEN/NOTIFY).
+"""
+
+import argparse
+import os
+
+import uvicorn
+
+from app.config import settings
+
+
+def worker_count() -> int:
+    if settings.web_workers:
+        return settings.web_workers
+    # Respects CPU pinning, e.g. docker --cpuset-cpus, where os.cpu_count() doesn't
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def main(args):
+    if settings.app_env == "development":
+        uvicorn.run("app.main:app", host=args.host, port=args.port, reload=True)
+        return
+
+    uvicorn.run(
+        "app.main:app",
+        host=args.host,
+        port=args.port,
+        workers=worker_count(),
+        loop="uvloop",
+        http="httptools",
+        timeout_keep_alive=settings.web_keepalive_seconds,
+        backlog=settings.web_backlog,
+        timeout_graceful_shutdown=settings.web_graceful_shutdown_seconds,
+        proxy_headers=True,
+        # The app routes uvicorn's loggers through app.log instead
+        log_config=None,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the ynot API server")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    main(parser.parse_args())
@@ -0,0 +1,315 @@
+import asyncio
+import ipaddress
+import logging
+from datetime import datetime, timedelta, timezone
+from html.parser import HTMLParser
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set
+from urllib.parse import urljoin, urlparse
+
+import httpcore
+import httpx
+from sqlalchemy import or_, select, update
+
+from app.config import settings
+from app.db.db import async_session
+from app.models.models import Url
+from app.routers.oauth.atproto_security import is_safe_url
+
+log = logging.getLogger(__name__)
+
+MAX_REDIRECTS = 3
+MAX_BODY_BYTES = 512 * 1024  # metadata lives in <head>, never read more than this
+FIELD_LIMITS = {"title": 300, "description": 1000, "image_url": 2048, "site_name": 200}
+
+# Meta keys checked for each field, in order of preference
+META_KEYS = {
+    "title": ["og:title", "twitter:title"],
+    "description": ["og:description", "twitter:description", "description"],
+    "image_url": ["og:image", "og:image:url", "twitter:image", "twitter:image:src"],
+    "site_name": ["og:site_name"],
+}
+
+
+class _HeadParsed(Exception):
+    pass
+
+
+class MetaTagParser(HTMLParser):
+    """Collects <meta> tags and the <title> of a document, stopping at </head>."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.meta: Dict[str, str] = {}
+        self.title = ""
+        self._in_title = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "meta":
+            attrs = dict(attrs)
+            key = attrs.get("property") or attrs.get("name")
+            content = attrs.get("content")
+            if key and content:
+                self.meta.setdefault(key.strip().lower(), content.strip())
+        elif tag == "title":
+            self._in_title = True
+        elif tag == "body":
+            raise _HeadParsed()
+
+    def handle_endtag(self, tag):
+        if tag == "title":
+            self._in_title = False
+        elif tag == "head":
+            raise _HeadParsed()
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title += data
+
+
+def parse_preview(html: str, base_url: str) -> Dict[str, Optional[str]]:
+    """Extract OpenGraph/Twitter card metadata from an HTML document."""
+    parser = MetaTagParser()
+    try:
+        parser.feed(html)
+        parser.close()
+    except _HeadParsed:
+        pass
+
+    preview = {}
+    for field, keys in META_KEYS.items():
+        value = next((parser.meta[key] for key in keys if parser.meta.get(key)), None)
+        if field == "title" and not value:
+            value = " ".join(parser.title.split()) or None
+        if field == "image_url" and value:
+            value = urljoin(base_url, value)
+        preview[field] = value[: FIELD_LIMITS[field]] if value else None
+    return preview
+
+
+Resolver = Callable[[str, int], Awaitable[List[str]]]
+
+
+async def resolve(host: str, port: int) -> List[str]:
+    infos = await asyncio.get_running_loop().getaddrinfo(host, port)
+    return [info[4][0].split("%")[0] for info in infos]
+
+
+async def public_addresses(
+    host: str, port: int, resolver: Resolver = resolve
+) -> List[str]:
+    """host's addresses, or none if it doesn't resolve or any address isn't public."""
+    try:
+        addresses = await resolver(host, port)
+    except OSError:
+        return []
+    if not all(ipaddress.ip_address(address).is_global for address in addresses):
+        return []
+    return addresses
+
+
+async def is_safe_preview_url(url: str) -> bool:
+    """
+    is_safe_url plus a check that the host resolves to public addresses only. This
+    rejects obviously internal urls early, PublicAddressBackend enforces it on connect.
+    """
+    if not await is_safe_url(url):
+        return False
+    return bool(await public_addresses(urlparse(url).hostname, 443))
+
+
+class PublicAddressBackend(httpcore.AsyncNetworkBackend):
+    """
+    Network backend that resolves hosts itself and connects only to the public address
+    it checked. httpx would otherwise resolve the host again on connect, and a DNS
+    rebinding host could answer with an internal address the second time. TLS still
+    uses the url's hostname for SNI and certificate checks, and the Host header is
+    unchanged, since only the TCP connection is made to the IP.
+    """
+
+    def __init__(self, resolver: Resolver = resolve):
+        self.resolver = resolver
+        self.backend = httpcore.AnyIOBackend()
+
+    async def connect_tcp(
+        self, host, port, timeout=None, local_address=None, socket_options=None
+    ):
+        addresses = await public_addresses(host, port, self.resolver)
+        if not addresses:
+            raise httpcore.ConnectError(f"{host} does not resolve to a public address")
+        return await self.backend.connect_tcp(
+            addresses[0], port, timeout, local_address, socket_options
+        )
+
+    async def connect_unix_socket(self, path, timeout=None, socket_options=None):
+        raise httpcore.ConnectError("unix sockets are not allowed")
+
+    async def sleep(self, seconds: float):
+        await self.backend.sleep(seconds)
+
+
+class PublicAddressTransport(httpx.AsyncHTTPTransport):
+    """httpx transport whose connections go through PublicAddressBackend."""
+
+    def __init__(self, limits: httpx.Limits, resolver: Resolver = resolve):
+        super().__init__(limits=limits)
+        # AsyncHTTPTransport doesn't take a network backend, so swap in a pool with ours
+        self._pool = httpcore.AsyncConnectionPool(
+            ssl_context=httpx.create_ssl_context(),
+            max_connections=limits.max_connections,
+            max_keepalive_connections=limits.max_keepalive_connections,
+            keepalive_expiry=limits.keepalive_expiry,
+            network_backend=PublicAddressBackend(resolver),
+        )
+
+
+class LinkPreviewFetcher:
+    """
+    Background fetcher that fills in preview metadata on Url rows. Url ids are queued after
+    posts and bookmarks are created; a fixed set of workers bounds concurrent fetches, ids
+    already queued are dropped, and rows fetched within the refresh TTL are skipped.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = settings.link_preview_concurrency,
+        refresh_ttl: timedelta = timedelta(hours=settings.link_preview_ttl_hours),
+        url_filter: Callable[[str], Awaitable[bool]] = is_safe_preview_url,
+        session_factory=async_session,
+        timeout: float = 5.0,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.concurrency = concurrency
+        self.refresh_ttl = refresh_ttl
+        self.url_filter = url_filter
+        self.session_factory = session_factory
+        self.timeout = timeout
+        self.transport = transport
+        self.client: Optional[httpx.AsyncClient] = None
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self._pending: Set[int] = set()
+        self._workers = []
+
+    async def start(self):
+        self.open_client()
+        self._workers = [
+            asyncio.create_task(self._worker()) for _ in range(self.concurrency)
+        ]
+
+    def open_client(self):
+        limits = httpx.Limits(
+            max_connections=self.concurrency,
+            max_keepalive_connections=self.concurrency,
+        )
+        self.client = httpx.AsyncClient(
+            timeout=self.timeout,
+            follow_redirects=False,  # redirects are followed by hand so every hop is checked
+            limits=limits,
+            transport=self.transport or PublicAddressTransport(limits),
+            headers={"User-Agent": "ynot-link-preview/1.0 (+https://ynot.lol)"},
+        )
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        if self.client:
+            await self.client.aclose()
+
+    def enqueue(self, url_ids: Iterable[int]):
+        """Queue Url rows for a preview fetch. Safe to call from request handlers."""
+        for url_id in url_ids:
+            if url_id not in self._pending:
+                self._pending.add(url_id)
+                self.queue.put_nowait(url_id)
+
+    async def enqueue_stale(self, limit: int = 1000):
+        """Queue rows that have never been fetched or whose preview has expired."""
+        cutoff = datetime.now(timezone.utc) - self.refresh_ttl
+        async with self.session_factory() as db:
+            result = await db.execute(
+                select(Url.id)
+                .where(
+                    or_(
+                        Url.preview_fetched_at.is_(None),
+                        Url.preview_fetched_at < cutoff,
+                    )
+                )
+                .limit(limit)
+            )
+            self.enqueue(result.scalars().all())
+
+    async def _worker(self):
+        while True:
+            url_id = await self.queue.get()
+            try:
+                await self.refresh(url_id)
+            except Exception as e:
+                log.warning(
+                    "link preview failed", extra={"url_id": url_id, "error": str(e)}
+                )
+            finally:
+                self._pending.discard(url_id)
+                self.queue.task_done()
+
+    async def refresh(self, url_id: int):
+        """Fetch and store the preview for one Url row unless it is still fresh."""
+        async with self.session_factory() as db:
+            result = await db.execute(
+                select(Url.url, Url.preview_fetched_at).where(Url.id == url_id)
+            )
+            row = result.first()
+        if not row:
+            return
+        now = datetime.now(timezone.utc)
+        fetched_at = row.preview_fetched_at
+        if fetched_at and now - fetched_at < self.refresh_ttl:
+            return
+
+        # Fetch without holding a DB connection. A failed fetch still stamps the row,
+        # so it is retried after the TTL instead of on every new post.
+        preview = await self.fetch(row.url) or {}
+        async with self.session_factory() as db:
+            await db.execute(
+                update(Url)
+                .where(Url.id == url_id)
+                .values(preview_fetched_at=now, **preview)
+            )
+            await db.commit()
+
+    async def fetch(self, url: str) -> Optional[Dict[str, Optional[str]]]:
+        """Fetch url and return its preview metadata, or None if it isn't a reachable HTML page."""
+        # httpx times out each read, this bounds the whole fetch including redirects
+        try:
+            return await asyncio.wait_for(self._fetch(url), self.timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def _fetch(self, url: str) -> Optional[Dict[str, Optional[str]]]:
+        for _ in range(MAX_REDIRECTS + 1):
+            if not await self.url_filter(url):
+                return None
+            try:
+                async with self.client.stream("GET", url) as resp:
+                    if resp.is_redirect:
+                        url = urljoin(url, resp.headers.get("location", ""))
+                        continue
+                    if resp.status_code != 200:
+                        return None
+                    if "html" not in resp.headers.get("content-type", ""):
+                        return None
+
+                    body = b""
+                    async for chunk in resp.aiter_bytes():
+                        body += chunk
+                        if len(body) >= MAX_BODY_BYTES:
+                            break
+                    encoding = resp.charset_encoding or "utf-8"
+                    html = body[:MAX_BODY_BYTES].decode(encoding, errors="replace")
+                    return parse_preview(html, str(resp.url))
+            except httpx.HTTPError:
+                return None
+        return None
+
+
+link_previews = LinkPreviewFetcher()
@@ -0,0 +1,175 @@
+"""
+Related sites by tag similarity.
+
+Each site is a sparse vector over its tags, weighted by inverse document frequency so
+a shared niche tag counts for more than a shared popular one, and normalized to unit
+length. The cosine similarity of every pair of sites sharing a tag is the sparse
+product of the site-tag matrix with its transpose, computed a row at a time through
+the tags' posting lists, so sites with no tag in common are never compared. The top
+related_sites_top_k per site are written to site_neighbors, and /api/sites/{id}/related
+reads them with a single index lookup.
+
+The table is recomputed at startup, after sample data changes the sites, and by hand:
+
+    python -m app.services.related_sites
+"""
+
+import asyncio
+import heapq
+import logging
+import math
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import delete, insert, select, text
+
+from app.config import settings
+from app.db.db import engine
+from app.models.models import SiteNeighbor, site_tag_association
+
+log = logging.getLogger(__name__)
+
+# Arbitrary advisory lock key, so only one worker recomputes at a time
+NEIGHBORS_LOCK_KEY = 7_316_003
+INSERT_BATCH_SIZE = 5000
+
+Vector = Dict[int, float]
+
+
+def tag_vectors(site_tags: Dict[int, Set[int]]) -> Dict[int, Vector]:
+    """Unit length, IDF-weighted tag vectors, by site id."""
+    document_frequency: Dict[int, int] = defaultdict(int)
+    for tags in site_tags.values():
+        for tag in tags:
+            document_frequency[tag] += 1
+
+    sites = len(site_tags)
+    vectors = {}
+    for site_id, tags in site_tags.items():
+        # Smoothed IDF, stays positive for a tag every site has
+        weights = {
+            tag: math.log((1 + sites) / (1 + document_frequency[tag])) + 1
+            for tag in tags
+        }
+        norm = math.sqrt(sum(w * w for w in weights.values()))
+        if norm:
+            vectors[site_id] = {tag: w / norm for tag, w in weights.items()}
+    return vectors
+
+
+def top_neighbors(
+    vectors: Dict[int, Vector], k: int
+) -> Dict[int, List[Tuple[int, float]]]:
+    """The k most similar other sites of every site, best first, ties by lower id."""
+    postings: Dict[int, List[Tuple[int, float]]] = defaultdict(list)
+    for site_id, vector in vectors.items():
+        for tag, weight in vector.items():
+            postings[tag].append((site_id, weight))
+
+    neighbors = {}
+    for site_id, vector in vectors.items():
+        scores: Dict[int, float] = defaultdict(float)
+        for tag, weight in vector.items():
+            for other_id, other_weight in postings[tag]:
+                if other_id != site_id:
+                    scores[other_id] += weight * other_weight
+        best = heapq.nsmallest(k, scores.items(), key=lambda s: (-s[1], s[0]))
+        if best:
+            neighbors[site_id] = [(other_id, round(s, 6)) for other_id, s in best]
+    return neighbors
+
+
+def neighbor_rows(neighbors: Dict[int, List[Tuple[int, float]]]) -> Iterable[dict]:
+    for site_id, ranked in neighbors.items():
+        for rank, (neighbor_id, score) in enumerate(ranked, start=1):
+            yield {
+                "site_id": site_id,
+                "rank": rank,
+                "neighbor_id": neighbor_id,
+                "score": score,
+            }
+
+
+async def refresh_site_neighbors(wait: bool = True) -> int:
+    """
+    Recompute site_neighbors and return the number of rows written. A refresh running in
+    another worker may predate the change this one is for, so it is waited out, unless
+    wait is False: then -1 is returned straight away. Readers see the old rows until the
+    new ones commit.
+    """
+    async with engine.begin() as conn:
+        if wait:
+            await conn.execute(
+                text("SELECT pg_advisory_xact_lock(:key)"), {"key": NEIGHBORS_LOCK_KEY}
+            )
+        else:
+            locked = await conn.scalar(
+                text("SELECT pg_try_advisory_xact_lock(:key)"),
+                {"key": NEIGHBORS_LOCK_KEY},
+            )
+            if not locked:
+                return -1
+
+        site_tags: Dict[int, Set[int]] = defaultdict(set)
+        result = await conn.execute(
+            select(site_tag_association.c.site_id, site_tag_association.c.tag_id)
+        )
+        for site_id, tag_id in result:
+            site_tags[site_id].add(tag_id)
+
+        # Pure Python and CPU bound, keep it off the event loop
+        neighbors = await asyncio.to_thread(
+            lambda: top_neighbors(tag_vectors(site_tags), settings.related_sites_top_k)
+        )
+
+        rows = list(neighbor_rows(neighbors))
+        await conn.execute(delete(SiteNeighbor))
+        for start in range(0, len(rows), INSERT_BATCH_SIZE):
+            await conn.execute(
+                insert(SiteNeighbor), rows[start : start + INSERT_BATCH_SIZE]
+            )
+    return len(rows)
+
+
+_refresh: Optional[asyncio.Task] = None
+_refresh_queued = False
+
+
+def schedule_refresh(wait: bool = True):
+    """
+    Recompute site_neighbors in the background, e.g. after sites were added. While a
+    refresh runs, one more is queued to pick up the changes it may have missed, and
+    further calls share that one. wait=False skips the refresh if another worker is
+    already recomputing, for when nothing has changed since it started.
+    """
+    global _refresh, _refresh_queued
+    if _refresh is None or _refresh.done():
+        _refresh = asyncio.create_task(refresh_site_neighbors(wait))
+        _refresh.add_done_callback(_report_result)
+    elif not _refresh_queued:
+        _refresh_queued = True
+        _refresh.add_done_callback(_run_queued_refresh)
+
+
+def _run_queued_refresh(task: asyncio.Task):
+    global _refresh_queued
+    _refresh_queued = False
+    schedule_refresh()
+
+
+def _report_result(task: asyncio.Task):
+    if task.cancelled():
+        return
+    if task.exception() is not None:
+        log.error("related sites refresh failed", exc_info=task.exception())
+    elif task.result() >= 0:
+        log.info("related sites refreshed", extra={"rows": task.result()})
+
+
+async def main():
+    print(f"site_neighbors: {await refresh_site_neighbors()} rows")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,159 @@
+"""
+In-memory search index over the Discover site directory.
+
+Sites are filtered by tag (all of them, or any of them) and by prefix search on the
+words of their name and owner, with tag facet counts for the matches and offset
+pagination. The whole directory is loaded once into an inverted index, so a search
+never touches the database. The index is rebuilt in the background every
+site_index_ttl_seconds, or right away after a site changes, and the previous index
+keeps serving until the new one is ready. Each worker builds its own, sites_changed()
+has the other workers rebuild theirs through app.services.worker_events.
+"""
+
+import asyncio
+import re
+from bisect import bisect_left
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+
+from app.cache import SWRCache
+from app.config import settings
+from app.db.db import async_session
+from app.models.models import Site
+from app.schemas.schemas import SiteBase
+from app.services.worker_events import worker_events
+
+WORD = re.compile(r"[^\W_]+")
+INDEX_KEY = "sites"
+
+site_indexes = SWRCache(ttl=settings.site_index_ttl_seconds)
+# Set while a rebuild is queued behind the one in flight
+_rebuild_queued = False
+
+
+def words(text: Optional[str]) -> List[str]:
+    return WORD.findall((text or "").casefold())
+
+
+@dataclass
+class SiteIndex:
+    # Serialized sites by id, and ids in the order results are returned
+    sites: Dict[int, dict] = field(default_factory=dict)
+    order: List[int] = field(default_factory=list)
+    # Site ids per tag name
+    by_tag: Dict[str, Set[int]] = field(default_factory=dict)
+    # (word, site id) for every word in a name or owner, sorted for prefix lookups
+    terms: List[Tuple[str, int]] = field(default_factory=list)
+
+    @classmethod
+    def build(cls, sites: Iterable[dict]) -> "SiteIndex":
+        index = cls()
+        for site in sites:
+            index.sites[site["id"]] = site
+            for tag in site["tags"]:
+                index.by_tag.setdefault(tag["name"], set()).add(site["id"])
+            for word in set(words(site["name"]) + words(site["owner"])):
+                index.terms.append((word, site["id"]))
+        index.order = sorted(
+            index.sites,
+            key=lambda site_id: (index.sites[site_id]["name"].casefold(), site_id),
+        )
+        index.terms.sort()
+        return index
+
+    def prefix_matches(self, prefix: str) -> Set[int]:
+        start = bisect_left(self.terms, (prefix,))
+        matches = set()
+        for word, site_id in self.terms[start:]:
+            if not word.startswith(prefix):
+                break
+            matches.add(site_id)
+        return matches
+
+    def search(
+        self,
+        tags: Sequence[str] = (),
+        match_all: bool = True,
+        query: str = "",
+        offset: int = 0,
+        limit: int = 24,
+    ) -> dict:
+        """
+        Sites tagged with all (or, without match_all, any) of tags whose name or owner
+        has a word starting with each word of query, one page at a time. Facets count
+        the tags of every matching site, not just the ones on this page.
+        """
+        matches: Optional[Set[int]] = None
+        if tags:
+            tagged = [self.by_tag.get(tag, set()) for tag in tags]
+            matches = set.intersection(*tagged) if match_all else set.union(*tagged)
+        for prefix in words(query):
+            found = self.prefix_matches(prefix)
+            matches = found if matches is None else matches & found
+
+        if matches is None:
+            ordered = self.order
+        else:
+            ordered = [site_id for site_id in self.order if site_id in matches]
+
+        page = ordered[offset : offset + limit]
+        facets = Counter(
+            tag["name"] for site_id in ordered for tag in self.sites[site_id]["tags"]
+        )
+        return {
+            "total": len(ordered),
+            "offset": offset,
+            "limit": limit,
+            "sites": [self.sites[site_id] for site_id in page],
+            "facets": [
+                {"name": name, "count": count}
+                for name, count in sorted(facets.items(), key=lambda f: (-f[1], f[0]))
+            ],
+        }
+
+
+async def load_site_index() -> SiteIndex:
+    async with async_session() as db:
+        result = await db.execute(select(Site).options(selectinload(Site.tags)))
+        sites = result.scalars().all()
+    return SiteIndex.build(SiteBase.model_validate(site).model_dump() for site in sites)
+
+
+async def get_site_index() -> SiteIndex:
+    return await site_indexes.get(INDEX_KEY, load_site_index)
+
+
+def refresh_site_index():
+    """
+    Rebuild the index in the background, e.g. after sites were added. A rebuild already
+    in flight may have read the sites before the change, so another one is queued to
+    run after it. Any number of changes during a rebuild queue a single follow-up.
+    """
+    global _rebuild_queued
+    if not site_indexes.is_loading(INDEX_KEY):
+        site_indexes.refresh(INDEX_KEY, load_site_index)
+    elif not _rebuild_queued:
+        _rebuild_queued = True
+        site_indexes.refresh(INDEX_KEY, load_site_index).add_done_callback(
+            _run_queued_rebuild
+        )
+
+
+def sites_changed():
+    """Rebuild the index in this worker and the others after sites were changed."""
+    refresh_site_index()
+    worker_events.notify("sites")
+
+
+def _run_queued_rebuild(task: asyncio.Task):
+    global _rebuild_queued
+    _rebuild_queued = False
+    # The finished load has left the in-flight table, so this starts a new one
+    site_indexes.refresh(INDEX_KEY, load_site_index)
+
+
+worker_events.subscribe("sites", lambda data: refresh_site_index())
@@ -0,0 +1,141 @@
+"""
+Events fanned out to the other server workers over Postgres LISTEN/NOTIFY.
+
+Websocket clients, the prerendered profile pages and the Discover search index all live
+in one worker's memory, while app.serve runs a worker per CPU. The worker that handles a
+change applies it locally as before and calls worker_events.notify(kind, data); every
+other worker gets it on a dedicated asyncpg connection LISTENing on CHANNEL and runs the
+handler subscribed for kind.
+
+Notifications are fire and forget. A worker that is reconnecting misses them, so
+handlers only touch state that also expires or is rebuilt on its own. Postgres caps a
+payload at 8000 bytes, check fits() before sending anything unbounded.
+"""
+
+import asyncio
+import inspect
+import logging
+import uuid
+from typing import Any, Callable, Dict, Optional, Set
+
+import asyncpg
+
+from app.config import settings
+
+log = logging.getLogger(__name__)
+
+CHANNEL = "ynot_worker_events"
+MAX_PAYLOAD_BYTES = 7999
+RECONNECT_SECONDS = 5.0
+NOTIFY_TIMEOUT_SECONDS = 5.0
+
+
+class WorkerEvents:
+    def __init__(self):
+        # Tells this worker's own notifications apart, Postgres delivers them back too
+        self.worker_id = uuid.uuid4().hex
+        self.handlers: Dict[str, Callable[[str], Any]] = {}
+        self.conn: Optional[asyncpg.Connection] = None
+        self._listener: Optional[asyncio.Task] = None
+        self._tasks: Set[asyncio.Task] = set()
+        # asyncpg runs one query per connection at a time
+        self._send_lock = asyncio.Lock()
+
+    def subscribe(self, kind: str, handler: Callable[[str], Any]):
+        """Run handler(data) for kind's events from other workers, sync or async."""
+        self.handlers[kind] = handler
+
+    async def start(self):
+        self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._listener:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+            self._listener = None
+        if self.conn:
+            await self.conn.close()
+            self.conn = None
+
+    def fits(self, kind: str, data: str) -> bool:
+        return len(self._payload(kind, data).encode()) <= MAX_PAYLOAD_BYTES
+
+    def notify(self, kind: str, data: str = ""):
+        """
+        Send an event to the other workers in the background. Safe to call from request
+        handlers; dropped while the listener connection is down.
+        """
+        if self.conn is None:
+            return
+        payload = self._payload(kind, data)
+        if len(payload.encode()) > MAX_PAYLOAD_BYTES:
+            log.warning("worker event too large to send", extra={"kind": kind})
+            return
+        self._track(asyncio.create_task(self._send(self.conn, payload)))
+
+    async def _send(self, conn: asyncpg.Connection, payload: str):
+        async with self._send_lock:
+            await conn.execute(
+                "SELECT pg_notify($1, $2)",
+                CHANNEL,
+                payload,
+                timeout=NOTIFY_TIMEOUT_SECONDS,
+            )
+
+    def _payload(self, kind: str, data: str) -> str:
+        return f"{self.worker_id} {kind} {data}"
+
+    async def _listen(self):
+        """Keep a LISTEN connection open, reconnecting after it is lost."""
+        while True:
+            closed = asyncio.Event()
+            conn = None
+            try:
+                conn = await asyncpg.connect(
+                    user=settings.postgres_user,
+                    password=settings.postgres_password,
+                    host=settings.postgres_host,
+                    port=settings.postgres_port,
+                    database=settings.postgres_db,
+                    server_settings={"application_name": "ynot-server-events"},
+                )
+                conn.add_termination_listener(lambda _: closed.set())
+                await conn.add_listener(CHANNEL, self._received)
+                self.conn = conn
+                await closed.wait()
+                log.warning("worker events connection lost")
+            except (OSError, asyncpg.PostgresError, asyncpg.InterfaceError) as e:
+                log.warning("worker events connection failed", extra={"error": str(e)})
+                if conn is not None:
+                    conn.terminate()
+            self.conn = None
+            await asyncio.sleep(RECONNECT_SECONDS)
+
+    def _received(self, conn, pid: int, channel: str, payload: str):
+        worker_id, kind, data = payload.split(" ", 2)
+        if worker_id == self.worker_id:
+            return
+        handler = self.handlers.get(kind)
+        if handler is None:
+            log.warning("unknown worker event", extra={"kind": kind})
+            return
+        try:
+            result = handler(data)
+        except Exception:
+            log.exception("worker event handler failed", extra={"kind": kind})
+            return
+        if inspect.isawaitable(result):
+            self._track(asyncio.ensure_future(result))
+
+    def _track(self, task: asyncio.Task):
+        # Holds a reference until done, the event loop only keeps a weak one
+        self._tasks.add(task)
+        task.add_done_callback(self._done)
+
+    def _done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            log.error("worker event failed", exc_info=task.exception())
+
+
+worker_events = WorkerEvents()
@@ -0,0 +1,201 @@
+"""
+Serves the built frontend (y-frontend/dist) from a manifest built once at startup.
+
+Each file's content type, ETag, cache policy and precompressed variants are worked out
+when the manifest loads, so a request is a dict lookup. Vite fingerprints everything
+under assets/, and those files are cached as immutable. index.html is kept in memory and
+revalidated with its ETag, and unknown paths fall back to it for client-side routing.
+
+Precompressed variants are the .br and .gz files next to the originals, written after
+`npm run build` with:
+
+    python -m app.static precompress
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import sys
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+from fastapi import Request
+from fastapi.responses import FileResponse, Response
+
+DIST_DIR = "y-frontend/dist"
+
+# Vite names built assets like index-BnXy3k9a.js
+HASHED_NAME = re.compile(r"-[A-Za-z0-9_-]{8}\.[a-z0-9]+$")
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+# Content-Encoding of each variant, in order of preference
+ENCODINGS = {"br": ".br", "gzip": ".gz"}
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/javascript",
+    "application/json",
+    "image/svg",
+)
+MIN_COMPRESS_BYTES = 1024
+
+
+@dataclass
+class StaticFile:
+    path: str
+    media_type: str
+    etag: str
+    cache_control: str
+    stat: os.stat_result
+    # Content-Encoding -> (path, stat) of the precompressed copy
+    variants: Dict[str, tuple] = field(default_factory=dict)
+
+
+def file_etag(path: str) -> str:
+    with open(path, "rb") as f:
+        return '"' + hashlib.md5(f.read()).hexdigest() + '"'
+
+
+def accepted_encodings(request: Request) -> set:
+    """Encodings the client accepts with a non-zero q value."""
+    accepted = set()
+    for part in request.headers.get("accept-encoding", "").split(","):
+        name, _, params = part.partition(";")
+        q = params.strip().removeprefix("q=")
+        try:
+            if params and float(q) == 0:
+                continue
+        except ValueError:
+            pass
+        if name.strip():
+            accepted.add(name.strip().lower())
+    return accepted
+
+
+def not_modified(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match", "")
+    return etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+
+
+class StaticManifest:
+    def __init__(self, directory: str = DIST_DIR):
+        self.directory = directory
+        self.files: Dict[str, StaticFile] = {}
+        self.index_html: Optional[bytes] = None
+        self.index_etag = ""
+
+    def load(self):
+        """Walk the dist directory once and record every servable file."""
+        files = {}
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                path = os.path.join(root, name)
+                if name.endswith(tuple(ENCODINGS.values())):
+                    continue
+                rel = os.path.relpath(path, self.directory).replace(os.sep, "/")
+                media_type, _ = mimetypes.guess_type(name)
+                hashed = HASHED_NAME.search(name)
+                static_file = StaticFile(
+                    path=path,
+                    media_type=media_type or "application/octet-stream",
+                    etag=file_etag(path),
+                    cache_control=IMMUTABLE if hashed else REVALIDATE,
+                    stat=os.stat(path),
+                )
+                for encoding, suffix in ENCODINGS.items():
+                    if os.path.isfile(path + suffix):
+                        static_file.variants[encoding] = (
+                            path + suffix,
+                            os.stat(path + suffix),
+                        )
+                files[rel] = static_file
+
+        index_path = os.path.join(self.directory, "index.html")
+        if os.path.isfile(index_path):
+            with open(index_path, "rb") as f:
+                self.index_html = f.read()
+            self.index_etag = '"' + hashlib.md5(self.index_html).hexdigest() + '"'
+        self.files = files
+
+    def serve_index(self, request: Request) -> Response:
+        if self.index_html is None:
+            return Response("Frontend not built", status_code=404)
+        headers = {"ETag": self.index_etag, "Cache-Control": REVALIDATE}
+        if not_modified(request, self.index_etag):
+            return Response(status_code=304, headers=headers)
+        return Response(self.index_html, media_type="text/html", headers=headers)
+
+    def serve(self, request: Request, path: str) -> Response:
+        """Serve a file from dist, falling back to index.html for app routes."""
+        static_file = self.files.get(path)
+        if path == "index.html":
+            return self.serve_index(request)
+        if static_file is None and not path.startswith("assets/"):
+            return self.serve_index(request)
+        if static_file is None:
+            # A missing asset must not be answered with HTML the browser would cache as JS
+            return Response(status_code=404)
+
+        headers = {"Cache-Control": static_file.cache_control}
+        if static_file.variants:
+            headers["Vary"] = "Accept-Encoding"
+
+        file_path, stat, etag = static_file.path, static_file.stat, static_file.etag
+        accepted = accepted_encodings(request)
+        for encoding in ENCODINGS:
+            if encoding in static_file.variants and encoding in accepted:
+                file_path, stat = static_file.variants[encoding]
+                etag = f'{etag[:-1]}-{encoding}"'
+                headers["Content-Encoding"] = encoding
+                break
+        headers["ETag"] = etag
+
+        if not_modified(request, etag):
+            headers.pop("Content-Encoding", None)
+            return Response(status_code=304, headers=headers)
+        return FileResponse(
+            file_path,
+            media_type=static_file.media_type,
+            headers=headers,
+            stat_result=stat,
+        )
+
+
+static_files = StaticManifest()
+
+
+def precompress(directory: str = DIST_DIR):
+    """Write .gz, and .br when the Brotli package is installed, next to each text asset."""
+    try:
+        import brotli
+    except ImportError:
+        brotli = None
+        print("Brotli not installed, writing gzip variants only")
+
+    for root, _, names in os.walk(directory):
+        for name in names:
+            path = os.path.join(root, name)
+            media_type = mimetypes.guess_type(name)[0] or ""
+            if name.endswith(tuple(ENCODINGS.values())):
+                continue
+            if not media_type.startswith(COMPRESSIBLE_TYPES):
+                continue
+            with open(path, "rb") as f:
+                data = f.read()
+            if len(data) < MIN_COMPRESS_BYTES:
+                continue
+
+            with open(path + ".gz", "wb") as f:
+                f.write(gzip.compress(data, compresslevel=9, mtime=0))
+            if brotli:
+                with open(path + ".br", "wb") as f:
+                    f.write(brotli.compress(data, quality=11))
+            print(f"Compressed {os.path.relpath(path, directory)}")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["precompress"]:
+        sys.exit("usage: python -m app.static precompress")
+    precompress()
@@ -0,0 +1,134 @@
+"""
+Compression benchmark for API responses.
+
+Builds JSON bodies shaped like /api/sites, /api/user/{u}/posts and an NDJSON stream
+from /api/lsd, then runs them through the Compressor used by CompressionMiddleware at
+several gzip levels and brotli qualities. Reports compressed size, ratio and CPU time
+per response. Run from ynot-server:
+
+    python bench/compression.py --repeat 50
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.middleware.compression import Compressor, brotli  # noqa: E402
+
+WORDS = (
+    "indie web garden notes blog essays photos zine links tools design code music "
+    "travel recipes books film art open source personal homepage writing"
+).split()
+
+
+def sentence(rng: random.Random, n: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(n)).capitalize() + "."
+
+
+def sites_payload(rng: random.Random, n: int = 300) -> bytes:
+    sites = [
+        {
+            "id": i,
+            "name": f"{rng.choice(WORDS)} {rng.choice(WORDS)}",
+            "owner": f"owner{i}",
+            "email": f"owner{i}@example.com",
+            "url": f"https://owner{i}.example.com",
+            "site_metadata": sentence(rng, 12),
+            "tags": [
+                {"id": t, "name": WORDS[t], "usage_count": rng.randint(0, 500)}
+                for t in rng.sample(range(len(WORDS)), 3)
+            ],
+        }
+        for i in range(n)
+    ]
+    return json.dumps(sites).encode()
+
+
+def posts_payload(rng: random.Random, n: int = 200) -> bytes:
+    posts = [
+        {
+            "id": i,
+            "title": sentence(rng, 5),
+            "note": sentence(rng, 40),
+            "created_at": f"2024-11-{1 + i % 28:02d}T12:00:00+00:00",
+            "tags": rng.sample(WORDS, 3),
+            "urls": [f"https://example.com/{rng.choice(WORDS)}/{i}"],
+            "file_keys": [],
+            "previews": [],
+        }
+        for i in range(n)
+    ]
+    return json.dumps(posts).encode()
+
+
+def ndjson_lines(rng: random.Random, n: int = 500) -> list:
+    return [
+        (json.dumps({"post": {"title": sentence(rng, 8), "score": i}}) + "\n").encode()
+        for i in range(n)
+    ]
+
+
+def run(name: str, chunks: list, encoding: str, level: int, streaming: bool, repeat):
+    raw = sum(len(chunk) for chunk in chunks)
+    start = time.process_time()
+    for _ in range(repeat):
+        if encoding == "br":
+            compressor = Compressor("br", 6, level)
+        else:
+            compressor = Compressor("gzip", level, 4)
+        size = sum(len(compressor.compress(c, flush=streaming)) for c in chunks)
+        size += len(compressor.finish())
+    cpu_ms = (time.process_time() - start) * 1000 / repeat
+    return {
+        "payload": name,
+        "encoding": f"{encoding}-{level}",
+        "raw_bytes": raw,
+        "compressed_bytes": size,
+        "ratio": round(raw / size, 2),
+        "cpu_ms": round(cpu_ms, 3),
+    }
+
+
+def main(args):
+    rng = random.Random(args.seed)
+    payloads = [
+        ("sites", [sites_payload(rng)], False),
+        ("posts", [posts_payload(rng)], False),
+        ("lsd ndjson (flush per line)", ndjson_lines(rng), True),
+    ]
+    settings = [("gzip", level) for level in (1, 6, 9)]
+    if brotli is not None:
+        settings += [("br", quality) for quality in (1, 4, 11)]
+    else:
+        print("Brotli not installed, benchmarking gzip only", file=sys.stderr)
+
+    results = [
+        run(name, chunks, encoding, level, streaming, args.repeat)
+        for name, chunks, streaming in payloads
+        for encoding, level in settings
+    ]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(
+        f"{'payload':30} {'encoding':10} {'raw':>9} {'compressed':>11} "
+        f"{'ratio':>6} {'cpu ms':>8}"
+    )
+    for r in results:
+        print(
+            f"{r['payload']:30} {r['encoding']:10} {r['raw_bytes']:9} "
+            f"{r['compressed_bytes']:11} {r['ratio']:6} {r['cpu_ms']:8}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    main(parser.parse_args())
@@ -0,0 +1,281 @@
+"""
+HTTP benchmark for the hot API routes.
+
+Seeds the database the app is configured for (POSTGRES_* in .env, point it at a scratch
+database) with users, sites, tags, posts, urls and bookmarks from app.db.datagen, starts
+the app under uvicorn and drives each route at a fixed concurrency. Prints p50/p99
+latency and throughput per route as JSON, tagged with the current commit so runs can be
+compared.
+Run from ynot-server:
+
+    python bench/http_bench.py --posts 50000 --concurrency 32 > before.json
+
+Seeding is skipped when the database already holds bench users. Use --url to benchmark
+an app that is already running instead of starting one.
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+import httpx
+from itsdangerous import TimestampSigner
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# Results are printed as JSON on stdout, keep the app's logs off it
+os.environ.setdefault("LOG_STREAM", "stderr")
+
+from sqlalchemy import text  # noqa: E402
+
+from app.config import settings  # noqa: E402
+from app.db.create_tables import init_db  # noqa: E402
+from app.db.datagen import Scale, load  # noqa: E402
+from app.db.db import engine  # noqa: E402
+
+
+async def seed(args) -> bool:
+    """Fill the database with bench rows, returns False if they were already there."""
+    await init_db()
+    async with engine.begin() as conn:
+        existing = await conn.execute(
+            text("SELECT count(*) FROM users WHERE username LIKE 'bench\\_user\\_%'")
+        )
+        if existing.scalar():
+            return False
+    scale = Scale.for_posts(
+        args.posts, users=args.users, sites=args.sites, tags=args.tags
+    )
+    await load(scale, seed=args.seed, prefix="bench")
+    return True
+
+
+async def bench_session_token() -> str:
+    async with engine.connect() as conn:
+        result = await conn.execute(
+            text(
+                "SELECT s.session_token FROM sessions s "
+                "JOIN users u ON u.id = s.user_id WHERE u.username = 'bench_user_1'"
+            )
+        )
+        return result.scalar_one()
+
+
+def session_cookie(session_token: str) -> str:
+    """The cookie Starlette's SessionMiddleware would have set after a login."""
+    data = base64.b64encode(json.dumps({"session_token": session_token}).encode())
+    return TimestampSigner(settings.session_secret).sign(data).decode()
+
+
+def start_server(port: int, workers: int) -> subprocess.Popen:
+    env = dict(os.environ, LOG_LEVEL="warning")
+    return subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "app.main:app",
+            "--port",
+            str(port),
+            "--workers",
+            str(workers),
+            "--no-access-log",
+        ],
+        cwd=ROOT,
+        env=env,
+        stdout=sys.stderr,
+    )
+
+
+async def wait_until_up(client: httpx.AsyncClient, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/api/ping")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.25)
+    raise RuntimeError("app did not start in time")
+
+
+# Each route is a (method, path, json body) factory so requests can vary per call
+RequestFactory = Callable[[random.Random], Tuple[str, str, Optional[dict]]]
+
+
+def routes(args) -> Dict[str, RequestFactory]:
+    def user(rng: random.Random) -> str:
+        return f"bench_user_{rng.randint(1, args.users)}"
+
+    def new_post(rng: random.Random) -> dict:
+        return {
+            "title": "Bench post",
+            "note": f"bench post body {rng.random()}",
+            "tags": [f"bench-tag-{rng.randint(1, args.tags)}" for _ in range(3)],
+            "urls": [],
+        }
+
+    return {
+        "GET /api/recent-posts": lambda rng: ("GET", "/api/recent-posts", None),
+        "GET /api/user/{u}/posts": lambda rng: (
+            "GET",
+            f"/api/user/{user(rng)}/posts",
+            None,
+        ),
+        "GET /api/user/{u}/bookmarks": lambda rng: (
+            "GET",
+            f"/api/user/{user(rng)}/bookmarks",
+            None,
+        ),
+        "GET /api/sites": lambda rng: ("GET", "/api/sites", None),
+        "GET /api/auth/me": lambda rng: ("GET", "/api/auth/me", None),
+        "POST /api/post": lambda rng: ("POST", "/api/post", new_post(rng)),
+    }
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    index = min(int(q * len(sorted_values)), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+async def drive(
+    client: httpx.AsyncClient,
+    factory: RequestFactory,
+    requests: int,
+    concurrency: int,
+    seed: int,
+) -> Dict:
+    """Send `requests` requests from `concurrency` concurrent workers."""
+    latencies: List[float] = []
+    errors = 0
+    remaining = requests
+
+    async def worker(worker_id: int):
+        nonlocal remaining, errors
+        rng = random.Random(seed * 1000 + worker_id)
+        while remaining > 0:
+            remaining -= 1
+            method, path, body = factory(rng)
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, path, json=body)
+                response.read()
+                if response.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2),
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def main(args):
+    seeded = await seed(args)
+    cookie = session_cookie(await bench_session_token())
+    await engine.dispose()
+
+    server = None
+    base_url = args.url
+    if base_url is None:
+        server = start_server(args.port, args.workers)
+        base_url = f"http://127.0.0.1:{args.port}"
+
+    limits = httpx.Limits(max_connections=args.concurrency)
+    try:
+        async with httpx.AsyncClient(
+            base_url=base_url,
+            cookies={"session": cookie},
+            limits=limits,
+            timeout=30.0,
+        ) as client:
+            await wait_until_up(client)
+            selected = routes(args)
+            if args.route:
+                selected = {name: selected[name] for name in args.route}
+
+            results = {}
+            for name, factory in selected.items():
+                if args.warmup:
+                    await drive(client, factory, args.warmup, args.concurrency, 0)
+                results[name] = await drive(
+                    client, factory, args.requests, args.concurrency, args.seed
+                )
+                print(f"{name}: {results[name]}", file=sys.stderr)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    print(
+        json.dumps(
+            {
+                "commit": git_commit(),
+                "run_at": datetime.now(timezone.utc).isoformat(),
+                "seeded": seeded,
+                "config": {
+                    "users": args.users,
+                    "posts": args.posts,
+                    "sites": args.sites,
+                    "tags": args.tags,
+                    "concurrency": args.concurrency,
+                    "requests": args.requests,
+                    "workers": args.workers if args.url is None else None,
+                },
+                "results": results,
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--posts", type=int, default=50000)
+    parser.add_argument("--sites", type=int, default=300)
+    parser.add_argument("--tags", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=2000, help="requests per route")
+    parser.add_argument(
+        "--warmup", type=int, default=100, help="unmeasured requests per route"
+    )
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--url", help="benchmark a running app instead of starting one")
+    parser.add_argument("--seed", type=int, default=1, help="random seed")
+    parser.add_argument(
+        "--route",
+        action="append",
+        choices=list(routes(argparse.Namespace(users=1, tags=1))),
+        help="only run this route, may be repeated",
+    )
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,71 @@
+"""
+Import-time budget for app startup.
+
+Imports app.main in a fresh interpreter with -X importtime and fails when the total
+exceeds the budget, listing the slowest top-level packages. Run from ynot-server with
+the app's environment (.env) in place:
+
+    python bench/import_time.py --budget-ms 1500
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+from typing import Dict, Tuple
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Also enforced by tests/test_import_time.py
+BUDGET_MS = 1500
+
+
+def import_times(code: str) -> Dict[str, int]:
+    """Self import time in microseconds of every module imported while running code."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=SERVER_DIR,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        sys.exit(f"{code} failed:\n{proc.stderr}")
+
+    times = {}
+    for line in proc.stderr.splitlines():
+        # "import time:       self [us] |  cumulative | imported package"
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, _, name = line[len("import time:") :].split("|")
+        times[name.strip()] = int(self_us)
+    return times
+
+
+def profile_import(module: str) -> Tuple[int, Dict[str, int]]:
+    """
+    Time spent importing module, in microseconds, leaving out what the interpreter
+    imports at startup, plus the same time split by top-level package.
+    """
+    startup = import_times("pass")
+    packages: Dict[str, int] = {}
+    for name, self_us in import_times(f"import {module}").items():
+        if name not in startup:
+            top = name.split(".")[0]
+            packages[top] = packages.get(top, 0) + self_us
+    return sum(packages.values()), packages
+
+
+def main(args) -> bool:
+    total, packages = profile_import(args.module)
+    print(f"import {args.module}: {total / 1000:.1f} ms (budget {args.budget_ms} ms)")
+    slowest = sorted(packages.items(), key=lambda item: item[1], reverse=True)
+    for name, micros in slowest[: args.top]:
+        print(f"  {micros / 1000:8.1f} ms  {name}")
+    return total / 1000 <= args.budget_ms
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--budget-ms", type=float, default=BUDGET_MS)
+    parser.add_argument("--top", type=int, default=15, help="slowest packages to list")
+    sys.exit(0 if main(parser.parse_args()) else 1)
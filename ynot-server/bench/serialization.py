@@ -0,0 +1,107 @@
+"""
+Serialization benchmark for a 1000-post feed page.
+
+Compares the old path, where FrontendPost.from_orm models are validated again against
+response_model and encoded with the stdlib json module as FastAPI does, with the
+FrontendPost.serialize + orjson path the feed routes use now. Posts are in-memory
+stand-ins for ORM rows, so only serialization is measured. Run from ynot-server:
+
+    python bench/serialization.py --posts 1000
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import orjson  # noqa: E402
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from pydantic import TypeAdapter  # noqa: E402
+
+from app.schemas.schemas import FrontendPost  # noqa: E402
+
+
+def fake_posts(n: int) -> list:
+    now = datetime.now(timezone.utc)
+    posts = []
+    for i in range(n):
+        urls = [
+            SimpleNamespace(
+                url=f"https://example.com/{i}/{j}",
+                title=f"Example page {i}-{j}",
+                description="A page linked from a post, with its OpenGraph text.",
+                image_url=f"https://example.com/{i}/{j}.png",
+                site_name="Example",
+            )
+            for j in range(2)
+        ]
+        posts.append(
+            SimpleNamespace(
+                id=i,
+                owner_id=i % 50,
+                owner=SimpleNamespace(username=f"user{i % 50}"),
+                title=f"Post {i}",
+                note="Some thoughts about a link I found today. " * 4,
+                urls=urls,
+                tags=[SimpleNamespace(name=name) for name in ("blog", "tech", "life")],
+                file_keys=[],
+                created_at=now - timedelta(minutes=i),
+            )
+        )
+    return posts
+
+
+def pydantic_path(posts, adapter) -> bytes:
+    # What FastAPI does with a response_model: dump, validate, dump as JSON, json.dumps
+    models = [FrontendPost.from_orm(post) for post in posts]
+    content = [model.model_dump() for model in models]
+    validated = adapter.validate_python(content)
+    return json.dumps(
+        jsonable_encoder(adapter.dump_python(validated, mode="json")),
+        ensure_ascii=False,
+        separators=(",", ":"),
+    ).encode()
+
+
+def orjson_path(posts, adapter) -> bytes:
+    return orjson.dumps([FrontendPost.serialize(post) for post in posts])
+
+
+def measure(fn, posts, adapter, repeat: int) -> float:
+    """CPU microseconds per post."""
+    fn(posts, adapter)  # warm up
+    start = time.process_time()
+    for _ in range(repeat):
+        fn(posts, adapter)
+    return (time.process_time() - start) * 1e6 / repeat / len(posts)
+
+
+def main(args):
+    posts = fake_posts(args.posts)
+    adapter = TypeAdapter(List[FrontendPost])
+    before = measure(pydantic_path, posts, adapter, args.repeat)
+    after = measure(orjson_path, posts, adapter, args.repeat)
+    print(
+        json.dumps(
+            {
+                "posts": args.posts,
+                "pydantic_json_us_per_post": round(before, 2),
+                "orjson_us_per_post": round(after, 2),
+                "speedup": round(before / after, 1),
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--posts", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    main(parser.parse_args())
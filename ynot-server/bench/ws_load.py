@@ -0,0 +1,262 @@
+"""
+Load test for the /api/ws/feed websocket fan-out.
+
+Starts a single app worker (broadcasts only reach clients of the worker that handled the
+post, so one worker is what's being measured), opens --clients websocket subscribers and
+publishes posts through /api/post at --rate per second. Every received post is matched
+to its publish time, giving end-to-end fan-out latency. A --slow-fraction of the clients
+read with a delay and a small receive queue, so the server sees them push back. Reports
+latency percentiles for fast and slow clients, dropped connections, missed messages and
+the worker's resident memory per connection as JSON. Run from ynot-server:
+
+    python bench/ws_load.py --clients 5000 --rate 20 --duration 30
+
+Uses the same seeded database as bench/http_bench.py. Linux only, memory is read from
+/proc.
+"""
+
+import argparse
+import asyncio
+import json
+import resource
+import sys
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import httpx
+from websockets.asyncio.client import connect
+from websockets.exceptions import ConnectionClosed, InvalidHandshake
+
+from http_bench import (bench_session_token, engine, git_commit, percentile,
+                        seed, session_cookie, start_server, wait_until_up)
+
+# Scale seeded if the database is empty, only one user's session is needed
+SEED_SCALE = argparse.Namespace(users=100, posts=1000, sites=50, tags=100, seed=1)
+MARKER = "ws-load"
+
+
+@dataclass
+class ClientStats:
+    slow: bool
+    latencies: List[float] = field(default_factory=list)
+    connected: bool = False
+    dropped: bool = False
+
+
+def rss_bytes(pid: int) -> Optional[int]:
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def raise_fd_limit(needed: int):
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < needed:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(needed, hard), hard))
+
+
+async def subscriber(
+    url: str,
+    stats: ClientStats,
+    published: Dict[str, float],
+    slow_delay: float,
+    connected: asyncio.Semaphore,
+    stop: asyncio.Event,
+):
+    try:
+        # Slow clients buffer few messages, so the server's sends to them back up
+        async with connect(url, max_queue=2 if stats.slow else 64) as ws:
+            stats.connected = True
+            connected.release()
+            while not stop.is_set():
+                try:
+                    raw = await asyncio.wait_for(ws.recv(), timeout=0.5)
+                except asyncio.TimeoutError:
+                    continue
+                received = time.perf_counter()
+                note = json.loads(raw).get("note", "")
+                if note.startswith(MARKER) and note in published:
+                    stats.latencies.append(received - published[note])
+                if stats.slow:
+                    await asyncio.sleep(slow_delay)
+    except (ConnectionClosed, InvalidHandshake, OSError):
+        stats.dropped = stats.connected and not stop.is_set()
+        if not stats.connected:
+            connected.release()
+
+
+async def publish(
+    client: httpx.AsyncClient,
+    published: Dict[str, float],
+    rate: float,
+    duration: float,
+) -> Dict:
+    errors = 0
+    latencies: List[float] = []
+    tasks = []
+
+    async def post(note: str):
+        nonlocal errors
+        published[note] = start = time.perf_counter()
+        try:
+            response = await client.post("/api/post", json={"note": note, "tags": []})
+            if response.status_code >= 400:
+                errors += 1
+        except httpx.HTTPError:
+            errors += 1
+        latencies.append(time.perf_counter() - start)
+
+    # Fixed schedule rather than back to back, so a slow publish doesn't lower the rate
+    begin = time.perf_counter()
+    count = int(rate * duration)
+    for i in range(count):
+        await asyncio.sleep(max(0.0, begin + i / rate - time.perf_counter()))
+        tasks.append(asyncio.create_task(post(f"{MARKER} {i}")))
+    await asyncio.gather(*tasks)
+
+    latencies.sort()
+    return {
+        "posts": count,
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2) if latencies else None,
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2) if latencies else None,
+    }
+
+
+def latency_summary(clients: List[ClientStats], expected: int) -> Dict:
+    latencies = sorted(lat for stats in clients for lat in stats.latencies)
+    received = len(latencies)
+    summary = {
+        "clients": len(clients),
+        "received": received,
+        "missed": expected * sum(stats.connected for stats in clients) - received,
+    }
+    if latencies:
+        for name, q in (("p50_ms", 0.50), ("p90_ms", 0.90), ("p99_ms", 0.99)):
+            summary[name] = round(percentile(latencies, q) * 1000, 2)
+        summary["max_ms"] = round(latencies[-1] * 1000, 2)
+    return summary
+
+
+async def main(args):
+    raise_fd_limit(args.clients + 256)
+    await seed(SEED_SCALE)
+    cookie = session_cookie(await bench_session_token())
+    await engine.dispose()
+
+    server = start_server(args.port, workers=1)
+    base_url = f"http://127.0.0.1:{args.port}"
+    ws_url = f"ws://127.0.0.1:{args.port}/api/ws/feed"
+
+    clients = [
+        ClientStats(slow=i < args.clients * args.slow_fraction)
+        for i in range(args.clients)
+    ]
+    published: Dict[str, float] = {}
+    stop = asyncio.Event()
+
+    try:
+        async with httpx.AsyncClient(
+            base_url=base_url, cookies={"session": cookie}, timeout=30.0
+        ) as client:
+            await wait_until_up(client)
+            rss_idle = rss_bytes(server.pid)
+
+            # Open connections a batch at a time so the accept backlog isn't overrun
+            connected = asyncio.Semaphore(args.connect_batch)
+            connect_start = time.perf_counter()
+            subscribers = []
+            for stats in clients:
+                await connected.acquire()
+                subscribers.append(
+                    asyncio.create_task(
+                        subscriber(
+                            ws_url, stats, published, args.slow_delay, connected, stop
+                        )
+                    )
+                )
+            for _ in range(args.connect_batch):
+                await connected.acquire()
+            connect_seconds = time.perf_counter() - connect_start
+            rss_connected = rss_bytes(server.pid)
+            print(
+                f"{sum(s.connected for s in clients)} clients connected "
+                f"in {connect_seconds:.1f}s",
+                file=sys.stderr,
+            )
+
+            publishing = await publish(client, published, args.rate, args.duration)
+            # Give slow clients time to work through their backlog
+            await asyncio.sleep(args.drain)
+            rss_end = rss_bytes(server.pid)
+            stop.set()
+            await asyncio.gather(*subscribers)
+    finally:
+        server.terminate()
+        server.wait()
+
+    open_connections = sum(s.connected for s in clients)
+    memory = {"rss_idle_mb": None, "rss_connected_mb": None, "rss_end_mb": None}
+    if rss_idle is not None and rss_connected is not None:
+        memory = {
+            "rss_idle_mb": round(rss_idle / 2**20, 1),
+            "rss_connected_mb": round(rss_connected / 2**20, 1),
+            "rss_end_mb": round(rss_end / 2**20, 1) if rss_end else None,
+            "rss_per_connection_kb": round(
+                (rss_connected - rss_idle) / max(open_connections, 1) / 1024, 1
+            ),
+        }
+
+    expected = publishing["posts"] - publishing["errors"]
+    print(
+        json.dumps(
+            {
+                "commit": git_commit(),
+                "run_at": datetime.now(timezone.utc).isoformat(),
+                "config": vars(args),
+                "connections": {
+                    "requested": args.clients,
+                    "connected": open_connections,
+                    "failed": args.clients - open_connections,
+                    "dropped": sum(s.dropped for s in clients),
+                    "connect_seconds": round(connect_seconds, 2),
+                },
+                "publish": publishing,
+                "fanout_fast": latency_summary(
+                    [s for s in clients if not s.slow], expected
+                ),
+                "fanout_slow": latency_summary(
+                    [s for s in clients if s.slow], expected
+                ),
+                "memory": memory,
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--clients", type=int, default=2000)
+    parser.add_argument("--rate", type=float, default=10, help="posts per second")
+    parser.add_argument("--duration", type=float, default=20, help="seconds")
+    parser.add_argument(
+        "--slow-fraction", type=float, default=0.05, help="share of slow clients"
+    )
+    parser.add_argument(
+        "--slow-delay",
+        type=float,
+        default=0.5,
+        help="seconds slow clients wait per read",
+    )
+    parser.add_argument("--drain", type=float, default=5, help="seconds to wait after")
+    parser.add_argument("--connect-batch", type=int, default=200)
+    parser.add_argument("--port", type=int, default=8766)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,43 @@
+import asyncio
+
+from app.cache import SWRCache
+
+
+def loader(value):
+    calls = []
+
+    async def load():
+        calls.append(value)
+        return value
+
+    return load, calls
+
+
+def test_evicts_least_recently_used():
+    async def main():
+        cache = SWRCache(ttl=60, max_entries=2)
+        for key in ("a", "b"):
+            await cache.get(key, loader(key)[0])
+        await cache.get("a", loader("a")[0])  # a is now the most recently used
+        await cache.get("c", loader("c")[0])
+
+        keep_a, a_calls = loader("a")
+        await cache.get("a", keep_a)
+        reload_b, b_calls = loader("b")
+        await cache.get("b", reload_b)
+        return a_calls, b_calls
+
+    a_calls, b_calls = asyncio.run(main())
+    assert a_calls == []  # still cached
+    assert b_calls == ["b"]  # evicted when c was added, so loaded again
+
+
+def test_does_not_cache_none():
+    async def main():
+        cache = SWRCache(ttl=60, cache_none=False)
+        load, calls = loader(None)
+        assert await cache.get("missing", load) is None
+        assert await cache.get("missing", load) is None
+        return calls
+
+    assert asyncio.run(main()) == [None, None]
@@ -0,0 +1,10 @@
+from bench.import_time import BUDGET_MS, profile_import
+
+
+def test_app_import_stays_within_budget():
+    # Runs in a fresh interpreter with the environment conftest set up
+    total, packages = profile_import("app")
+    slowest = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:5]
+    assert total / 1000 <= BUDGET_MS, f"import app took {total / 1000:.1f} ms, " + (
+        ", ".join(f"{name} {micros / 1000:.1f} ms" for name, micros in slowest)
+    )
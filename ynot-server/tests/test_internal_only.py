@@ -0,0 +1,40 @@
+import httpx
+from fastapi import Depends, FastAPI
+
+from app.config import settings
+from app.middleware.user_middleware import internal_only
+from tests.conftest import run
+
+app = FastAPI()
+
+
+@app.get("/internal", dependencies=[Depends(internal_only)])
+async def internal():
+    return {"ok": True}
+
+
+def get(headers=None, client=("127.0.0.1", 5000)) -> int:
+    async def main():
+        transport = httpx.ASGITransport(app=app, client=client)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://test"
+        ) as http:
+            return (await http.get("/internal", headers=headers)).status_code
+
+    return run(main())
+
+
+def test_loopback_without_token(monkeypatch):
+    monkeypatch.setattr(settings, "metrics_token", None)
+    assert get() == 200
+    assert get(client=("10.1.2.3", 5000)) == 403
+    assert get(headers={"X-Forwarded-For": "203.0.113.9"}) == 403
+
+
+def test_token(monkeypatch):
+    monkeypatch.setattr(settings, "metrics_token", "s3cret")
+    assert get(client=("203.0.113.9", 5000)) == 403
+    assert get(headers={"Authorization": "Bearer wrong"}) == 403
+    assert get(headers={"Authorization": "Bearer s3cret"}) == 200
+    remote = ("203.0.113.9", 5000)
+    assert get(headers={"Authorization": "Bearer s3cret"}, client=remote) == 200
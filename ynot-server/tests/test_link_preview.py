@@ -0,0 +1,199 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+from app.services import link_preview
+from app.services.link_preview import (MAX_BODY_BYTES, MAX_REDIRECTS,
+                                       LinkPreviewFetcher, PublicAddressTransport,
+                                       public_addresses)
+from tests.conftest import run
+
+PAGE = (
+    b"<html><head><title>Fixture</title>"
+    b'<meta property="og:title" content="Fixture page">'
+    b'<meta property="og:image" content="/cover.png">'
+    b"</head><body>hello</body></html>"
+)
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def send_html(self, body: bytes = PAGE):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def redirect(self, location: str):
+        self.send_response(302)
+        self.send_header("Location", location)
+        self.end_headers()
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        if self.path == "/page":
+            self.send_html()
+        elif self.path == "/redirect":
+            self.redirect("/page")
+        elif self.path.startswith("/loop"):
+            self.redirect(f"/loop{len(self.server.requests)}")
+        elif self.path == "/redirect-outside":
+            self.redirect("http://10.0.0.1/page")
+        elif self.path == "/huge":
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html")
+            self.end_headers()
+            self.wfile.write(b"<html><head><title>Huge</title>")
+            try:
+                for _ in range(10 * MAX_BODY_BYTES // 4096):
+                    self.wfile.write(b"<!-- padding -->" * 256)
+            except OSError:
+                pass  # the fetcher hung up once it had enough
+        elif self.path == "/slow":
+            time.sleep(2)
+            self.send_html()
+        elif self.path == "/drip":
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html")
+            self.end_headers()
+            try:
+                for _ in range(40):
+                    self.wfile.write(b" ")
+                    self.wfile.flush()
+                    time.sleep(0.1)
+            except OSError:
+                pass
+        else:
+            self.send_response(404)
+            self.end_headers()
+
+
+@pytest.fixture(scope="module")
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), FixtureHandler)
+    httpd.requests = []
+    httpd.daemon_threads = True
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+
+
+def base_url(server) -> str:
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def fetch(server, path: str, **kwargs):
+    """Fetch from the fixture server, which the default filters would reject."""
+    prefix = base_url(server) + "/"
+
+    async def only_fixture(url: str) -> bool:
+        return url.startswith(prefix)
+
+    kwargs.setdefault("url_filter", only_fixture)
+    kwargs.setdefault("transport", httpx.AsyncHTTPTransport())
+
+    async def main():
+        fetcher = LinkPreviewFetcher(concurrency=2, **kwargs)
+        fetcher.open_client()
+        try:
+            return await fetcher.fetch(prefix + path.lstrip("/"))
+        finally:
+            await fetcher.client.aclose()
+
+    return run(main())
+
+
+def test_parses_preview(server):
+    preview = fetch(server, "/page")
+    assert preview["title"] == "Fixture page"
+    assert preview["image_url"] == base_url(server) + "/cover.png"
+
+
+def test_follows_redirects(server):
+    assert fetch(server, "/redirect")["title"] == "Fixture page"
+
+
+def test_gives_up_after_max_redirects(server):
+    server.requests.clear()
+    assert fetch(server, "/loop") is None
+    assert len(server.requests) == MAX_REDIRECTS + 1
+
+
+def test_checks_every_redirect_hop(server):
+    assert fetch(server, "/redirect-outside") is None
+
+
+def test_caps_body_size(server, monkeypatch):
+    parsed = []
+    real_parse = link_preview.parse_preview
+
+    def parse(html, base):
+        parsed.append(len(html))
+        return real_parse(html, base)
+
+    monkeypatch.setattr(link_preview, "parse_preview", parse)
+    preview = fetch(server, "/huge")
+    assert preview["title"] == "Huge"
+    assert parsed == [MAX_BODY_BYTES]
+
+
+@pytest.mark.parametrize("path", ["/slow", "/drip"])
+def test_times_out(server, path):
+    start = time.monotonic()
+    assert fetch(server, path, timeout=0.5) is None
+    assert time.monotonic() - start < 1.5
+
+
+def test_rejects_private_address_at_connect(server):
+    """A host that passed the url filter but resolves to a private address on connect."""
+    server.requests.clear()
+    port = server.server_address[1]
+
+    async def rebinding(host, port):
+        return ["127.0.0.1"]
+
+    async def allow_all(url):
+        return True
+
+    limits = httpx.Limits(max_connections=2)
+    preview = run(
+        _fetch_with(
+            LinkPreviewFetcher(
+                url_filter=allow_all,
+                transport=PublicAddressTransport(limits, resolver=rebinding),
+            ),
+            f"http://rebind.example:{port}/page",
+        )
+    )
+    assert preview is None
+    assert server.requests == []
+
+
+async def _fetch_with(fetcher, url):
+    fetcher.open_client()
+    try:
+        return await fetcher.fetch(url)
+    finally:
+        await fetcher.client.aclose()
+
+
+@pytest.mark.parametrize(
+    "addresses, expected",
+    [
+        (["93.184.216.34"], ["93.184.216.34"]),
+        (["93.184.216.34", "10.0.0.1"], []),
+        (["::1"], []),
+        (["169.254.169.254"], []),
+    ],
+)
+def test_public_addresses(addresses, expected):
+    async def resolver(host, port):
+        return addresses
+
+    assert run(public_addresses("example.com", 443, resolver)) == expected
@@ -0,0 +1,98 @@
+from sqlalchemy import inspect, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from app.db.db import engine
+from app.models.models import Post, Tag, User
+from app.db.partitions import archive_deleted_posts, delete_orphaned_links
+from tests.conftest import run
+
+
+def in_rolled_back_transaction(check):
+    """Run check(conn) and undo whatever it changed in the shared test database."""
+
+    async def main():
+        async with engine.connect() as conn:
+            transaction = await conn.begin()
+            try:
+                return await check(conn)
+            finally:
+                await transaction.rollback()
+
+    return run(main())
+
+
+def test_archiving_drops_links(database):
+    async def check(conn):
+        post_id = await conn.scalar(
+            text(
+                "SELECT post_id FROM post_tags JOIN posts ON posts.id = post_id "
+                "WHERE NOT archived LIMIT 1"
+            )
+        )
+        await conn.execute(
+            text(
+                "UPDATE posts SET is_deleted = true, "
+                "deleted_at = now() - interval '60 days' WHERE id = :id"
+            ),
+            {"id": post_id},
+        )
+        archived = await archive_deleted_posts(conn, older_than_days=30)
+        links = await conn.scalar(
+            text(
+                "SELECT (SELECT count(*) FROM post_tags WHERE post_id = :id)"
+                " + (SELECT count(*) FROM post_urls WHERE post_id = :id)"
+            ),
+            {"id": post_id},
+        )
+        partition = await conn.scalar(
+            text("SELECT tableoid::regclass::text FROM posts WHERE id = :id"),
+            {"id": post_id},
+        )
+        return archived, links, partition
+
+    archived, links, partition = in_rolled_back_transaction(check)
+    assert archived >= 1
+    assert links == 0
+    assert partition == "posts_archive"
+
+
+def test_deletes_orphaned_links(database):
+    async def check(conn):
+        await conn.execute(
+            text(
+                "INSERT INTO post_tags (post_id, tag_id) "
+                "SELECT -1, id FROM tags LIMIT 1"
+            )
+        )
+        removed = await delete_orphaned_links(conn)
+        left = await conn.scalar(
+            text("SELECT count(*) FROM post_tags WHERE post_id = -1")
+        )
+        return removed, left
+
+    removed, left = in_rolled_back_transaction(check)
+    assert removed >= 1
+    assert left == 0
+
+
+def test_post_identity_is_the_table_primary_key(database):
+    async def check(conn):
+        async with AsyncSession(bind=conn) as session:
+            user_id = await session.scalar(select(User.id).limit(1))
+            tag = await session.scalar(select(Tag).limit(1))
+            post = Post(owner_id=user_id, note="identity test", tags=[tag])
+            session.add(post)
+            await session.flush()
+            identity = inspect(post).identity
+            session.expunge_all()
+
+            loaded = await session.scalar(
+                select(Post).options(selectinload(Post.tags)).where(Post.id == post.id)
+            )
+            return identity, inspect(loaded), tag.id
+
+    identity, loaded, tag_id = in_rolled_back_transaction(check)
+    assert identity == (loaded.object.id, False, loaded.object.created_at)
+    assert loaded.identity == identity
+    assert [tag.id for tag in loaded.object.tags] == [tag_id]
@@ -0,0 +1,22 @@
+import cProfile
+from types import SimpleNamespace
+
+import pytest
+from pydantic import ValidationError
+
+from app.config import Settings, settings
+from app.middleware.profiling import list_profiles, store_profile
+
+
+def test_keeps_newest_profiles(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "profiling_dir", str(tmp_path))
+    monkeypatch.setattr(settings, "profiling_max_files", 2)
+    request = SimpleNamespace(method="GET", url=SimpleNamespace(path="/api/ping"))
+
+    names = [store_profile(cProfile.Profile(), request, 0.01) for _ in range(3)]
+    assert list_profiles() == names[1:]
+
+
+def test_max_files_must_keep_one():
+    with pytest.raises(ValidationError):
+        Settings(profiling_max_files=0)
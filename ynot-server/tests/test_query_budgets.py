@@ -0,0 +1,91 @@
+import base64
+import json
+from dataclasses import asdict
+
+import httpx
+import pytest
+from fastapi.routing import APIRoute
+from itsdangerous import TimestampSigner
+from sqlalchemy import select
+
+from app import app
+from app.config import settings
+from app.db.db import engine
+from app.db.plan_check import sample
+from app.models.models import Site
+from tests.conftest import run
+
+# An example request per budgeted route, filled in with rows from the seeded database.
+# POST /post mixes existing and new tags and urls, the most queries it can issue.
+EXAMPLES = {
+    ("GET", "/api/sites"): lambda s: ("/api/sites", None),
+    ("GET", "/api/sites/{site_id}/related"): lambda s: (
+        f"/api/sites/{s['site_id']}/related",
+        None,
+    ),
+    ("GET", "/api/recent-posts"): lambda s: ("/api/recent-posts", None),
+    ("GET", "/api/user/{username}/posts"): lambda s: (
+        f"/api/user/{s['username']}/posts",
+        None,
+    ),
+    ("GET", "/api/user/{username}/bookmarks"): lambda s: (
+        f"/api/user/{s['username']}/bookmarks",
+        None,
+    ),
+    ("GET", "/api/user/{username}/profile"): lambda s: (
+        f"/api/user/{s['username']}/profile",
+        None,
+    ),
+    ("POST", "/api/post"): lambda s: (
+        "/api/post",
+        {
+            "title": "Budget test",
+            "note": "budget test post",
+            "tags": s["tag_names"][:2] + ["budget-test-tag"],
+            "urls": s["urls"][:2] + ["https://example.com/budget-test"],
+        },
+    ),
+}
+
+
+def budgeted_routes():
+    """(method, path) of every route that declares a query_budget."""
+    routes = set()
+    for route in app.routes:
+        if not isinstance(route, APIRoute):
+            continue
+        calls = [dependency.call for dependency in route.dependant.dependencies]
+        if any(call.__qualname__.startswith("query_budget.") for call in calls):
+            routes.update((method, route.path) for method in route.methods)
+    return routes
+
+
+def session_cookie(session_token: str) -> str:
+    """The cookie Starlette's SessionMiddleware would have set after a login."""
+    data = base64.b64encode(json.dumps({"session_token": session_token}).encode())
+    return TimestampSigner(settings.session_secret).sign(data).decode()
+
+
+def test_every_budgeted_route_has_an_example():
+    assert budgeted_routes() == set(EXAMPLES)
+
+
+@pytest.mark.parametrize("method, path", sorted(EXAMPLES))
+def test_stays_within_budget(database, monkeypatch, method, path):
+    # Over budget, QueryStatsMiddleware raises QueryBudgetExceeded out of the app
+    monkeypatch.setattr(settings, "query_budget_strict", True)
+
+    async def main():
+        async with engine.connect() as conn:
+            values = await sample(conn)
+            site_id = await conn.scalar(select(Site.id).limit(1))
+        url, body = EXAMPLES[(method, path)](dict(asdict(values), site_id=site_id))
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app),
+            base_url="http://127.0.0.1",
+            headers={"Cookie": f"session={session_cookie(values.session_token)}"},
+        ) as client:
+            return await client.request(method, url, json=body)
+
+    response = run(main())
+    assert response.status_code == 200, response.text
@@ -0,0 +1,17 @@
+import pytest
+
+from app.db.db import engine
+from app.db.plan_check import PLAN_CHECKS, plan_failures, sample
+from tests.conftest import run
+
+
+@pytest.mark.parametrize("name", list(PLAN_CHECKS))
+def test_uses_an_index(database, name):
+    async def main():
+        async with engine.connect() as conn:
+            # The test data is small enough that a seq scan can win on cost, so only
+            # count the ones the planner couldn't avoid
+            await conn.exec_driver_sql("SET enable_seqscan = off")
+            return await plan_failures(conn, name, await sample(conn))
+
+    assert run(main()) == []
@@ -0,0 +1,71 @@
+import asyncio
+import math
+
+import pytest
+
+from app.services import related_sites
+from app.services.related_sites import tag_vectors, top_neighbors
+
+
+def test_rare_tags_weigh_more():
+    vectors = tag_vectors({1: {10, 20}, 2: {10}, 3: {10}})
+
+    # Smoothed IDF: tag 10 is on all 3 sites, tag 20 on one
+    common, rare = 1.0, math.log(4 / 2) + 1
+    norm = math.hypot(common, rare)
+    assert vectors[1] == pytest.approx({10: common / norm, 20: rare / norm})
+    assert vectors[2] == pytest.approx({10: 1.0})
+    assert math.hypot(*vectors[1].values()) == pytest.approx(1.0)
+
+
+def test_keeps_the_top_k_ties_by_lower_id():
+    neighbors = top_neighbors(tag_vectors({4: {1}, 3: {1}, 2: {1}, 1: {1}}), k=2)
+
+    assert neighbors[1] == [(2, 1.0), (3, 1.0)]
+    assert neighbors[4] == [(1, 1.0), (2, 1.0)]
+
+
+def test_ranks_by_shared_weight():
+    vectors = tag_vectors({1: {10, 20}, 2: {10, 20}, 3: {10}, 4: {20, 30}})
+    neighbors = top_neighbors(vectors, k=3)
+
+    assert [site_id for site_id, _ in neighbors[1]] == [2, 3, 4]
+    scores = [score for _, score in neighbors[1]]
+    assert scores == sorted(scores, reverse=True)
+
+
+def test_no_shared_tag_no_neighbor():
+    neighbors = top_neighbors(tag_vectors({1: {10}, 2: {10}, 3: {20}}), k=5)
+
+    assert 3 not in neighbors
+    assert neighbors[1] == [(2, 1.0)]
+    assert neighbors[2] == [(1, 1.0)]
+
+
+def test_change_during_refresh_queues_one_more(monkeypatch):
+    async def main():
+        release = asyncio.Event()
+        refreshes = []
+
+        async def refresh(wait=True):
+            refreshes.append(wait)
+            if len(refreshes) == 1:
+                await release.wait()  # sites change while this refresh runs
+            return 0
+
+        monkeypatch.setattr(related_sites, "refresh_site_neighbors", refresh)
+        monkeypatch.setattr(related_sites, "_refresh", None)
+        related_sites.schedule_refresh(wait=False)
+        await asyncio.sleep(0)
+        related_sites.schedule_refresh()
+        related_sites.schedule_refresh()
+        release.set()
+        for _ in range(100):
+            await asyncio.sleep(0.01)
+            if related_sites._refresh.done() and len(refreshes) > 1:
+                break
+        await asyncio.sleep(0.05)  # long enough for any further refresh to start
+        return refreshes
+
+    # The follow-up waits for any refresh elsewhere, it is for a change
+    assert asyncio.run(main()) == [False, True]
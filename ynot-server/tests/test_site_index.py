@@ -0,0 +1,96 @@
+import asyncio
+
+from app.services import site_index
+from app.services.site_index import INDEX_KEY, SiteIndex, refresh_site_index
+
+
+def site(site_id, name, owner, *tags):
+    return {
+        "id": site_id,
+        "name": name,
+        "owner": owner,
+        "tags": [{"name": tag} for tag in tags],
+    }
+
+
+# Returned by name: Alpha Garden, alpine notes, Beta Blog, Gamma Gallery
+INDEX = SiteIndex.build(
+    [
+        site(1, "Alpha Garden", "ann", "python", "web"),
+        site(2, "Beta Blog", "bob", "python"),
+        site(3, "Gamma Gallery", "ann", "art", "web"),
+        site(4, "alpine notes", "carl"),
+    ]
+)
+
+
+def ids(result):
+    return [found["id"] for found in result["sites"]]
+
+
+def test_tags_all_or_any():
+    assert ids(INDEX.search(tags=["python", "web"])) == [1]
+    assert ids(INDEX.search(tags=["python", "web"], match_all=False)) == [1, 2, 3]
+
+
+def test_every_query_word_matches_a_prefix():
+    assert ids(INDEX.search(query="al")) == [1, 4]
+    assert ids(INDEX.search(query="Al ga")) == [1]
+    # Name and owner words both count
+    assert ids(INDEX.search(query="an ga")) == [1, 3]
+    assert ids(INDEX.search(query="an ga", tags=["art"])) == [3]
+
+
+def test_facets_count_every_match_not_just_the_page():
+    result = INDEX.search(tags=["web"], limit=1)
+
+    assert ids(result) == [1]
+    assert result["total"] == 2
+    assert result["facets"] == [
+        {"name": "web", "count": 2},
+        {"name": "art", "count": 1},
+        {"name": "python", "count": 1},
+    ]
+
+
+def test_offset_and_limit():
+    result = INDEX.search(offset=1, limit=2)
+
+    assert ids(result) == [4, 2]
+    assert (result["total"], result["offset"], result["limit"]) == (4, 1, 2)
+    assert ids(INDEX.search(offset=4)) == []
+
+
+def test_unknown_tags():
+    result = INDEX.search(tags=["nope"])
+    assert (ids(result), result["total"], result["facets"]) == ([], 0, [])
+    assert ids(INDEX.search(tags=["python", "nope"])) == []
+    assert ids(INDEX.search(tags=["python", "nope"], match_all=False)) == [1, 2]
+
+
+def test_change_during_rebuild_queues_one_more(monkeypatch):
+    async def main():
+        site_index.site_indexes.clear()
+        release = asyncio.Event()
+        builds = []
+
+        async def load():
+            builds.append(len(builds))
+            if len(builds) == 1:
+                await release.wait()  # a site changes while this rebuild runs
+            return SiteIndex.build([])
+
+        monkeypatch.setattr(site_index, "load_site_index", load)
+        refresh_site_index()
+        await asyncio.sleep(0)
+        refresh_site_index()
+        refresh_site_index()
+        release.set()
+        for _ in range(100):
+            await asyncio.sleep(0.01)
+            if not site_index.site_indexes.is_loading(INDEX_KEY) and len(builds) > 1:
+                break
+        await asyncio.sleep(0.05)  # long enough for any further rebuild to start
+        return builds
+
+    assert asyncio.run(main()) == [0, 1]
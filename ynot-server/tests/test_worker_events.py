@@ -0,0 +1,44 @@
+import asyncio
+
+from app.services.worker_events import WorkerEvents
+from tests.conftest import run
+
+
+def test_runs_handlers_for_other_workers_only():
+    events = WorkerEvents()
+    received = []
+    events.subscribe("profile", received.append)
+
+    events._received(None, 0, "", f"{events.worker_id} profile mine")
+    events._received(None, 0, "", "other-worker profile [\"a b\", \"c\"]")
+    events._received(None, 0, "", "other-worker unknown ignored")
+
+    assert received == ['["a b", "c"]']
+
+
+def test_fits_the_notify_payload_limit():
+    events = WorkerEvents()
+    assert events.fits("feed", "x" * 7000)
+    assert not events.fits("feed", "x" * 8000)
+    assert not events.fits("feed", "é" * 3990)  # the limit is in bytes
+
+
+def test_notifies_the_other_workers(database):
+    async def main():
+        sender, receiver = WorkerEvents(), WorkerEvents()
+        received = asyncio.Queue()
+        receiver.subscribe("feed", received.put_nowait)
+        await sender.start()
+        await receiver.start()
+        try:
+            for _ in range(100):
+                if sender.conn and receiver.conn:
+                    break
+                await asyncio.sleep(0.05)
+            sender.notify("feed", '{"id": 1}')
+            return await asyncio.wait_for(received.get(), timeout=5)
+        finally:
+            await sender.stop()
+            await receiver.stop()
+
+    assert run(main()) == '{"id": 1}'
@@ -1,23 +1,86 @@
 import ShowcaseGrid from "./ShowcaseGrid.jsx";
-import { useEffect, useState } from "react";
+import { useEffect, useRef, useState } from "react";
 import PostStream from "./PostStream.jsx";
 
+const PAGE_SIZE = 24;
+const MAX_FACETS = 20;
+
 function DiscoverPage({ API_URL, isLoggedIn }) {
   const [sites, setSites] = useState([]);
+  const [facets, setFacets] = useState([]);
+  const [total, setTotal] = useState(0);
+  const [query, setQuery] = useState("");
+  const [selectedTags, setSelectedTags] = useState([]);
+  const [mode, setMode] = useState("and");
+  // The request in flight, aborted when a newer one starts so a slow response to an
+  // old query can't overwrite the results of the current one
+  const requestRef = useRef(null);
+
+  const fetchSites = async (offset = 0) => {
+    requestRef.current?.abort();
+    const controller = new AbortController();
+    requestRef.current = controller;
 
-  const fetchSites = async () => {
+    const params = new URLSearchParams({
+      q: query,
+      mode,
+      offset: String(offset),
+      limit: String(PAGE_SIZE),
+    });
+    selectedTags.forEach((tag) => params.append("tag", tag));
     try {
-      const response = await fetch(`${API_URL}/sites`);
+      const response = await fetch(`${API_URL}/sites/search?${params}`, {
+        signal: controller.signal,
+      });
       const data = await response.json();
-      setSites(data);
+      if (controller.signal.aborted) return;
+      setSites((prevSites) =>
+        offset === 0 ? data.sites : [...prevSites, ...data.sites],
+      );
+      setFacets(data.facets);
+      setTotal(data.total);
     } catch (error) {
-      console.error("Error fetching sites:", error);
+      if (error.name !== "AbortError") {
+        console.error("Error fetching sites:", error);
+      }
     }
   };
 
   useEffect(() => {
-    fetchSites();
-  }, []);
+    // Wait for a pause in typing before searching
+    const timeout = setTimeout(() => fetchSites(0), 200);
+    return () => clearTimeout(timeout);
+  }, [query, selectedTags, mode]);
+
+  useEffect(() => () => requestRef.current?.abort(), []);
+
+  const toggleTag = (tag) => {
+    setSelectedTags((prevTags) =>
+      prevTags.includes(tag)
+        ? prevTags.filter((t) => t !== tag)
+        : [...prevTags, tag],
+    );
+  };
+
+  // Selected tags stay visible even when they have no matches left
+  const facetFor = (tag) =>
+    facets.find((facet) => facet.name === tag) || { name: tag, count: 0 };
+  const shownFacets = [
+    ...selectedTags.map(facetFor),
+    ...facets
+      .filter((facet) => !selectedTags.includes(facet.name))
+      .slice(0, MAX_FACETS),
+  ];
+
+  const chipStyle = (selected) => ({
+    padding: "4px 10px",
+    margin: "4px",
+    borderRadius: "16px",
+    border: "1px solid #ccc",
+    background: selected ? "#222" : "transparent",
+    color: selected ? "#fff" : "inherit",
+    cursor: "pointer",
+  });
 
   return (
     <div>
@@ -33,7 +96,48 @@ function DiscoverPage({ API_URL, isLoggedIn }) {
       >
         Discover cool <i>people.</i>
       </h1>
+      <div style={{ textAlign: "left", margin: "0 8px 16px 8px" }}>
+        <input
+          type="search"
+          placeholder="Search by name or owner"
+          value={query}
+          onChange={(e) => setQuery(e.target.value)}
+          style={{
+            padding: "8px",
+            width: "100%",
+            maxWidth: "400px",
+            marginBottom: "8px",
+          }}
+        />
+        <div>
+          {shownFacets.map((facet) => (
+            <button
+              key={facet.name}
+              style={chipStyle(selectedTags.includes(facet.name))}
+              onClick={() => toggleTag(facet.name)}
+            >
+              #{facet.name} ({facet.count})
+            </button>
+          ))}
+          {selectedTags.length > 1 && (
+            <button
+              style={chipStyle(false)}
+              onClick={() => setMode(mode === "and" ? "or" : "and")}
+            >
+              {mode === "and" ? "Matching all tags" : "Matching any tag"}
+            </button>
+          )}
+        </div>
+      </div>
       <ShowcaseGrid sites={sites} />
+      {sites.length < total && (
+        <button
+          style={{ ...chipStyle(false), margin: "16px" }}
+          onClick={() => fetchSites(sites.length)}
+        >
+          Load more ({total - sites.length} left)
+        </button>
+      )}
       <h2 style={{ marginTop: "40px", textAlign: "left", paddingLeft: "20px" }}>
         People on Y
       </h2>
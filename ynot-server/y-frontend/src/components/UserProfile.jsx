@@ -5,20 +5,34 @@ import TimelinePosts from "./TimelinePosts.jsx";
 import "../styles/UserProfile.css";
 import Linkify from "react-linkify";
 
+// Data the server embedded in a prerendered profile page. Only used by the first
+// render of that profile, later navigations fetch from the API.
+function takeInitialData(username) {
+  const data = window.__INITIAL_DATA__;
+  if (!data || data.username !== username) return null;
+  delete window.__INITIAL_DATA__;
+  return data;
+}
+
 function UserProfile({ isLoggedIn, user }) {
   const { username } = useParams();
   const navigate = useNavigate();
 
+  const [initialData] = useState(() => takeInitialData(username));
   const [activeView, setActiveView] = useState("activity");
-  const [posts, setPosts] = useState([]);
-  const [bookmarks, setBookmarks] = useState([]);
-  const [profile, setProfile] = useState(null);
-  const [loading, setLoading] = useState(true);
+  const [posts, setPosts] = useState(initialData?.posts ?? []);
+  const [bookmarks, setBookmarks] = useState(initialData?.bookmarks ?? []);
+  const [profile, setProfile] = useState(initialData?.profile ?? null);
+  const [loading, setLoading] = useState(!initialData);
   const [error, setError] = useState(null);
   const API_URL = import.meta.env.VITE_API_BASE_URL;
 
   useEffect(() => {
     const fetchUserData = async () => {
+      // The prerendered page already holds everything when no list was cut off
+      if (initialData?.complete && initialData.username === username) {
+        return;
+      }
       try {
         const profileResponse = await fetch(
           `${API_URL}/user/${username}/profile`,
@@ -52,7 +66,7 @@ function UserProfile({ isLoggedIn, user }) {
     };
 
     fetchUserData();
-  }, [username, API_URL]);
+  }, [username, API_URL, initialData]);
 
   const handleViewChange = (view) => {
     setActiveView(view);